@@ -0,0 +1,352 @@
+"""
+Local stand-ins for the GitHub REST API and an LLM provider.
+
+Run as `python -m benchmarks.mock_servers` to serve a synthetic pull request
+and an OpenAI / Anthropic compatible completion endpoint. The bound ports are
+printed as one JSON line on stdout. Both servers expose `GET /_stats` with
+their counters and `POST /_reset` to clear them.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from urllib.parse import unquote
+
+from .synthetic import generate_diff, generate_head_file
+
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+HEAD_SHA = "1" * 40
+BASE_SHA = "0" * 40
+# Hunk id, file path and first target line of every hunk section of a prompt
+HUNK_SECTION_PATTERN = re.compile(r'^### Hunk (\d+)\nFile: (.*)\n.*\n- For "right" side: (\d+)', re.MULTILINE)
+HUNK_TARGET_PATTERN = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@", re.MULTILINE)
+# Characters of content per streamed event
+STREAM_PIECE_CHARS = 16
+
+
+class _Stats:
+  """Thread-safe counters of one mock server."""
+
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self.values: Dict[str, float] = {}
+
+  def add(self, **increments: float) -> None:
+    with self._lock:
+      for key, value in increments.items():
+        self.values[key] = self.values.get(key, 0) + value
+
+  def snapshot(self) -> Dict[str, float]:
+    with self._lock:
+      return dict(self.values)
+
+  def reset(self) -> None:
+    with self._lock:
+      self.values.clear()
+
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  stats: _Stats
+
+  def log_message(self, format: str, *args: Any) -> None:
+    pass
+
+  def _read_json(self) -> Any:
+    length = int(self.headers.get("Content-Length") or 0)
+    return json.loads(self.rfile.read(length) or b"null")
+
+  def _send(self, status: int, body: Any, content_type: str = "application/json", headers: Dict[str, str] = None) -> None:
+    payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+    self.send_response(status)
+    self.send_header("Content-Type", content_type)
+    self.send_header("Content-Length", str(len(payload)))
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def do_GET(self) -> None:
+    if not self._handle_stats():
+      self._send(404, {"message": "Not Found"})
+
+  def _handle_stats(self) -> bool:
+    if self.path == "/_stats":
+      self._send(200, self.stats.snapshot())
+      return True
+    if self.path == "/_reset":
+      self._read_json()
+      self.stats.reset()
+      self._send(200, {})
+      return True
+    return False
+
+
+def head_line_counts(diff: str) -> Dict[str, int]:
+  """Number of lines each file of a diff needs at head to hold all its hunks."""
+  counts = {}
+  for section in diff.split("diff --git ")[1:]:
+    path = section.split("\n+++ b/", 1)[1].split("\n", 1)[0]
+    ends = [int(start) + int(length or 1) for start, length in HUNK_TARGET_PATTERN.findall(section)]
+    counts[path] = max(ends, default=1) + 20
+  return counts
+
+
+class MockGitHubHandler(_Handler):
+  """Serves one pull request, its diff, the head content of its files and its reviews."""
+
+  diff: bytes = b""
+  head_files: Dict[str, int] = {}
+
+  def do_GET(self) -> None:
+    if self._handle_stats():
+      return
+    self.stats.add(requests=1)
+    path = self.path.split("?", 1)[0]
+    if path.endswith("/reviews"):
+      self._send(200, [])
+    elif "/contents/" in path:
+      file_path = unquote(path.split("/contents/", 1)[1])
+      if file_path not in self.head_files:
+        self._send(404, {"message": "Not Found"})
+        return
+      content = generate_head_file(file_path, self.head_files[file_path]).encode()
+      self.stats.add(contents_requests=1, contents_bytes=len(content))
+      self._send(200, content, content_type=RAW_MEDIA_TYPE)
+    elif "/pulls/" in path and DIFF_MEDIA_TYPE in (self.headers.get("Accept") or ""):
+      self.stats.add(diff_bytes=len(self.diff))
+      self._send(200, self.diff, content_type=DIFF_MEDIA_TYPE)
+    elif "/pulls/" in path:
+      if self.headers.get("If-None-Match") == '"pr"':
+        self.send_response(304)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return
+      repo = path.split("/")[3]
+      self._send(200, {
+        "title": "Synthetic benchmark PR",
+        "body": "Generated by benchmarks.synthetic",
+        "head": {"sha": HEAD_SHA},
+        "base": {"sha": BASE_SHA, "repo": {"name": repo}},
+      }, headers={"ETag": '"pr"'})
+    else:
+      self._send(404, {"message": "Not Found"})
+
+  def do_POST(self) -> None:
+    if self._handle_stats():
+      return
+    self.stats.add(requests=1)
+    payload = self._read_json()
+    if self.path.endswith("/reviews"):
+      self.stats.add(reviews=1, comments=len(payload.get("comments", [])))
+      self._send(200, {"id": 1})
+    else:
+      self._send(404, {"message": "Not Found"})
+
+
+class MockLLMHandler(_Handler):
+  """
+  Answers chat completions with configurable latency and error rate.
+
+  Every hunk of an answered request has its first target line reviewed with
+  probability `comment_rate`, echoing the hunk id and file path the way the
+  prompt asks, so comments of batched requests flow through to the GitHub
+  mock too.
+  Requests without structured output (no `response_format` or `tools`) are
+  answered with prose around a fenced JSON block with probability
+  `malformed_rate`, the way models often ignore plain JSON instructions.
+  A system prompt seen before is reported as cached input tokens, like the
+  providers' prompt caches. Requests with `stream` are answered with
+  server-sent events in the provider's format, the content split into
+  small pieces.
+  """
+
+  latency: float = 0.0
+  jitter: float = 0.0
+  error_rate: float = 0.0
+  comment_rate: float = 0.5
+  malformed_rate: float = 0.0
+  rng = random.Random(0)
+  seen_prefixes: set = set()
+
+  def do_POST(self) -> None:
+    if self._handle_stats():
+      return
+    started = time.perf_counter()
+    payload = self._read_json()
+    self.stats.add(requests=1)
+    time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    if self.rng.random() < self.error_rate:
+      self.stats.add(errors=1)
+      self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                 headers={"retry-after-ms": "50"})
+      return
+
+    if self.path.endswith("/chat/completions"):
+      prefix = "".join(m.get("content") or "" for m in payload["messages"] if m["role"] == "system")
+      prompt = prefix + "".join(m.get("content") or "" for m in payload["messages"] if m["role"] != "system")
+    elif self.path.endswith("/messages"):
+      prefix = _text(payload.get("system"))
+      prompt = prefix + "".join(_text(message["content"]) for message in payload["messages"])
+    else:
+      self._send(404, {"error": {"message": "Not Found"}})
+      return
+    cached_tokens = len(prefix) // 4 if prefix in self.seen_prefixes else 0
+    self.seen_prefixes.add(prefix)
+
+    reviews = {"reviews": self._reviews(prompt)}
+    content = json.dumps(reviews)
+    structured = "response_format" in payload or "tools" in payload
+    if not structured and self.rng.random() < self.malformed_rate:
+      self.stats.add(malformed=1)
+      content = f"Here is my review of the changes:\n```json\n{content}\n```\nLet me know if you need more detail."
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    self.stats.add(
+      prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached_tokens,
+      busy_seconds=time.perf_counter() - started
+    )
+    # Anthropic reports cached tokens separately from input_tokens
+    anthropic_usage = {
+      "input_tokens": prompt_tokens - cached_tokens, "output_tokens": completion_tokens,
+      "cache_creation_input_tokens": 0, "cache_read_input_tokens": cached_tokens,
+    }
+    if payload.get("stream"):
+      if self.path.endswith("/chat/completions"):
+        events = self._openai_events(payload, content, prompt_tokens, completion_tokens, cached_tokens)
+      else:
+        events = self._anthropic_events(payload, content, anthropic_usage)
+      self._send(200, "".join(events).encode(), content_type="text/event-stream")
+    elif self.path.endswith("/chat/completions"):
+      self._send(200, {
+        "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+        "model": payload.get("model", "mock"),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {
+          "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+          "total_tokens": prompt_tokens + completion_tokens,
+          "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+      })
+    elif "tools" in payload:
+      self._send(200, {
+        "id": "msg_bench", "type": "message", "role": "assistant", "model": payload.get("model", "mock"),
+        "content": [{"type": "tool_use", "id": "toolu_bench", "name": payload["tools"][0]["name"], "input": reviews}],
+        "stop_reason": "tool_use", "stop_sequence": None,
+        "usage": anthropic_usage,
+      })
+    else:
+      self._send(200, {
+        "id": "msg_bench", "type": "message", "role": "assistant", "model": payload.get("model", "mock"),
+        "content": [{"type": "text", "text": content}], "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": anthropic_usage,
+      })
+
+  @staticmethod
+  def _pieces(content: str):
+    return [content[index:index + STREAM_PIECE_CHARS] for index in range(0, len(content), STREAM_PIECE_CHARS)]
+
+  def _openai_events(self, payload: Dict[str, Any], content: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int):
+    chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+             "model": payload.get("model", "mock")}
+    chunks = [dict(chunk, choices=[{"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}])
+              for piece in self._pieces(content)]
+    chunks.append(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+    chunks.append(dict(chunk, choices=[], usage={
+      "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+      "total_tokens": prompt_tokens + completion_tokens, "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }))
+    return [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"]
+
+  def _anthropic_events(self, payload: Dict[str, Any], content: str, usage: Dict[str, int]):
+    tool = "tools" in payload
+    message = {"id": "msg_bench", "type": "message", "role": "assistant", "model": payload.get("model", "mock"),
+               "content": [], "stop_reason": None, "stop_sequence": None, "usage": dict(usage, output_tokens=1)}
+    block = ({"type": "tool_use", "id": "toolu_bench", "name": payload["tools"][0]["name"], "input": {}} if tool
+             else {"type": "text", "text": ""})
+    events = [{"type": "message_start", "message": message},
+              {"type": "content_block_start", "index": 0, "content_block": block}]
+    events.extend(
+      {"type": "content_block_delta", "index": 0,
+       "delta": {"type": "input_json_delta", "partial_json": piece} if tool else {"type": "text_delta", "text": piece}}
+      for piece in self._pieces(content)
+    )
+    events.extend([
+      {"type": "content_block_stop", "index": 0},
+      {"type": "message_delta", "delta": {"stop_reason": "tool_use" if tool else "end_turn", "stop_sequence": None},
+       "usage": {"output_tokens": usage["output_tokens"]}},
+      {"type": "message_stop"},
+    ])
+    return [f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events]
+
+  def _reviews(self, prompt: str):
+    return [
+      {"hunkId": int(match.group(1)), "filepath": match.group(2), "lineNumber": int(match.group(3)),
+       "reviewComment": "Consider a guard clause here.", "side": "right"}
+      for match in HUNK_SECTION_PATTERN.finditer(prompt)
+      if self.rng.random() < self.comment_rate
+    ]
+
+
+def _text(content: Any) -> str:
+  """Text of an Anthropic system prompt or message content: a string or a list of blocks."""
+  if isinstance(content, str):
+    return content
+  return "".join(block.get("text", "") for block in content or [])
+
+
+class _Server(ThreadingHTTPServer):
+  # Hundreds of concurrent clients connect at once; the default backlog of 5 drops SYNs
+  request_queue_size = 1024
+  daemon_threads = True
+
+
+def start_server(handler: type, port: int = 0) -> ThreadingHTTPServer:
+  """Starts a mock server on a background thread and returns it."""
+  server = _Server(("127.0.0.1", port), handler)
+  threading.Thread(target=server.serve_forever, name=handler.__name__, daemon=True).start()
+  return server
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Serve mock GitHub and LLM APIs for benchmarks")
+  parser.add_argument("--files", type=int, default=20)
+  parser.add_argument("--hunks", type=int, default=5)
+  parser.add_argument("--lines", type=int, default=20)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--latency", type=float, default=0.05, help="Mean LLM latency in seconds")
+  parser.add_argument("--jitter", type=float, default=0.0, help="Uniform LLM latency jitter in seconds")
+  parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of LLM requests answered with 429")
+  parser.add_argument("--comment-rate", type=float, default=0.5)
+  parser.add_argument("--malformed-rate", type=float, default=0.0,
+                      help="Fraction of unstructured LLM answers wrapped in prose and code fences")
+  args = parser.parse_args()
+
+  diff = generate_diff(args.files, args.hunks, args.lines, args.seed)
+  github = type("GitHubHandler", (MockGitHubHandler,), {
+    "stats": _Stats(), "diff": diff.encode(), "head_files": head_line_counts(diff),
+  })
+  llm = type("LLMHandler", (MockLLMHandler,), {
+    "stats": _Stats(), "latency": args.latency, "jitter": args.jitter,
+    "error_rate": args.error_rate, "comment_rate": args.comment_rate,
+    "malformed_rate": args.malformed_rate, "rng": random.Random(args.seed),
+  })
+  github_server = start_server(github)
+  llm_server = start_server(llm)
+  print(json.dumps({"github_port": github_server.server_address[1], "llm_port": llm_server.server_address[1]}))
+  sys.stdout.flush()
+  try:
+    sys.stdin.read()
+  except KeyboardInterrupt:
+    pass
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,349 @@
+"""
+Offline throughput benchmarks of the review hot paths.
+
+Usage (from the repository root):
+
+  python -m benchmarks.run_benchmarks --files 50 --hunks 8 --lines 30 --latency 0.2
+
+Scenarios:
+  parse     DiffParser over a synthetic diff, no I/O
+  analyze   CodeAnalyzer + AIService against the mock LLM server
+  end2end   PRReviewApplication against the mock GitHub and LLM servers
+
+GitHub and the LLM provider are replaced by the local servers of
+`benchmarks.mock_servers`, started in a subprocess so that their work does
+not show up in the measured process. The services are pointed at them
+through GITHUB_API_URL and OPENAI_BASE_URL / ANTHROPIC_BASE_URL.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+from .synthetic import generate_diff
+
+SCENARIOS = ("parse", "analyze", "end2end", "service")
+
+
+class MockServers:
+  """Runs `benchmarks.mock_servers` in a subprocess for the duration of a `with` block."""
+
+  def __init__(self, args: argparse.Namespace):
+    self.args = args
+    self.process: Optional[subprocess.Popen] = None
+    self.github_url = self.llm_url = ""
+
+  def __enter__(self) -> 'MockServers':
+    command = [
+      sys.executable, "-m", "benchmarks.mock_servers",
+      "--files", str(self.args.files), "--hunks", str(self.args.hunks), "--lines", str(self.args.lines),
+      "--seed", str(self.args.seed), "--latency", str(self.args.latency), "--jitter", str(self.args.jitter),
+      "--error-rate", str(self.args.error_rate), "--comment-rate", str(self.args.comment_rate),
+      "--malformed-rate", str(self.args.malformed_rate),
+    ]
+    self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    ports = json.loads(self.process.stdout.readline())
+    self.github_url = f"http://127.0.0.1:{ports['github_port']}"
+    self.llm_url = f"http://127.0.0.1:{ports['llm_port']}"
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    self.process.stdin.close()
+    self.process.wait(timeout=10)
+
+  def stats(self, base_url: str) -> Dict[str, float]:
+    with urllib.request.urlopen(f"{base_url}/_stats") as response:
+      return json.loads(response.read())
+
+  def reset(self) -> None:
+    for base_url in (self.github_url, self.llm_url):
+      urllib.request.urlopen(urllib.request.Request(f"{base_url}/_reset", data=b"{}", method="POST")).close()
+
+
+def configure_environment(args: argparse.Namespace, servers: MockServers, event_path: str) -> None:
+  """
+  Points the application at the mock servers.
+
+  Must run before anything under `src` is imported: Config reads the
+  environment at import time.
+  """
+  os.environ.update({
+    "GITHUB_TOKEN": "benchmark-token",
+    "GITHUB_API_URL": servers.github_url,
+    "GITHUB_EVENT_PATH": event_path,
+    "PRIMARY_MODEL": args.provider,
+    "MAX_CONCURRENCY": str(args.concurrency),
+    "ASYNC_REVIEW": "true" if args.use_async else "false",
+    "LLM_STREAMING": "true" if args.streaming else "false",
+    "STRUCTURED_OUTPUT": "true" if args.structured_output else "false",
+    "DIFF_SOURCE": "github",
+    "FILE_CONTEXT": "true" if args.file_context else "false",
+    "BATCH_TOKEN_BUDGET": str(args.batch_token_budget),
+    "LLM_RETRY_BASE_DELAY": "0.05",
+    "REVIEW_CACHE_PATH": "",
+    "INCREMENTAL_REVIEW": "false",
+  })
+  # File context is downloaded from the GitHub mock, not read from a checkout
+  os.environ.pop("GITHUB_WORKSPACE", None)
+  for key in ("GEMINI_API_KEY", "OPENAI_API_KEY", "ANTHROPIC_API_KEY"):
+    os.environ.pop(key, None)
+  if args.provider == "openai":
+    os.environ.update({"OPENAI_API_KEY": "benchmark-key", "OPENAI_BASE_URL": f"{servers.llm_url}/v1"})
+  else:
+    os.environ.update({
+      "ANTHROPIC_API_KEY": "benchmark-key", "ANTHROPIC_BASE_URL": servers.llm_url,
+      "ANTHROPIC_MODEL": os.environ.get("ANTHROPIC_MODEL") or "claude-3-5-haiku-latest",
+    })
+
+
+def percentile(samples: List[float], pct: float) -> float:
+  """Nearest-rank percentile of `samples`, 0.0 when empty."""
+  if not samples:
+    return 0.0
+  ordered = sorted(samples)
+  return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def measure(run: Callable[[], Any], trace_memory: bool) -> Dict[str, float]:
+  """Times `run` and, optionally, records its peak traced memory."""
+  if trace_memory:
+    tracemalloc.start()
+  started = time.perf_counter()
+  run()
+  elapsed = time.perf_counter() - started
+  result = {"seconds": elapsed}
+  if trace_memory:
+    result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+  return result
+
+
+def time_llm_requests(ai_service: Any, latencies: List[float]) -> None:
+  """Records the client-side latency of every LLM request made through `ai_service`."""
+  get_ai_response = ai_service.get_ai_response
+  aget_ai_response = ai_service.aget_ai_response
+  lock = threading.Lock()
+
+  def timed(prompt: str):
+    started = time.perf_counter()
+    try:
+      return get_ai_response(prompt)
+    finally:
+      with lock:
+        latencies.append(time.perf_counter() - started)
+
+  async def atimed(prompt: str):
+    started = time.perf_counter()
+    try:
+      return await aget_ai_response(prompt)
+    finally:
+      with lock:
+        latencies.append(time.perf_counter() - started)
+
+  ai_service.get_ai_response = timed
+  ai_service.aget_ai_response = atimed
+
+
+def failed_requests() -> int:
+  """LLM requests of this process that got no answer, from the run metrics."""
+  from src.utils.metrics import metrics
+
+  return metrics.report()["counters"].get("failed_requests", 0)
+
+
+def bench_parse(args: argparse.Namespace, diff: str, hunk_count: int) -> Dict[str, Any]:
+  from src.utils.diff_parser import DiffParser
+
+  parser = DiffParser()
+  runs = [measure(lambda: parser.parse_diff(diff), trace_memory=False)["seconds"] for _ in range(args.repeat)]
+  memory = measure(lambda: parser.parse_diff(diff), trace_memory=True)
+  best = min(runs)
+  return {"seconds": best, "hunks_per_sec": hunk_count / best, "peak_mb": memory["peak_mb"]}
+
+
+def bench_analyze(args: argparse.Namespace, diff: str, hunk_count: int, servers: MockServers) -> Dict[str, Any]:
+  from src.core.models import PRDetails
+  from src.services.ai_service import AIService
+  from src.utils.code_analyzer import CodeAnalyzer
+  from src.utils.diff_parser import DiffParser
+
+  ai_service = AIService()
+  latencies: List[float] = []
+  time_llm_requests(ai_service, latencies)
+  analyzer = CodeAnalyzer(ai_service)
+  pr_details = PRDetails("bench", "repo", 1, "Synthetic benchmark PR", "Generated by benchmarks.synthetic")
+  comments: List[Any] = []
+  servers.reset()
+  failed_before = failed_requests()
+  try:
+    result = measure(
+      lambda: comments.extend(analyzer.analyze_code(DiffParser().iter_files(DiffParser.split_lines(diff)), pr_details)),
+      args.trace_memory
+    )
+  finally:
+    ai_service.close()
+  return _with_llm_stats(
+    result, hunk_count, latencies, servers, comments=len(comments), failed=failed_requests() - failed_before
+  )
+
+
+def bench_end2end(args: argparse.Namespace, hunk_count: int, servers: MockServers) -> Dict[str, Any]:
+  from src.main import PRReviewApplication
+
+  app = PRReviewApplication()
+  latencies: List[float] = []
+  time_llm_requests(app.ai_service, latencies)
+  servers.reset()
+  failed_before = failed_requests()
+  result = measure(app.run, args.trace_memory)
+  github_stats = servers.stats(servers.github_url)
+  return _with_llm_stats(
+    result, hunk_count, latencies, servers, failed=failed_requests() - failed_before,
+    comments=int(github_stats.get("comments", 0)), github_requests=int(github_stats.get("requests", 0)),
+    contents_requests=int(github_stats.get("contents_requests", 0))
+  )
+
+
+def bench_service(args: argparse.Namespace, hunk_count: int, servers: MockServers) -> Dict[str, Any]:
+  from src.main import PRReviewApplication
+  from src.utils.review_service import ReviewService
+
+  app = PRReviewApplication()
+  latencies: List[float] = []
+  time_llm_requests(app.ai_service, latencies)
+  servers.reset()
+  service = ReviewService(app)
+
+  def run() -> None:
+    service.start()
+    # The GitHub mock serves the same pull request under every number
+    for pull_number in range(1, args.service_jobs + 1):
+      service.submit(("bench", "repo", pull_number))
+    service.join()
+    service.stop()
+    app.close()
+
+  failed_before = failed_requests()
+  result = measure(run, args.trace_memory)
+  github_stats = servers.stats(servers.github_url)
+  return _with_llm_stats(
+    result, hunk_count * args.service_jobs, latencies, servers, failed=failed_requests() - failed_before,
+    comments=int(github_stats.get("comments", 0)), github_requests=int(github_stats.get("requests", 0))
+  )
+
+
+def _with_llm_stats(
+  result: Dict[str, Any], hunk_count: int, latencies: List[float], servers: MockServers, **extra: Any
+) -> Dict[str, Any]:
+  llm_stats = servers.stats(servers.llm_url)
+  result.update({
+    "hunks_per_sec": hunk_count / result["seconds"],
+    "llm_requests": int(llm_stats.get("requests", 0)),
+    "llm_errors": int(llm_stats.get("errors", 0)),
+    "p50_ms": percentile(latencies, 50) * 1000,
+    "p95_ms": percentile(latencies, 95) * 1000,
+    "prompt_tokens": int(llm_stats.get("prompt_tokens", 0)),
+    "cached_tokens": int(llm_stats.get("cached_tokens", 0)),
+    "completion_tokens": int(llm_stats.get("completion_tokens", 0)),
+  })
+  result.update(extra)
+  return result
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+  columns = [
+    ("seconds", "time (s)", "{:.3f}"), ("hunks_per_sec", "hunks/s", "{:.1f}"), ("p50_ms", "p50 (ms)", "{:.1f}"),
+    ("p95_ms", "p95 (ms)", "{:.1f}"), ("peak_mb", "peak MB", "{:.1f}"), ("llm_requests", "LLM reqs", "{}"),
+    ("prompt_tokens", "in tokens", "{}"), ("cached_tokens", "cached", "{}"), ("completion_tokens", "out tokens", "{}"), ("comments", "comments", "{}"),
+    ("failed", "failed", "{}"),
+  ]
+  header = f"{'scenario':<10}" + "".join(f"{title:>12}" for _, title, _ in columns)
+  print(header)
+  print("-" * len(header))
+  for name, result in results.items():
+    cells = "".join(
+      f"{fmt.format(result[key]) if key in result else '-':>12}" for key, _, fmt in columns
+    )
+    print(f"{name:<10}{cells}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+  parser = argparse.ArgumentParser(description="Benchmark the review pipeline against local mock servers")
+  parser.add_argument("--files", type=int, default=20, help="Files in the synthetic diff")
+  parser.add_argument("--hunks", type=int, default=5, help="Hunks per file")
+  parser.add_argument("--lines", type=int, default=20, help="Changed lines per hunk")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--latency", type=float, default=0.05, help="Mean mock LLM latency in seconds")
+  parser.add_argument("--jitter", type=float, default=0.0, help="Uniform mock LLM latency jitter in seconds")
+  parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of LLM requests answered with 429")
+  parser.add_argument("--comment-rate", type=float, default=0.5, help="Fraction of LLM answers with a comment")
+  parser.add_argument("--malformed-rate", type=float, default=0.0,
+                      help="Fraction of unstructured LLM answers wrapped in prose and code fences")
+  parser.add_argument("--no-structured-output", dest="structured_output", action="store_false",
+                      help="Disable STRUCTURED_OUTPUT so answers go through the tolerant parser")
+  parser.add_argument("--no-file-context", dest="file_context", action="store_false",
+                      help="Disable FILE_CONTEXT so prompts carry the diff only")
+  parser.add_argument("--patch-file", action="store_true",
+                      help="Read the diff from a patch file (DIFF_SOURCE=patch) instead of the GitHub mock")
+  parser.add_argument("--provider", choices=("openai", "anthropic"), default="openai")
+  parser.add_argument("--concurrency", type=int, default=4, help="MAX_CONCURRENCY of the reviewer")
+  parser.add_argument("--async", dest="use_async", action="store_true",
+                      help="Use the async provider clients (ASYNC_REVIEW)")
+  parser.add_argument("--streaming", action="store_true",
+                      help="Stream LLM responses (LLM_STREAMING); combine with --async for the async clients")
+  parser.add_argument("--service-jobs", type=int, default=4,
+                      help="Pull requests reviewed by the service scenario (SERVICE_MAX_JOBS at once)")
+  parser.add_argument("--batch-token-budget", type=int, default=0, help="BATCH_TOKEN_BUDGET of the reviewer")
+  parser.add_argument("--repeat", type=int, default=5, help="Repetitions of the parse scenario (best is kept)")
+  parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ", ".join(SCENARIOS))
+  parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false",
+                      help="Skip tracemalloc in the network scenarios; it slows down Python code noticeably")
+  parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+  return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  args = parse_args(argv)
+  scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+  diff = generate_diff(args.files, args.hunks, args.lines, args.seed)
+  hunk_count = args.files * args.hunks
+  print(f"Synthetic diff: {args.files} files x {args.hunks} hunks x {args.lines} lines ({len(diff) / 1024:.0f} KiB)")
+
+  results: Dict[str, Dict[str, Any]] = {}
+  with tempfile.TemporaryDirectory() as workdir, MockServers(args) as servers:
+    event_path = os.path.join(workdir, "event.json")
+    with open(event_path, "w") as f:
+      json.dump({"number": 1, "repository": {"full_name": "bench/repo"}}, f)
+    configure_environment(args, servers, event_path)
+    if args.patch_file:
+      # Same diff as the GitHub mock serves, read from disk instead
+      patch_path = os.path.join(workdir, "pr.diff")
+      with open(patch_path, "w") as f:
+        f.write(diff)
+      os.environ.update({"DIFF_SOURCE": "patch", "DIFF_PATCH_PATH": patch_path})
+
+    if "parse" in scenarios:
+      results["parse"] = bench_parse(args, diff, hunk_count)
+    if "analyze" in scenarios:
+      results["analyze"] = bench_analyze(args, diff, hunk_count, servers)
+    if "end2end" in scenarios:
+      results["end2end"] = bench_end2end(args, hunk_count, servers)
+    if "service" in scenarios:
+      results["service"] = bench_service(args, hunk_count, servers)
+
+  print()
+  print_report(results)
+  if args.json_path:
+    with open(args.json_path, "w") as f:
+      json.dump({"arguments": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+  main()
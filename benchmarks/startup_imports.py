@@ -0,0 +1,59 @@
+"""
+Measures the import cost of the application and of each provider SDK.
+
+Usage (from the repository root):
+
+  python -m benchmarks.startup_imports --repeat 5
+
+Every measurement runs in a fresh interpreter, so nothing is served from
+`sys.modules`. The `app` row is what every run pays; each provider row is
+the extra cost of initializing that provider.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# What each row imports, on top of the application modules for provider rows
+TARGETS: Dict[str, str] = {
+  "app": "import src.main",
+  "gemini": "import src.services.llms.gemini",
+  "openai": "import src.services.llms.openai",
+  "anthropic": "import src.services.llms.anthropic",
+}
+
+_TIMER = """
+import time
+{preload}
+started = time.perf_counter()
+{statement}
+print(time.perf_counter() - started)
+"""
+
+
+def time_import(statement: str, preload: str = "") -> float:
+  """Seconds spent running `statement` in a fresh interpreter after `preload`."""
+  env = dict(os.environ, GITHUB_TOKEN=os.environ.get("GITHUB_TOKEN") or "benchmark-token")
+  output = subprocess.run(
+    [sys.executable, "-c", _TIMER.format(preload=preload, statement=statement)],
+    env=env, check=True, capture_output=True, text=True
+  ).stdout
+  return float(output.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  parser = argparse.ArgumentParser(description="Measure application and provider SDK import times")
+  parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per row (median is reported)")
+  args = parser.parse_args(argv)
+
+  print(f"{'import':<12}{'median (ms)':>14}{'min (ms)':>12}")
+  for name, statement in TARGETS.items():
+    preload = "" if name == "app" else TARGETS["app"]
+    samples = [time_import(statement, preload) * 1000 for _ in range(args.repeat)]
+    print(f"{name:<12}{statistics.median(samples):>14.1f}{min(samples):>12.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,96 @@
+import random
+from typing import List
+
+# Unchanged lines around every change, as `git diff` produces by default
+CONTEXT_LINES = 3
+
+_IDENTIFIERS = ["value", "items", "result", "config", "payload", "index", "buffer", "client", "total", "row"]
+_TEMPLATES = [
+  "{a} = {b} + {n}",
+  "if {a} > {n}:",
+  "    return {a}",
+  "for {a} in {b}:",
+  "{a}.append({b})",
+  "{a} = compute_{b}({n})",
+  "# TODO: handle {a} when {b} is empty",
+  "logger.debug('processing %s', {a})",
+]
+
+
+def generate_diff(files: int = 20, hunks: int = 5, lines: int = 20, seed: int = 0) -> str:
+  """
+  Generates a deterministic unified diff of `files` files with `hunks` hunks each.
+
+  Args:
+    files: Number of changed files
+    hunks: Number of hunks per file
+    lines: Number of changed (added or removed) lines per hunk
+    seed: Seed of the random generator, so both benchmark processes build the same diff
+
+  Returns:
+    str: The diff, in the format served by GitHub for `application/vnd.github.v3.diff`
+  """
+  rng = random.Random(seed)
+  out: List[str] = []
+  for file_index in range(files):
+    path = f"src/module_{file_index // 10}/file_{file_index}.py"
+    out.append(f"diff --git a/{path} b/{path}\n")
+    out.append(f"index {rng.getrandbits(28):07x}..{rng.getrandbits(28):07x} 100644\n")
+    out.append(f"--- a/{path}\n")
+    out.append(f"+++ b/{path}\n")
+
+    source_line = target_line = 1
+    for _ in range(hunks):
+      gap = rng.randint(20, 80)
+      source_line += gap
+      target_line += gap
+      body, removed, added = _hunk_body(rng, lines)
+      source_length = removed + 2 * CONTEXT_LINES
+      target_length = added + 2 * CONTEXT_LINES
+      out.append(f"@@ -{source_line},{source_length} +{target_line},{target_length} @@ def function_{target_line}():\n")
+      out.extend(body)
+      source_line += source_length
+      target_line += target_length
+  return "".join(out)
+
+
+def generate_head_file(path: str, line_count: int) -> str:
+  """
+  Generates head content for a file of the synthetic diff: one class whose
+  methods are ten lines long, so every hunk has an enclosing scope.
+
+  Args:
+    path: Path of the file, used to name the class
+    line_count: Number of lines to generate
+
+  Returns:
+    str: The file content, as served by the contents API
+  """
+  name = path.rsplit("/", 1)[-1].split(".", 1)[0].title().replace("_", "")
+  out = [f"class {name}:\n"]
+  for number in range(2, line_count + 1):
+    if number % 10 == 2:
+      out.append(f"    def method_{number}(self, value):\n")
+    else:
+      out.append(f"        value = compute(value, {number})\n")
+  return "".join(out)
+
+
+def _hunk_body(rng: random.Random, lines: int):
+  """Builds the lines of one hunk: context, a mix of removals and additions, context."""
+  body = [f" {_code_line(rng)}\n" for _ in range(CONTEXT_LINES)]
+  removed = added = 0
+  for _ in range(lines):
+    if rng.random() < 0.35:
+      body.append(f"-{_code_line(rng)}\n")
+      removed += 1
+    else:
+      body.append(f"+{_code_line(rng)}\n")
+      added += 1
+  body.extend(f" {_code_line(rng)}\n" for _ in range(CONTEXT_LINES))
+  return body, removed, added
+
+
+def _code_line(rng: random.Random) -> str:
+  template = rng.choice(_TEMPLATES)
+  return "    " + template.format(a=rng.choice(_IDENTIFIERS), b=rng.choice(_IDENTIFIERS), n=rng.randint(0, 999))
@@ -0,0 +1,13 @@
+#!/bin/sh
+# Docker actions receive their inputs as INPUT_<NAME>; expose them under the
+# names the application reads (INPUT_INPUT_EXCLUDE becomes INPUT_EXCLUDE).
+set -e
+
+for VAR in $(env | sed -n 's/^\(INPUT_[A-Z0-9_]*\)=.*/\1/p'); do
+  NAME="${VAR#INPUT_}"
+  if [ -z "$(printenv "$NAME")" ]; then
+    export "$NAME=$(printenv "$VAR")"
+  fi
+done
+
+exec python -m src.main "$@"
@@ -1,9 +1,19 @@
 import os
-from github import Github
+from ..services.github_client import GitHubClient
 from ..utils.language_validator import LanguageValidator
 
+def _parse_weights(raw: str) -> dict:
+    """Parse 'gemini=2,openai=1' into a provider -> weight mapping."""
+    weights = {}
+    for item in raw.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() and weight.strip():
+            weights[name.strip().lower()] = float(weight)
+    return weights
+
 class Config:
     GITHUB_TOKEN = os.environ["GITHUB_TOKEN"]
+    GITHUB_API_URL = os.environ.get('GITHUB_API_URL') or 'https://api.github.com'
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash-002')
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
@@ -14,8 +24,121 @@ class Config:
     _raw_language: str = os.environ.get('HUMAN_LANGUAGE', 'en')
     HUMAN_LANGUAGE = LanguageValidator.validate_language(_raw_language)
     PRIMARY_MODEL = os.environ.get('PRIMARY_MODEL', 'gemini')
+
+    # Provider routing: 'primary', 'round_robin' or 'least_outstanding'
+    PROVIDER_STRATEGY = (os.environ.get('PROVIDER_STRATEGY') or 'primary').lower()
+    PROVIDER_WEIGHTS = _parse_weights(os.environ.get('PROVIDER_WEIGHTS', ''))
+    # Duplicate a request on another provider once it exceeds this latency percentile (0 = off)
+    HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE') or 0)
+    HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES') or 10)
+
+    # Maximum number of hunk reviews in flight at once (1 = sequential)
+    MAX_CONCURRENCY = max(1, int(os.environ.get('MAX_CONCURRENCY') or 4))
+
+    # Pack several hunks into one request up to this many diff tokens (0 = one hunk per request)
+    BATCH_TOKEN_BUDGET = int(os.environ.get('BATCH_TOKEN_BUDGET') or 0)
+    # Hunks whose prompt exceeds this are split at line boundaries
+    MAX_PROMPT_TOKENS = int(os.environ.get('MAX_PROMPT_TOKENS') or 12000)
+    # Neighbouring hunks of the same file smaller than this are merged into one request
+    MIN_HUNK_TOKENS = int(os.environ.get('MIN_HUNK_TOKENS') or 100)
+
+    # Ask providers for schema-constrained JSON (OpenAI json_schema, Anthropic tool use,
+    # Gemini response_schema); disable for models without structured-output support
+    STRUCTURED_OUTPUT = (os.environ.get('STRUCTURED_OUTPUT') or 'true').lower() == 'true'
+
+    # Store prompt prefixes of at least this many tokens as a Gemini context cache
+    # (0 = off); the API does not cache anything shorter than 32768 tokens
+    GEMINI_CACHE_MIN_TOKENS = int(os.environ.get('GEMINI_CACHE_MIN_TOKENS') or 32768)
+
+    # Drive LLM requests with the providers' async clients on one event loop instead of
+    # a thread per request; MAX_CONCURRENCY can then be raised to hundreds cheaply
+    ASYNC_REVIEW = (os.environ.get('ASYNC_REVIEW') or 'false').lower() == 'true'
+
+    # Stream LLM responses and parse each review as it closes; reviews received before a
+    # dropped connection or the output token limit are kept instead of lost
+    LLM_STREAMING = (os.environ.get('LLM_STREAMING') or 'false').lower() == 'true'
+
+    # Capacity of the queues between the fetch, review and post stages
+    PIPELINE_QUEUE_SIZE = max(1, int(os.environ.get('PIPELINE_QUEUE_SIZE') or 16))
+    # Post a review every N comments as they are ready (0 = one review at the end)
+    REVIEW_POST_BATCH_SIZE = int(os.environ.get('REVIEW_POST_BATCH_SIZE') or 20)
+    # On new pushes, only review hunks changed since the last completed review
+    INCREMENTAL_REVIEW = (os.environ.get('INCREMENTAL_REVIEW') or 'true').lower() == 'true'
+    # Account reviews are posted as, whose reviewed-commit markers are trusted
+    # (empty = look it up from the token; github-actions[bot] for the Actions token)
+    REVIEWER_LOGIN = os.environ.get('REVIEWER_LOGIN') or None
+
+    # Where diffs come from: `github` (API), `git` (`git diff` in the local clone, falling
+    # back to the API when it lacks the commits) or `patch` (DIFF_PATCH_PATH)
+    DIFF_SOURCE = (os.environ.get('DIFF_SOURCE') or 'github').lower()
+    # Options of the `git` source: context lines, `--diff-filter` and a bundle to import first
+    DIFF_CONTEXT_LINES = int(os.environ.get('DIFF_CONTEXT_LINES') or 3)
+    DIFF_FILTER = os.environ.get('DIFF_FILTER') or 'ACMR'
+    DIFF_BUNDLE_PATH = os.environ.get('DIFF_BUNDLE_PATH') or ''
+    # Diff of the `patch` source, e.g. saved `git diff base...head` output
+    DIFF_PATCH_PATH = os.environ.get('DIFF_PATCH_PATH') or ''
+
+    # Show the enclosing function or class of each hunk, read from the PR head once per file
+    FILE_CONTEXT = (os.environ.get('FILE_CONTEXT') or 'true').lower() == 'true'
+    # Longest enclosing scope shown per hunk, in lines
+    FILE_CONTEXT_MAX_LINES = int(os.environ.get('FILE_CONTEXT_MAX_LINES') or 60)
+    # Files larger than this get no enclosing scope
+    FILE_CONTEXT_MAX_BYTES = int(os.environ.get('FILE_CONTEXT_MAX_BYTES') or 1024 * 1024)
+
+    # Skip files marked `linguist-generated` in the repository's .gitattributes
+    SKIP_GENERATED_FILES = (os.environ.get('SKIP_GENERATED_FILES') or 'true').lower() == 'true'
+
+    # Service mode (`python -m src.main serve`): pull requests reviewed at once; their LLM
+    # requests share MAX_CONCURRENCY
+    SERVICE_MAX_JOBS = max(1, int(os.environ.get('SERVICE_MAX_JOBS') or 4))
+    # Secret of the GitHub webhook posting to the service, required to accept deliveries;
+    # deliveries without a valid signature are rejected
+    WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or ''
+
+    # Machine-readable timing and token report of the run (empty = not written)
+    RUN_REPORT_PATH = os.environ.get('RUN_REPORT_PATH') or ''
+    # Job summary file provided by GitHub Actions
+    STEP_SUMMARY_PATH = os.environ.get('GITHUB_STEP_SUMMARY') or ''
+
+    # Retries of rate-limited or transient LLM failures, with jittered exponential backoff
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES') or 4)
+    LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY') or 1.0)
+    LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY') or 60.0)
+
+    # Client-side rate limits per provider, in requests / tokens per minute (0 = unlimited)
+    GEMINI_RPM = float(os.environ.get('GEMINI_RPM') or 0)
+    GEMINI_TPM = float(os.environ.get('GEMINI_TPM') or 0)
+    OPENAI_RPM = float(os.environ.get('OPENAI_RPM') or 0)
+    OPENAI_TPM = float(os.environ.get('OPENAI_TPM') or 0)
+    ANTHROPIC_RPM = float(os.environ.get('ANTHROPIC_RPM') or 0)
+    ANTHROPIC_TPM = float(os.environ.get('ANTHROPIC_TPM') or 0)
+
+    # Review one of each group of near-identical hunks: `off`, `fanout` (copy its comments
+    # to the others) or `collapse` (list the other locations in its comments)
+    DEDUP_MODE = (os.environ.get('DEDUP_MODE') or 'off').lower()
+    # Estimated similarity of normalized changes from which hunks count as duplicates
+    DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD') or 0.9)
+    # Smaller hunks are only grouped when their changes are identical
+    DEDUP_MIN_CHANGED_LINES = int(os.environ.get('DEDUP_MIN_CHANGED_LINES') or 4)
+
+    # Review budget (0 = unlimited): estimated input tokens, seconds and USD of LLM requests.
+    # With any limit set, hunks are reviewed most valuable first and the rest is skipped
+    REVIEW_MAX_TOKENS = int(os.environ.get('REVIEW_MAX_TOKENS') or 0)
+    REVIEW_MAX_SECONDS = float(os.environ.get('REVIEW_MAX_SECONDS') or 0)
+    REVIEW_MAX_COST = float(os.environ.get('REVIEW_MAX_COST') or 0)
+    # Prices in USD per million tokens, for REVIEW_MAX_COST
+    LLM_INPUT_PRICE = float(os.environ.get('LLM_INPUT_PRICE') or 0)
+    LLM_OUTPUT_PRICE = float(os.environ.get('LLM_OUTPUT_PRICE') or 0)
+    # Extra gitignore-style patterns of security-sensitive paths, reviewed first under a budget
+    SENSITIVE_PATHS = os.environ.get('SENSITIVE_PATHS') or ''
+
+    # Persistent review cache (disabled when REVIEW_CACHE_PATH is empty)
+    REVIEW_CACHE_PATH = os.environ.get('REVIEW_CACHE_PATH', '')
+    REVIEW_CACHE_TTL = int(os.environ.get('REVIEW_CACHE_TTL') or 7 * 24 * 3600)
+    REVIEW_CACHE_MAX_ENTRIES = int(os.environ.get('REVIEW_CACHE_MAX_ENTRIES') or 5000)
     
     @classmethod
     def initialize_clients(cls):
-        gh_client = Github(cls.GITHUB_TOKEN)
+        # One pooled session serves every GitHub call: sized for the poster plus fetch threads
+        gh_client = GitHubClient(cls.GITHUB_TOKEN, api_url=cls.GITHUB_API_URL, pool_size=cls.MAX_CONCURRENCY + 2)
         return gh_client
@@ -1,5 +1,9 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+import re
+from array import array
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
 
 @dataclass
 class PRDetails:
@@ -8,7 +12,140 @@ class PRDetails:
     pull_number: int
     title: str
     description: str
+    head_sha: str = ''
+    base_sha: str = ''
 
 @dataclass
 class FileInfo:
     path: str
+
+@dataclass(frozen=True)
+class ReviewPrompt:
+    """
+    A review prompt split for provider-side prompt caching.
+
+    `prefix` holds the instructions and PR context and is identical for
+    every request of a pull request; `suffix` holds the hunks under review.
+    """
+    prefix: str
+    suffix: str
+
+    def __str__(self) -> str:
+        return self.prefix + self.suffix
+
+class DiffHunk:
+    """
+    Compact representation of a single diff hunk.
+
+    The hunk body is kept as one string holding the raw diff lines, with an
+    array of line start offsets into it, instead of one object per line.
+    The header is parsed once, when the hunk is built.
+    """
+
+    __slots__ = ('source_start', 'source_length', 'target_start', 'target_length', '_text', '_offsets')
+
+    def __init__(
+        self,
+        source_start: int,
+        source_length: int,
+        target_start: int,
+        target_length: int,
+        text: str = '',
+        offsets: Optional[array] = None
+    ):
+        self.source_start = source_start
+        self.source_length = source_length
+        self.target_start = target_start
+        self.target_length = target_length
+        self._text = text
+        self._offsets = offsets if offsets is not None else array('I', [0])
+
+    @classmethod
+    def from_lines(cls, header: str, lines: List[str]) -> 'DiffHunk':
+        """
+        Build a hunk from its `@@` header and raw body lines (with line endings).
+
+        Args:
+            header: Hunk header line
+            lines: Raw diff lines of the hunk body
+        """
+        match = HUNK_HEADER_PATTERN.match(header)
+        if match:
+            source_start = int(match.group(1))
+            source_length = int(match.group(2)) if match.group(2) else 1
+            target_start = int(match.group(3))
+            target_length = int(match.group(4)) if match.group(4) else 1
+        else:
+            source_start, source_length, target_start, target_length = 1, 1, 1, 1
+
+        offsets = array('I', [0])
+        position = 0
+        for line in lines:
+            position += len(line)
+            offsets.append(position)
+        return cls(source_start, source_length, target_start, target_length, ''.join(lines), offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __str__(self) -> str:
+        return (
+            f"@@ -{self.source_start},{self.source_length} "
+            f"+{self.target_start},{self.target_length} @@\n{self._text}"
+        )
+
+    def line(self, index: int) -> str:
+        """Return the raw diff line at `index`, without its line ending."""
+        return self._text[self._offsets[index]:self._offsets[index + 1]].rstrip('\r\n')
+
+    def iter_numbered(self) -> Iterator[Tuple[Optional[int], Optional[int], str]]:
+        """
+        Yield (source line number, target line number, raw line) for every line.
+
+        Added lines have no source number, removed lines have no target number
+        and "\\ No newline at end of file" markers have neither.
+        """
+        source_line = self.source_start
+        target_line = self.target_start
+        for index in range(len(self)):
+            raw = self.line(index)
+            prefix = raw[:1]
+            if prefix == '+':
+                yield None, target_line, raw
+                target_line += 1
+            elif prefix == '-':
+                yield source_line, None, raw
+                source_line += 1
+            elif prefix == '\\':
+                yield None, None, raw
+            else:
+                yield source_line, target_line, raw
+                source_line += 1
+                target_line += 1
+
+    def slice(self, start: int, stop: int) -> 'DiffHunk':
+        """
+        Return the lines [start, stop) as a new hunk of the same type,
+        with source and target ranges recomputed for the slice.
+        """
+        source_start, target_start = self.source_start, self.target_start
+        source_length = target_length = 0
+        for index, (source_line, target_line, _) in enumerate(self.iter_numbered()):
+            if index >= stop:
+                break
+            if index < start:
+                source_start += source_line is not None
+                target_start += target_line is not None
+            else:
+                source_length += source_line is not None
+                target_length += target_line is not None
+
+        base = self._offsets[start]
+        offsets = array('I', (offset - base for offset in self._offsets[start:stop + 1]))
+        text = self._text[base:self._offsets[stop]]
+        return type(self)(source_start, source_length, target_start, target_length, text, offsets)
+
+@dataclass
+class DiffFile:
+    path: str = ''
+    hunks: List[DiffHunk] = field(default_factory=list)
@@ -1,13 +1,21 @@
 import os
+import sys
 import json
-from typing import List, Dict, Any
-import fnmatch
+import requests
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Callable
 from .core.config import Config
-from .core.models import PRDetails
+from .core.models import PRDetails, DiffFile
 from .services.github_service import GitHubService
 from .services.ai_service import AIService
+from .services.diff_source import DiffSourceError, create_diff_source
 from .utils.diff_parser import DiffParser
 from .utils.code_analyzer import CodeAnalyzer
+from .utils.context_store import PRContextStore
+from .utils.review_pipeline import ReviewPipeline
+from .utils.incremental import ChangedLines
+from .utils.metrics import metrics
+from .utils.path_matcher import PathMatcher
+from .utils.review_service import serve
 
 class PRReviewApplication:
   def __init__(self) -> None:
@@ -17,10 +25,21 @@ class PRReviewApplication:
   def _setup_services(self) -> None:
     """Set up all required services."""
     gh_client = Config.initialize_clients()
-    self.github_service = GitHubService(gh_client)
+    self.github_service = GitHubService(gh_client, Config.REVIEWER_LOGIN)
+    self.diff_source = create_diff_source(self.github_service)
     self.ai_service = AIService()
     self.code_analyzer = CodeAnalyzer(self.ai_service)
     self.diff_parser = DiffParser()
+    self.exclude_matcher = PathMatcher(self._get_exclude_patterns())
+    self.include_matcher = PathMatcher(self._get_include_patterns())
+    self.generated_matcher = self._load_generated_matcher()
+    self.pipeline = self.create_pipeline(self.code_analyzer)
+
+  def create_pipeline(self, code_analyzer: CodeAnalyzer) -> ReviewPipeline:
+    """Create a review pipeline sharing this application's services and filters."""
+    return ReviewPipeline(
+      self.github_service, self.diff_parser, code_analyzer, self._filter_diff, diff_source=self.diff_source
+    )
 
   def run(self) -> None:
     """Execute the main PR review process."""
@@ -34,6 +53,27 @@ class PRReviewApplication:
 
     except Exception as error:
       print(f"Error: {error}")
+    finally:
+      self.close()
+
+  def close(self) -> None:
+    """Release provider and GitHub clients and write the run report."""
+    self.ai_service.close()
+    self.github_service.close()
+    self._write_run_report()
+
+  def _write_run_report(self) -> None:
+    """Write the timing and token report to RUN_REPORT_PATH and the job summary."""
+    for path, write in (
+      (Config.RUN_REPORT_PATH, metrics.write_json),
+      (Config.STEP_SUMMARY_PATH, metrics.write_step_summary),
+    ):
+      if not path:
+        continue
+      try:
+        write(path)
+      except OSError as e:
+        print(f"Failed to write run report to {path}: {e}")
 
   def _is_valid_event(self) -> bool:
     """Check if the GitHub event is supported."""
@@ -46,33 +86,112 @@ class PRReviewApplication:
   def _process_pr(self) -> bool:
     """Process the PR and create review comments if needed."""
     pr_details = self.github_service.get_pr_details(os.environ["GITHUB_EVENT_PATH"])
-    diff = self.github_service.get_diff(pr_details.owner, pr_details.repo, pr_details.pull_number)
-    
-    if not diff:
-      print("No diff found")
-      return False
+    return self.review_pull_request(pr_details)
+
+  def review_pull_request(self, pr_details: PRDetails, pipeline: Optional[ReviewPipeline] = None) -> bool:
+    """
+    Review one pull request and post the comments.
 
-    parsed_diff = self.diff_parser.parse_diff(diff)
-    filtered_diff = self._filter_diff(parsed_diff)
-    comments = self.code_analyzer.analyze_code(filtered_diff, pr_details)
-    
-    if comments:
-      self.github_service.create_review_comment(pr_details, comments)
+    Args:
+      pr_details: Pull request to review
+      pipeline: Pipeline to run it on, defaults to the application's own
+
+    Returns:
+      bool: True once the review has run
+    """
+    pipeline = pipeline or self.pipeline
+    file_filter = None
+    reviewed_sha = None
+    if Config.INCREMENTAL_REVIEW and pr_details.head_sha:
+      reviewed_sha = pr_details.head_sha
+      last_sha = self._get_last_reviewed_sha(pr_details)
+      if last_sha == pr_details.head_sha:
+        print(f"Commit {last_sha[:7]} was already reviewed, nothing to do")
+        return True
+      if last_sha:
+        file_filter = self._incremental_filter(pr_details, last_sha)
+
+    context_store = self._create_context_store(pr_details)
+    try:
+      # Fetching, reviewing and posting overlap; comments are posted in batches as they are ready
+      posted = pipeline.run(pr_details, file_filter, reviewed_sha, context_store)
+    finally:
+      if context_store is not None:
+        context_store.close()
+    print(f"Review of {pr_details.owner}/{pr_details.repo}#{pr_details.pull_number} finished: {posted} comments posted")
     return True
 
-  def _filter_diff(self, parsed_diff: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Filter diff based on exclude patterns from environment variables."""
-    exclude_patterns = self._get_exclude_patterns()
-    return [
-      file for file in parsed_diff
-      if not any(fnmatch.fnmatch(file.get('path', ''), pattern) 
-            for pattern in exclude_patterns)
-    ]
+  def _create_context_store(self, pr_details: PRDetails) -> Optional[PRContextStore]:
+    """Create the store serving each hunk's enclosing scope, or None when file context is off."""
+    if not Config.FILE_CONTEXT or not pr_details.head_sha:
+      return None
+    return PRContextStore(
+      self.github_service, pr_details, os.environ.get("GITHUB_WORKSPACE"),
+      max_lines=Config.FILE_CONTEXT_MAX_LINES, max_file_bytes=Config.FILE_CONTEXT_MAX_BYTES
+    )
+
+  def _get_last_reviewed_sha(self, pr_details: PRDetails) -> Optional[str]:
+    """Get the head commit of the last completed review, or None to review everything."""
+    try:
+      return self.github_service.get_last_reviewed_sha(pr_details)
+    except requests.RequestException as e:
+      print(f"Could not list previous reviews, reviewing the full diff: {e}")
+      return None
+
+  def _incremental_filter(
+    self, pr_details: PRDetails, last_sha: str
+  ) -> Optional[Callable[[Iterable[DiffFile]], Iterator[DiffFile]]]:
+    """
+    Build a filter keeping only hunks that changed since `last_sha`.
+
+    Returns:
+      The filter, or None to review the full diff when the commits cannot
+      be compared (e.g. `last_sha` disappeared in a force-push)
+    """
+    try:
+      compare_lines = self.diff_source.iter_compare_lines(pr_details, last_sha, pr_details.head_sha)
+      changed = ChangedLines.from_diff(self.diff_parser.iter_files(compare_lines))
+    except (requests.RequestException, DiffSourceError) as e:
+      print(f"Could not compare with reviewed commit {last_sha[:7]}, reviewing the full diff: {e}")
+      return None
+
+    print(f"Incremental review: only hunks changed since {last_sha[:7]}")
+    return lambda parsed_diff: changed.filter(self._filter_diff(parsed_diff))
+
+  def _filter_diff(self, parsed_diff: Iterable[DiffFile]) -> Iterator[DiffFile]:
+    """Filter diff based on include/exclude patterns and generated-file attributes."""
+    for file in parsed_diff:
+      if self._should_review(file.path):
+        yield file
+      else:
+        metrics.increment("files_skipped")
+
+  def _should_review(self, path: str) -> bool:
+    """Check whether a file passes the include, exclude and generated-file filters."""
+    if self.include_matcher and not self.include_matcher.matches(path):
+      return False
+    if self.exclude_matcher.matches(path):
+      return False
+    return not self.generated_matcher.matches(path)
 
   def _get_exclude_patterns(self) -> List[str]:
     """Get and process exclude patterns from environment variables."""
-    return [s.strip() for s in os.environ.get("INPUT_EXCLUDE", "").split(",")]
+    return [s.strip() for s in os.environ.get("INPUT_EXCLUDE", "").split(",") if s.strip()]
+
+  def _get_include_patterns(self) -> List[str]:
+    """Get include patterns from environment variables; empty means every file."""
+    return [s.strip() for s in os.environ.get("INPUT_INCLUDE", "").split(",") if s.strip()]
+
+  def _load_generated_matcher(self) -> PathMatcher:
+    """Load the files marked linguist-generated in the checked out repository's .gitattributes."""
+    if not Config.SKIP_GENERATED_FILES:
+      return PathMatcher([])
+    workspace = os.environ.get("GITHUB_WORKSPACE") or "."
+    return PathMatcher.from_gitattributes(os.path.join(workspace, ".gitattributes"))
 
 if __name__ == "__main__":
-  app = PRReviewApplication()
-  app.run()
+  if sys.argv[1:2] == ["serve"]:
+    serve(PRReviewApplication(), sys.argv[2:])
+  else:
+    app = PRReviewApplication()
+    app.run()
@@ -1,31 +1,94 @@
-from typing import List, Dict
-from unidiff import Hunk, PatchedFile
+import importlib
+from typing import List, Dict, Any, Optional, Tuple, Type
 
 from ..core.config import Config
-from ..core.models import PRDetails
-from .llms.gemini import GeminiService
-from .llms.openai import OpenAIService
-from .llms.anthropic import AnthropicService
+from ..core.models import PRDetails, FileInfo, DiffHunk, ReviewPrompt
+from .llms.base import BaseLLMService
+from .provider_router import ProviderRouter, ProviderSlot
+from .review_cache import ReviewCache
+from ..utils.event_loop import EventLoopThread
+from ..utils.metrics import metrics
+
+# Provider name -> (module, class) of its service. Modules are imported only when
+# their provider is initialized, so the SDKs of unused providers are never loaded.
+PROVIDER_MODULES: Dict[str, Tuple[str, str]] = {
+    'gemini': ('.llms.gemini', 'GeminiService'),
+    'openai': ('.llms.openai', 'OpenAIService'),
+    'anthropic': ('.llms.anthropic', 'AnthropicService'),
+}
+
+
+def load_provider(name: str) -> Type[BaseLLMService]:
+    """
+    Import the service class of a provider on first use.
+
+    Args:
+        name: Provider name, a key of PROVIDER_MODULES
+
+    Returns:
+        Type[BaseLLMService]: The provider's service class
+
+    Raises:
+        ImportError: If the provider's SDK is not installed
+    """
+    module_name, class_name = PROVIDER_MODULES[name]
+    return getattr(importlib.import_module(module_name, __package__), class_name)
+
 
 class AIService:
     """
     Service manager that handles selection and usage of available LLM services.
     Prioritizes Gemini if both services are available.
+
+    With PROVIDER_STRATEGY other than 'primary' (or hedging enabled), every
+    configured provider stays live and requests are spread across them.
+
+    With ASYNC_REVIEW, requests use the providers' async clients on one
+    shared event loop (`event_loop`) instead of a thread per request.
     """
     
     def __init__(self):
         """Initialize available LLM services based on configuration."""
         self.active_service = None
+        self.services: Dict[str, BaseLLMService] = {}
+        self.cache = self._initialize_cache()
         self._initialize_service()
+        self.router = ProviderRouter(
+            [
+                ProviderSlot(name, service, Config.PROVIDER_WEIGHTS.get(name, 1.0))
+                for name, service in self.services.items()
+            ],
+            strategy=Config.PROVIDER_STRATEGY,
+            hedge_percentile=Config.HEDGE_PERCENTILE,
+            hedge_min_samples=Config.HEDGE_MIN_SAMPLES,
+            max_workers=Config.MAX_CONCURRENCY,
+            asynchronous=Config.ASYNC_REVIEW
+        )
+        self.event_loop = EventLoopThread() if Config.ASYNC_REVIEW else None
+
+    def _initialize_cache(self) -> Optional[ReviewCache]:
+        """Open the persistent review cache if one is configured."""
+        if not Config.REVIEW_CACHE_PATH:
+            return None
+        try:
+            return ReviewCache(
+                Config.REVIEW_CACHE_PATH,
+                ttl_seconds=Config.REVIEW_CACHE_TTL,
+                max_entries=Config.REVIEW_CACHE_MAX_ENTRIES
+            )
+        except Exception as e:
+            print(f"Review cache disabled: {e}")
+            return None
 
     def _initialize_service(self) -> None:
-        """Initialize the appropriate LLM service based on available API keys."""
+        """
+        Initialize the appropriate LLM service based on available API keys.
+
+        The first available model becomes the active service. Further models
+        are only initialized when requests are routed across providers.
+        """
         PRIMARY_MODEL = getattr(Config, 'PRIMARY_MODEL', 'gemini').lower()
-        SUPPORTED_MODELS = {
-            'gemini': GeminiService,
-            'openai': OpenAIService,
-            'anthropic': AnthropicService
-        }
+        SUPPORTED_MODELS = PROVIDER_MODULES
 
         if PRIMARY_MODEL not in SUPPORTED_MODELS:
             print(f"Unsupported PRIMARY_MODEL '{PRIMARY_MODEL}'. Using default order.")
@@ -35,14 +98,20 @@ class AIService:
                 model for model in SUPPORTED_MODELS if model != PRIMARY_MODEL
             ]
 
+        route_across_providers = Config.PROVIDER_STRATEGY != 'primary' or Config.HEDGE_PERCENTILE > 0
+
         for model in ordered_models:
             if self.check_key_model_availability(model):
                 try:
-                    self.active_service = SUPPORTED_MODELS[model]()
+                    self.services[model] = load_provider(model)()
                     print(f"Initialized {model.title()} service")
-                    break
                 except Exception as e:
                     print(f"Failed to initialize {model.title()} service: {e}")
+                    continue
+                if not self.active_service:
+                    self.active_service = self.services[model]
+                if not route_across_providers:
+                    break
 
         if not self.active_service:
             raise ValueError("No LLM service could be initialized. Please check your API keys.")
@@ -59,7 +128,9 @@ class AIService:
         key_name = f"{model.upper()}_API_KEY"
         return hasattr(Config, key_name) and getattr(Config, key_name)
 
-    def create_prompt(self, file: PatchedFile, hunk: Hunk, pr_details: PRDetails) -> str:
+    def create_prompt(
+        self, file: FileInfo, hunk: DiffHunk, pr_details: PRDetails, scope: Optional[str] = None
+    ) -> ReviewPrompt:
         """
         Create a prompt using the active LLM service.
         
@@ -67,32 +138,140 @@ class AIService:
             file: The file being reviewed
             hunk: The code hunk to review
             pr_details: Pull request details
+            scope: Enclosing function or class of the hunk, if known
+            
+        Returns:
+            ReviewPrompt: Formatted prompt for the active LLM service
+        """
+        if not self.active_service:
+            raise RuntimeError("No active LLM service available")
+        return self.active_service.create_prompt(file, hunk, pr_details, scope)
+
+    def create_batch_prompt(
+        self,
+        entries: List[Tuple[FileInfo, DiffHunk]],
+        pr_details: PRDetails,
+        scopes: Optional[List[Optional[str]]] = None,
+    ) -> ReviewPrompt:
+        """
+        Create a prompt covering several hunks using the active LLM service.
+        
+        Args:
+            entries: (file, hunk) pairs to review together
+            pr_details: Pull request details
+            scopes: Enclosing function or class of each hunk, None where unknown
             
         Returns:
-            str: Formatted prompt for the active LLM service
+            ReviewPrompt: Formatted batch prompt for the active LLM service
         """
         if not self.active_service:
             raise RuntimeError("No active LLM service available")
-        return self.active_service.create_prompt(file, hunk, pr_details)
+        return self.active_service.create_batch_prompt(entries, pr_details, scopes)
 
-    def get_ai_response(self, prompt: str) -> List[Dict[str, str]]:
+    def count_tokens(self, text: str) -> int:
         """
-        Get response from the active LLM service.
+        Estimate the token count of a text for the active LLM service.
+        
+        Args:
+            text: Text to measure
+            
+        Returns:
+            int: Estimated token count
+        """
+        if not self.active_service:
+            raise RuntimeError("No active LLM service available")
+        return self.active_service.count_tokens(text)
+
+    def get_ai_response(self, prompt: ReviewPrompt) -> List[Dict[str, str]]:
+        """
+        Get response from the live LLM services.
+
+        Responses are served from the review cache when the same prompt was
+        already answered by any live provider and model. Otherwise the router
+        picks the provider. Failed requests and incomplete responses are
+        never cached.
         
         Args:
             prompt: The formatted prompt to send to the LLM
             
         Returns:
             List[Dict[str, str]]: List of review comments
+
+        Raises:
+            Exception: If no provider could answer; the caller decides how to
+                report the unreviewed hunks
         """
+        cached = self._get_cached(prompt)
+        if cached is not None:
+            return cached
+
+        slot, reviews = self.router.call(prompt)
+        self._set_cached(slot.service, prompt, reviews)
+        return reviews
+
+    async def aget_ai_response(self, prompt: ReviewPrompt) -> List[Dict[str, str]]:
+        """Async variant of `get_ai_response`; must run on `event_loop`."""
+        cached = self._get_cached(prompt)
+        if cached is not None:
+            return cached
+
+        slot, reviews = await self.router.acall(prompt)
+        self._set_cached(slot.service, prompt, reviews)
+        return reviews
+
+    def _get_cached(self, prompt: ReviewPrompt) -> Optional[List[Dict[str, str]]]:
+        """Look up a prompt answered earlier by any live provider and model."""
         if not self.active_service:
             raise RuntimeError("No active LLM service available")
-            
-        try:
-            return self.active_service.get_ai_response(prompt)
-        except Exception as e:
-            print(f"Error getting AI response: {e}")
-            return []
+        if not self.cache:
+            return None
+        return self.cache.get_first(
+            [self._cache_key(service, prompt) for service in self.services.values()]
+        )
+
+    def _set_cached(self, service: BaseLLMService, prompt: ReviewPrompt, reviews: List[Dict[str, str]]) -> None:
+        # A cut-off answer would stand in for the full review until the entry expires
+        if self.cache and getattr(reviews, 'complete', True):
+            self.cache.set(self._cache_key(service, prompt), reviews)
+
+    def _cache_key(self, service: BaseLLMService, prompt: ReviewPrompt) -> str:
+        """Build the review cache key of a prompt for one provider and model."""
+        return ReviewCache.make_key(service.__class__.__name__, service.model_name, str(prompt))
+
+    def get_rate_limit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get rate limiter and retry statistics of every live provider.
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Statistics keyed by provider name
+        """
+        return {name: service.get_rate_limit_stats() for name, service in self.services.items()}
+
+    def close(self) -> None:
+        """Release resources held by the service, flushing the review cache."""
+        rate_limits = self.get_rate_limit_stats()
+        print(f"Rate limits: {rate_limits}")
+        metrics.add_section("rate_limits", rate_limits)
+        if len(self.services) > 1:
+            router_stats = self.router.stats()
+            print(f"Provider routing: {router_stats}")
+            metrics.add_section("routing", router_stats)
+        self.router.close()
+        for service in self.services.values():
+            service.close()
+        if self.event_loop:
+            for service in self.services.values():
+                try:
+                    self.event_loop.run(service.aclose())
+                except Exception as e:
+                    print(f"Failed to close async client: {e}")
+            self.event_loop.close()
+            self.event_loop = None
+        if self.cache:
+            print(f"Review cache: {self.cache.hits} hits, {self.cache.misses} misses")
+            metrics.add_section("review_cache", {"hits": self.cache.hits, "misses": self.cache.misses})
+            self.cache.close()
+            self.cache = None
 
     def get_active_service_name(self) -> str:
         """
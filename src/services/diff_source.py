@@ -0,0 +1,189 @@
+import os
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+from ..core.config import Config
+from ..core.models import PRDetails
+from ..utils.metrics import metrics
+from .github_service import GitHubService
+
+# Seconds allowed for the quick git commands checking the local repository
+GIT_CHECK_TIMEOUT = 30
+
+
+class DiffSourceError(Exception):
+  """Raised when a diff source cannot produce the requested diff."""
+
+
+class DiffSource(ABC):
+  """
+  Produces unified diffs in the format of GitHub's `.diff` media type,
+  line by line and with line endings, for DiffParser to stream.
+  """
+
+  @abstractmethod
+  def iter_pr_lines(self, pr_details: PRDetails) -> Iterator[str]:
+    """Streams the diff of a pull request: its merge base against its head."""
+    pass
+
+  @abstractmethod
+  def iter_compare_lines(self, pr_details: PRDetails, base_sha: str, head_sha: str) -> Iterator[str]:
+    """
+    Streams the three-dot diff between two commits of a pull request.
+
+    Raises:
+      DiffSourceError: If the commits cannot be compared, e.g. after a force-push
+    """
+    pass
+
+
+class GitHubDiffSource(DiffSource):
+  """Downloads diffs from the GitHub API."""
+
+  def __init__(self, github_service: GitHubService):
+    self.github_service = github_service
+
+  def iter_pr_lines(self, pr_details: PRDetails) -> Iterator[str]:
+    return self.github_service.iter_diff_lines(pr_details.owner, pr_details.repo, pr_details.pull_number)
+
+  def iter_compare_lines(self, pr_details: PRDetails, base_sha: str, head_sha: str) -> Iterator[str]:
+    return self.github_service.iter_compare_diff_lines(pr_details.owner, pr_details.repo, base_sha, head_sha)
+
+
+class LocalGitDiffSource(DiffSource):
+  """
+  Runs `git diff` in a local clone and streams its output.
+
+  Unlike the API, which truncates or refuses very large diffs, this works
+  for pull requests of any size and transfers nothing. The clone needs the
+  history of both commits, e.g. `actions/checkout` with `fetch-depth: 0`,
+  or a git bundle holding them. When it lacks them, e.g. a shallow clone
+  or a service job for another repository, the diff comes from `fallback`.
+  """
+
+  def __init__(
+    self,
+    workspace: str,
+    context_lines: int = 3,
+    diff_filter: str = "",
+    bundle_path: str = "",
+    fallback: Optional[DiffSource] = None,
+  ):
+    self.workspace = workspace
+    self.context_lines = context_lines
+    self.diff_filter = diff_filter
+    self.fallback = fallback
+    if bundle_path:
+      self._unbundle(bundle_path)
+
+  def iter_pr_lines(self, pr_details: PRDetails) -> Iterator[str]:
+    return self._iter_diff(pr_details, pr_details.base_sha, pr_details.head_sha, compare=False)
+
+  def iter_compare_lines(self, pr_details: PRDetails, base_sha: str, head_sha: str) -> Iterator[str]:
+    return self._iter_diff(pr_details, base_sha, head_sha, compare=True)
+
+  def _iter_diff(self, pr_details: PRDetails, base_sha: str, head_sha: str, compare: bool) -> Iterator[str]:
+    if not self._can_diff(base_sha, head_sha):
+      if self.fallback is None:
+        raise DiffSourceError(f"{base_sha[:7]}...{head_sha[:7]} cannot be compared in {self.workspace}")
+      print(f"Local clone cannot compare {base_sha[:7]}...{head_sha[:7]}, downloading the diff instead")
+      metrics.increment("diff_source_fallbacks")
+      if compare:
+        return self.fallback.iter_compare_lines(pr_details, base_sha, head_sha)
+      return self.fallback.iter_pr_lines(pr_details)
+    return metrics.timed_iter("git.diff", self._run_diff(base_sha, head_sha))
+
+  def _can_diff(self, base_sha: str, head_sha: str) -> bool:
+    """True if both commits and a merge base of them are in the local clone."""
+    if not base_sha or not head_sha:
+      return False
+    try:
+      return self._git("merge-base", base_sha, head_sha).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+      return False
+
+  def _run_diff(self, base_sha: str, head_sha: str) -> Iterator[str]:
+    command = [
+      "git", "-C", self.workspace, "-c", "core.quotePath=false", "diff",
+      "--no-color", "--no-ext-diff", "--no-textconv", "--src-prefix=a/", "--dst-prefix=b/",
+      "--find-renames", f"--unified={self.context_lines}",
+    ]
+    if self.diff_filter:
+      command.append(f"--diff-filter={self.diff_filter}")
+    command.append(f"{base_sha}...{head_sha}")
+
+    # A file rather than a pipe: git blocks once a pipe nobody reads fills up,
+    # e.g. with rename-limit warnings, while its stdout is still being read
+    with tempfile.TemporaryFile() as stderr:
+      process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+      try:
+        # Split on "\n" only: a lone "\r" inside a line must not end it
+        for line in process.stdout:
+          yield line.decode("utf-8", errors="replace")
+        if process.wait() != 0:
+          stderr.seek(0)
+          raise DiffSourceError(f"git diff failed: {stderr.read().decode(errors='replace').strip()}")
+      finally:
+        if process.poll() is None:
+          # The consumer stopped early
+          process.kill()
+          process.wait()
+        process.stdout.close()
+
+  def _unbundle(self, bundle_path: str) -> None:
+    """Imports the commits of a git bundle into the local clone."""
+    try:
+      result = self._git("bundle", "unbundle", bundle_path, timeout=None)
+    except (OSError, subprocess.SubprocessError) as e:
+      print(f"Failed to import bundle {bundle_path}: {e}")
+      return
+    if result.returncode != 0:
+      print(f"Failed to import bundle {bundle_path}: {result.stderr.strip()}")
+
+  def _git(self, *args: str, timeout: Optional[float] = GIT_CHECK_TIMEOUT) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", "-C", self.workspace, *args], capture_output=True, text=True, timeout=timeout)
+
+
+class PatchFileDiffSource(DiffSource):
+  """
+  Reads the diff of a pull request from a file, e.g. the output of
+  `git diff base...head` saved for an offline run.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+
+  def iter_pr_lines(self, pr_details: PRDetails) -> Iterator[str]:
+    return metrics.timed_iter("patch.read", self._read_lines())
+
+  def iter_compare_lines(self, pr_details: PRDetails, base_sha: str, head_sha: str) -> Iterator[str]:
+    raise DiffSourceError("a patch file cannot compare commits")
+
+  def _read_lines(self) -> Iterator[str]:
+    with open(self.path, "rb") as f:
+      for line in f:
+        yield line.decode("utf-8", errors="replace")
+
+
+DIFF_SOURCES = ("github", "git", "patch")
+
+
+def create_diff_source(github_service: GitHubService) -> DiffSource:
+  """Creates the diff source selected by DIFF_SOURCE."""
+  github_source = GitHubDiffSource(github_service)
+  if Config.DIFF_SOURCE == "git":
+    return LocalGitDiffSource(
+      os.environ.get("GITHUB_WORKSPACE") or ".",
+      context_lines=Config.DIFF_CONTEXT_LINES,
+      diff_filter=Config.DIFF_FILTER,
+      bundle_path=Config.DIFF_BUNDLE_PATH,
+      fallback=github_source,
+    )
+  if Config.DIFF_SOURCE == "patch":
+    if not Config.DIFF_PATCH_PATH:
+      raise ValueError("DIFF_SOURCE 'patch' requires DIFF_PATCH_PATH")
+    return PatchFileDiffSource(Config.DIFF_PATCH_PATH)
+  if Config.DIFF_SOURCE != "github":
+    print(f"Unsupported DIFF_SOURCE '{Config.DIFF_SOURCE}', expected one of {', '.join(DIFF_SOURCES)}. Using github.")
+  return github_source
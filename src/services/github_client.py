@@ -0,0 +1,123 @@
+import threading
+import requests
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Retries for idempotent requests that hit a transient gateway error
+_GET_RETRY = Retry(
+  total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"})
+)
+
+
+class GitHubClient:
+  """
+  Minimal GitHub REST client sharing one pooled, keep-alive session for all traffic.
+
+  JSON GET responses are cached per URL and revalidated with ETags
+  (If-None-Match). A 304 answer reuses the cached payload and does not
+  count against the API rate limit.
+  """
+
+  def __init__(self, token: str, api_url: str = "https://api.github.com", pool_size: int = 10):
+    self.api_url = api_url.rstrip("/")
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=_GET_RETRY)
+    self.session.mount("https://", adapter)
+    self.session.mount("http://", adapter)
+    self.session.headers.update({
+      "Authorization": f"Bearer {token}",
+      "Accept": "application/vnd.github+json",
+      "X-GitHub-Api-Version": "2022-11-28",
+      "User-Agent": "llm-code-reviewer",
+    })
+    self.stats = {"requests": 0, "not_modified": 0}
+    self._etag_cache: Dict[str, tuple] = {}
+    self._lock = threading.Lock()
+
+  def url(self, path: str) -> str:
+    """Build an absolute API URL from a path such as '/repos/o/r'."""
+    if path.startswith("http"):
+      return path
+    return f"{self.api_url}/{path.lstrip('/')}"
+
+  def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    GET a JSON resource, revalidating any cached copy with its ETag.
+
+    Raises:
+      requests.HTTPError: If GitHub answers with an error status
+    """
+    url = self.url(path)
+    cache_key = url if not params else f"{url}?{sorted(params.items())}"
+    headers = {}
+    with self._lock:
+      cached = self._etag_cache.get(cache_key)
+    if cached:
+      headers["If-None-Match"] = cached[0]
+
+    response = self._send("GET", url, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+      with self._lock:
+        self.stats["not_modified"] += 1
+      return cached[1]
+    response.raise_for_status()
+
+    payload = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+      with self._lock:
+        self._etag_cache[cache_key] = (etag, payload)
+    return payload
+
+  def get_paginated(self, path: str, per_page: int = 100) -> Iterator[Any]:
+    """Iterates over every item of a paginated list endpoint, following Link headers."""
+    url: Optional[str] = self.url(path)
+    params: Optional[Dict[str, Any]] = {"per_page": per_page}
+    while url:
+      response = self._send("GET", url, params=params)
+      response.raise_for_status()
+      yield from response.json()
+      url = response.links.get("next", {}).get("url")
+      params = None
+
+  def post_json(self, path: str, payload: Dict[str, Any]) -> Any:
+    """
+    POST a JSON payload and return the decoded response.
+
+    Raises:
+      requests.HTTPError: If GitHub answers with an error status
+    """
+    response = self._send("POST", self.url(path), json=payload)
+    response.raise_for_status()
+    return response.json() if response.content else None
+
+  def put_json(self, path: str, payload: Dict[str, Any]) -> Any:
+    """
+    PUT a JSON payload and return the decoded response.
+
+    Raises:
+      requests.HTTPError: If GitHub answers with an error status
+    """
+    response = self._send("PUT", self.url(path), json=payload)
+    response.raise_for_status()
+    return response.json() if response.content else None
+
+  @contextmanager
+  def stream(self, path: str, accept: str) -> Iterator[requests.Response]:
+    """Open a streamed GET response with a custom media type, closing it afterwards."""
+    response = self._send("GET", self.url(path), headers={"Accept": accept}, stream=True)
+    try:
+      yield response
+    finally:
+      response.close()
+
+  def close(self) -> None:
+    """Close pooled connections."""
+    self.session.close()
+
+  def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+    with self._lock:
+      self.stats["requests"] += 1
+    return self.session.request(method, url, timeout=(10, 300), **kwargs)
@@ -1,15 +1,34 @@
 import json
+import threading
 import requests
-from typing import List, Dict, Any
-from ..core.config import Config
+from typing import List, Dict, Any, BinaryIO, Iterator, Optional
+from urllib.parse import quote
 from ..core.models import PRDetails
-from github import Github
-from github.Repository import Repository
+from .github_client import GitHubClient
+from ..utils.incremental import REVIEW_MARKER_PATTERN, format_review_marker, parse_review_marker
+from ..utils.metrics import metrics
+
+# Bytes read from the streamed diff response at a time
+DIFF_CHUNK_SIZE = 64 * 1024
+
+DIFF_MEDIA_TYPE = 'application/vnd.github.v3.diff'
+RAW_MEDIA_TYPE = 'application/vnd.github.raw'
+
+# Account reviews are posted as with the Actions GITHUB_TOKEN, which cannot read /user
+DEFAULT_REVIEWER_LOGIN = 'github-actions[bot]'
 
 class GitHubService:
-  def __init__(self, gh_client: Github):
-    """Initialize GitHub service with a client."""
+  def __init__(self, gh_client: GitHubClient, reviewer_login: Optional[str] = None):
+    """
+    Initialize GitHub service with a client.
+
+    Args:
+      gh_client: Client for the GitHub API
+      reviewer_login: Account this tool posts reviews as; looked up from the token if not given
+    """
     self.gh_client = gh_client
+    self._reviewer_login = reviewer_login
+    self._login_lock = threading.Lock()
 
   def get_pr_details(self, event_path: str) -> PRDetails:
     """
@@ -24,38 +43,198 @@ class GitHubService:
     pull_number = self._extract_pull_number(event_data)
     repo_full_name = event_data["repository"]["full_name"]
     owner, repo = repo_full_name.split("/")
+    with metrics.stage("github.pr_details"):
+      return self.get_pull_request(owner, repo, pull_number)
+
+  def get_pull_request(self, owner: str, repo: str, pull_number: int) -> PRDetails:
+    """
+    Fetch pull request details with a single (ETag-revalidated) API call.
     
-    repo_obj = self.gh_client.get_repo(repo_full_name)
-    pr = repo_obj.get_pull(pull_number)
+    Returns:
+      PRDetails object containing PR information
+    """
+    pr = self.gh_client.get_json(f"/repos/{owner}/{repo}/pulls/{pull_number}")
+    return PRDetails(
+      owner, pr["base"]["repo"]["name"], pull_number, pr["title"], pr["body"],
+      head_sha=pr["head"]["sha"], base_sha=pr["base"]["sha"]
+    )
 
-    return PRDetails(owner, repo_obj.name, pull_number, pr.title, pr.body)
+  def iter_diff_lines(self, owner: str, repo: str, pull_number: int) -> Iterator[str]:
+    """
+    Stream the diff of a pull request line by line.
+
+    The response body is read in chunks as it downloads, so parsing and
+    review can start before the whole diff has arrived.
 
-  def get_diff(self, owner: str, repo: str, pull_number: int) -> str:
+    Returns:
+      Iterator over diff lines (with line endings); empty if the request fails
     """
-    Get the diff content for a pull request.
-    
+    with self.gh_client.stream(f"/repos/{owner}/{repo}/pulls/{pull_number}", DIFF_MEDIA_TYPE) as response:
+      if response.status_code != 200:
+        print(f"Failed to fetch diff: HTTP {response.status_code}")
+        return
+      yield from self._iter_lines(response)
+
+  def iter_compare_diff_lines(self, owner: str, repo: str, base_sha: str, head_sha: str) -> Iterator[str]:
+    """
+    Stream the diff between two commits (three-dot compare) line by line.
+
+    Raises:
+      requests.HTTPError: If the comparison is not available, e.g. after a force-push
+    """
+    with self.gh_client.stream(f"/repos/{owner}/{repo}/compare/{base_sha}...{head_sha}", DIFF_MEDIA_TYPE) as response:
+      response.raise_for_status()
+      yield from self._iter_lines(response)
+
+  def download_file(
+    self, owner: str, repo: str, path: str, ref: str, out: BinaryIO, max_bytes: int
+  ) -> bool:
+    """
+    Stream the raw content of a file at a commit into `out`.
+
+    Commits of forked pull requests are reachable from the base repository,
+    so `ref` may be the head SHA of any PR of `owner/repo`.
+
+    Returns:
+      True if the file was written, False if it is missing or larger than `max_bytes`
+    """
+    with self.gh_client.stream(
+      f"/repos/{owner}/{repo}/contents/{quote(path)}?ref={ref}", RAW_MEDIA_TYPE
+    ) as response:
+      if response.status_code != 200:
+        return False
+      if int(response.headers.get("Content-Length") or 0) > max_bytes:
+        return False
+      written = 0
+      for chunk in response.iter_content(chunk_size=DIFF_CHUNK_SIZE):
+        written += len(chunk)
+        if written > max_bytes:
+          return False
+        out.write(chunk)
+    return True
+
+  def get_last_reviewed_sha(self, pr_details: PRDetails) -> Optional[str]:
+    """
+    Find the head commit covered by the latest completed review of this tool.
+
     Returns:
-      Diff content as string or empty string if request fails
+      The reviewed commit SHA, or None if the PR was never fully reviewed
+    """
+    review = self._find_marker_review(pr_details)
+    return parse_review_marker(review.get("body")) if review else None
+
+  def record_reviewed_sha(self, pr_details: PRDetails, reviewed_sha: str) -> None:
+    """
+    Record `reviewed_sha` when the run has no comments left to post.
+
+    The marker of the latest marked review is moved to the new commit, so
+    pushes without findings do not add an empty review to the timeline. A
+    review is only posted when there is none to edit, e.g. on the first
+    run, or when editing it fails.
+    """
+    review = self._find_marker_review(pr_details)
+    if review:
+      body = REVIEW_MARKER_PATTERN.sub(format_review_marker(reviewed_sha), review["body"])
+      try:
+        with metrics.stage("github.post"):
+          self.gh_client.put_json(
+            f"/repos/{pr_details.owner}/{pr_details.repo}/pulls/{pr_details.pull_number}/reviews/{review['id']}",
+            {"body": body}
+          )
+        return
+      except requests.HTTPError as e:
+        print(f"Failed to update the reviewed commit marker, posting a new one: {e}")
+    self.create_review_comment(pr_details, [], reviewed_sha)
+
+  def get_reviewer_login(self) -> str:
+    """
+    The login this tool posts reviews as, looked up once with GET /user.
+
+    Installation tokens such as the Actions GITHUB_TOKEN cannot read /user;
+    they post as DEFAULT_REVIEWER_LOGIN unless REVIEWER_LOGIN names the
+    bot account of the GitHub App instead.
+
+    Raises:
+      requests.RequestException: If the lookup fails for another reason
     """
-    api_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pull_number}.diff"
-    headers = {
-      'Authorization': f'Bearer {Config.GITHUB_TOKEN}',
-      'Accept': 'application/vnd.github.v3.diff'
+    with self._login_lock:
+      if self._reviewer_login is None:
+        try:
+          self._reviewer_login = self.gh_client.get_json("/user")["login"]
+        except requests.HTTPError as e:
+          if e.response is None or e.response.status_code not in (401, 403, 404):
+            raise
+          self._reviewer_login = DEFAULT_REVIEWER_LOGIN
+      return self._reviewer_login
+
+  def _find_marker_review(self, pr_details: PRDetails) -> Optional[Dict[str, Any]]:
+    """
+    The latest review of this tool's account carrying a reviewed commit marker, if any.
+
+    Markers in reviews of other accounts are ignored: anyone can post one,
+    and a forged marker would skip the review of every hunk before it.
+    """
+    login = self.get_reviewer_login()
+    marked = None
+    for review in self.gh_client.get_paginated(
+      f"/repos/{pr_details.owner}/{pr_details.repo}/pulls/{pr_details.pull_number}/reviews"
+    ):
+      author = (review.get("user") or {}).get("login")
+      if author == login and parse_review_marker(review.get("body")):
+        marked = review
+    return marked
+
+  def create_review_comment(
+    self, pr_details: PRDetails, comments: List[Dict[str, Any]], reviewed_sha: Optional[str] = None
+  ) -> None:
+    """
+    Create a review comment on the pull request.
+
+    When `reviewed_sha` is given, a hidden marker recording it is added to
+    the review body so later runs can review incrementally. The review is
+    pinned to the head commit the run reviewed, so batches posted after a
+    push still anchor to the lines they were written for.
+    """
+    body = "AI generated review comments"
+    if reviewed_sha:
+      body += f"\n\n{format_review_marker(reviewed_sha)}"
+    review = {
+      "body": body,
+      "comments": comments,
+      "event": "COMMENT"
     }
+    if pr_details.head_sha:
+      review["commit_id"] = pr_details.head_sha
+    with metrics.stage("github.post"):
+      self.gh_client.post_json(
+        f"/repos/{pr_details.owner}/{pr_details.repo}/pulls/{pr_details.pull_number}/reviews",
+        review
+      )
 
-    response = requests.get(api_url, headers=headers)
-    return response.text if response.status_code == 200 else ""
+  def close(self) -> None:
+    """Report API usage and release pooled connections."""
+    stats = self.gh_client.stats
+    print(f"GitHub API: {stats['requests']} requests, {stats['not_modified']} answered 304 Not Modified")
+    metrics.add_section("github_api", dict(stats))
+    self.gh_client.close()
 
-  def create_review_comment(self, pr_details: PRDetails, comments: List[Dict[str, Any]]) -> None:
-    """Create a review comment on the pull request."""
-    repo = self.gh_client.get_repo(f"{pr_details.owner}/{pr_details.repo}")
-    pr = repo.get_pull(pr_details.pull_number)
-    
-    pr.create_review(
-      body="AI generated review comments",
-      comments=comments,
-      event="COMMENT"
-    )
+  def _iter_lines(self, response) -> Iterator[str]:
+    """
+    Decode a streamed diff response into lines, keeping line endings.
+
+    Only "\n" ends a line, as in the line counts of hunk headers; `\r`,
+    form feeds or U+2028 inside a line must not split it.
+    """
+    response.encoding = response.encoding or 'utf-8'
+    chunks = response.iter_content(chunk_size=DIFF_CHUNK_SIZE, decode_unicode=True)
+    pending = ''
+    for chunk in metrics.timed_iter("github.diff_download", chunks):
+      lines = (pending + chunk).split('\n')
+      pending = lines.pop()
+      for line in lines:
+        yield line + '\n'
+    if pending:
+      yield pending + '\n'
 
   def _load_event_data(self, event_path: str) -> Dict:
     """Load GitHub event data from JSON file."""
@@ -1,89 +1,158 @@
-from typing import List, Dict
-from anthropic import Anthropic
-from unidiff import Hunk, PatchedFile
+import json
+from typing import AsyncIterator, Iterator, List, Dict, Any
+from anthropic import Anthropic, AsyncAnthropic
 from ...core.config import Config
-from ...core.models import PRDetails
-from .base import BaseLLMService
+from ...core.models import ReviewPrompt
+from .base import BaseLLMService, REVIEW_SCHEMA
+
+# Tool the model is forced to call with its reviews when structured output is on
+REVIEW_TOOL = {
+    "name": "submit_reviews",
+    "description": "Submit the review comments for the code changes.",
+    "input_schema": REVIEW_SCHEMA,
+}
 
 class AnthropicService(BaseLLMService):
     """
     Implementation of BaseLLMService for Anthropic's Claude models.
     """
+
+    PROVIDER = 'anthropic'
+    # Claude tokenizes source code slightly more densely than the default estimate
+    CHARS_PER_TOKEN = 3.5
     
     def __init__(self):
         """Initialize the Anthropic client with configuration."""
-        self.client = Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+        # Retries are handled by BaseLLMService so that they share the rate limiter
+        self.client = Anthropic(api_key=Config.ANTHROPIC_API_KEY, max_retries=0)
+        # Created on first async use, on the event loop that drives it
+        self.async_client = None
         self.model = Config.ANTHROPIC_MODEL
+        self.model_name = self.model
         
-    def create_prompt(self, file: PatchedFile, hunk: Hunk, pr_details: PRDetails) -> str:
-        """Create a prompt formatted for Anthropic's model expectations."""
-        return f"""
-        Your task is to review the following code changes. Please follow these guidelines:
-        Provide your response in this JSON format:
-        {{"reviews": [{{"lineNumber": <line_number>, "reviewComment": "<review comment>, side: "<left or right >, "filepath": "<file path>"}}]}}
-        Important Rules:
-        1. Line Number Validation:
-        - For "left" side: {hunk.source_start} ≤ lineNumber < {hunk.source_start + hunk.source_length}
-        - For "right" side: {hunk.target_start} ≤ lineNumber < {hunk.target_start + hunk.target_length}
+    def _complete(self, prompt: ReviewPrompt) -> str:
+        """Get response text from Anthropic's Claude model."""
+        raw_response = self.client.messages.with_raw_response.create(**self._request_args(prompt))
+        return self._read_response(raw_response)
 
-        2. Review Focus Areas:
-        - Critical bugs and errors
-        - Security vulnerabilities and risks
-        - Performance optimization opportunities 
-        - Code architecture and maintainability issues
-        - Suggest code for improvement and optimization
+    async def _acomplete(self, prompt: ReviewPrompt) -> str:
+        """Get response text from Anthropic's Claude model with the async client."""
+        if self.async_client is None:
+            self.async_client = AsyncAnthropic(api_key=Config.ANTHROPIC_API_KEY, max_retries=0)
+        raw_response = await self.async_client.messages.with_raw_response.create(**self._request_args(prompt))
+        return self._read_response(raw_response)
 
-        3. Key Requirements:
-        - Return empty "reviews" array if no issues found
-        - Use GitHub Markdown formatting in your comments
-        - Do NOT suggest adding code comments
-        - Provide feedback in language: {Config.HUMAN_LANGUAGE}
+    def _stream(self, prompt: ReviewPrompt) -> Iterator[str]:
+        """Stream response text from Anthropic's Claude model."""
+        raw_response = self.client.messages.with_raw_response.create(**self._request_args(prompt), stream=True)
+        self.rate_limiter.observe_headers(raw_response.headers)
+        stream = raw_response.parse()
+        usage = {}
+        try:
+            for event in stream:
+                text = self._read_event(event, usage)
+                if text:
+                    yield text
+        finally:
+            stream.close()
+            self._record_stream_usage(usage)
 
-        Context Information:
-        File: {file.path}
-        PR Title: {pr_details.title}
-        PR Description: 
-        ---
-        {pr_details.description or 'No description provided'}
-        ---
+    async def _astream(self, prompt: ReviewPrompt) -> AsyncIterator[str]:
+        """Stream response text from Anthropic's Claude model with the async client."""
+        if self.async_client is None:
+            self.async_client = AsyncAnthropic(api_key=Config.ANTHROPIC_API_KEY, max_retries=0)
+        raw_response = await self.async_client.messages.with_raw_response.create(
+            **self._request_args(prompt), stream=True
+        )
+        self.rate_limiter.observe_headers(raw_response.headers)
+        stream = raw_response.parse()
+        usage = {}
+        try:
+            async for event in stream:
+                text = self._read_event(event, usage)
+                if text:
+                    yield text
+        finally:
+            await stream.close()
+            self._record_stream_usage(usage)
 
-        Git Diff Details:
-        - Source Start: {hunk.source_start}
-        - Source Length: {hunk.source_length} 
-        - Target Start: {hunk.target_start}
-        - Target Length: {hunk.target_length}
+    async def aclose(self) -> None:
+        """Close the async client's connection pool."""
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
 
-        Code Diff to Review:
-        ```diff
-        {hunk.__str__()}
-        ```
-        """
+    def _request_args(self, prompt: ReviewPrompt) -> Dict[str, Any]:
+        args = {
+            "model": self.model,
+            "max_tokens": self.MAX_OUTPUT_TOKENS,
+            "temperature": 0.2,
+            # The breakpoint caches tools and system prompt, i.e. everything up to
+            # the hunks; prefixes below the model's minimum are simply not cached
+            "system": [
+                {"type": "text", "text": prompt.prefix, "cache_control": {"type": "ephemeral"}}
+            ],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt.suffix
+                }
+            ]
+        }
+        if Config.STRUCTURED_OUTPUT:
+            args["tools"] = [REVIEW_TOOL]
+            args["tool_choice"] = {"type": "tool", "name": REVIEW_TOOL["name"]}
+        return args
 
-    def get_ai_response(self, prompt: str) -> List[Dict[str, str]]:
-        """Get response from Anthropic's Claude model."""
-        try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1024,
-                temperature=0.2,
-                system="You are an expert code reviewer.",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
+    def _read_response(self, raw_response) -> str:
+        """Extract the completion text from a raw response, recording rate limits and usage."""
+        self.rate_limiter.observe_headers(raw_response.headers)
+        response = raw_response.parse()
+        if response.usage:
+            # input_tokens excludes the tokens written to or read from the cache
+            cache_written = getattr(response.usage, "cache_creation_input_tokens", 0) or 0
+            cache_read = getattr(response.usage, "cache_read_input_tokens", 0) or 0
+            self._record_usage(
+                response.usage.input_tokens + cache_written + cache_read,
+                response.usage.output_tokens,
+                cache_read
             )
-            
-            if response.content:
-                # Extract the text content from the message
-                response_text = response.content[0].text
-                # Clean and parse the response
-                cleaned_text = self._clean_response_text(response_text)
-                return self._parse_response(cleaned_text)
-            
-            return []
-            
-        except Exception as e:
-            print(f"Error during Anthropic API call: {e}")
-            return []
+        
+        for block in response.content:
+            # A forced tool call carries the reviews as already-decoded input
+            if block.type == "tool_use":
+                return json.dumps(block.input)
+        
+        # Extract the text content from the message
+        return "".join(block.text for block in response.content if block.type == "text")
+
+    @staticmethod
+    def _read_event(event, usage: Dict[str, Any]) -> str:
+        """
+        Extract the text of a streamed event, collecting usage into `usage`.
+
+        A forced tool call streams its input as JSON fragments, which are
+        returned like text.
+        """
+        if event.type == "message_start":
+            usage["input"] = event.message.usage
+        elif event.type == "message_delta":
+            usage["output_tokens"] = event.usage.output_tokens
+        elif event.type == "content_block_delta":
+            if event.delta.type == "text_delta":
+                return event.delta.text
+            if event.delta.type == "input_json_delta":
+                return event.delta.partial_json
+        return ""
+
+    def _record_stream_usage(self, usage: Dict[str, Any]) -> None:
+        """Record the usage of a stream: input tokens come first, the output count last."""
+        if "input" not in usage:
+            return
+        cache_written = getattr(usage["input"], "cache_creation_input_tokens", 0) or 0
+        cache_read = getattr(usage["input"], "cache_read_input_tokens", 0) or 0
+        self._record_usage(
+            usage["input"].input_tokens + cache_written + cache_read,
+            usage.get("output_tokens", usage["input"].output_tokens),
+            cache_read
+        )
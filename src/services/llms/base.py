@@ -1,18 +1,77 @@
 # src/services/llm/base.py
 from abc import ABC, abstractmethod
+import asyncio
 import json
-from typing import List, Dict
-from unidiff import Hunk, PatchedFile
-from ...core.models import PRDetails
+import random
+import time
+from typing import AsyncIterator, Iterator, List, Dict, Tuple, Any, Optional
+from ...core.config import Config
+from ...core.models import PRDetails, FileInfo, DiffHunk, ReviewPrompt
+from ...utils.metrics import metrics
+from .prompts import build_review_prompt
+from .rate_limiter import RateLimiter, retry_after
+from .review_parser import IncrementalReviewParser
+
+# HTTP statuses worth retrying (529 is Anthropic's "overloaded")
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# JSON Schema of a review response, passed to each provider's structured-output
+# mode. hunkId is only meaningful for batched prompts and null otherwise.
+REVIEW_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "reviews": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "hunkId": {"type": ["integer", "null"]},
+                    "filepath": {"type": "string"},
+                    "lineNumber": {"type": "integer"},
+                    "side": {"type": "string", "enum": ["left", "right"]},
+                    "reviewComment": {"type": "string"},
+                },
+                "required": ["hunkId", "filepath", "lineNumber", "side", "reviewComment"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["reviews"],
+    "additionalProperties": False,
+}
+
+class IncompleteResponseError(Exception):
+    """Raised by a review stream after its last review when the response was cut short."""
+
+
+class ReviewList(list):
+    """
+    Reviews of one response. `complete` is False when the response was cut
+    short or partly unreadable, so the reviews must not be cached as the
+    full answer.
+    """
+
+    def __init__(self, reviews=(), complete: bool = True):
+        super().__init__(reviews)
+        self.complete = complete
+
 
 class BaseLLMService(ABC):
     """
     Abstract base class for LLM services defining the common interface
     that all LLM implementations must follow.
     """
+
+    # Provider name, used to look up rate limits in Config (e.g. GEMINI_RPM)
+    PROVIDER = ''
+    # Average characters per token, used to estimate prompt sizes
+    CHARS_PER_TOKEN = 4.0
+    # Upper bound on completion tokens, also charged against the token rate limit
+    MAX_OUTPUT_TOKENS = 1024
     
-    @abstractmethod
-    def create_prompt(self, file: PatchedFile, hunk: Hunk, pr_details: PRDetails) -> str:
+    def create_prompt(
+        self, file: FileInfo, hunk: DiffHunk, pr_details: PRDetails, scope: Optional[str] = None
+    ) -> ReviewPrompt:
         """
         Create a prompt for the LLM model.
         
@@ -20,16 +79,98 @@ class BaseLLMService(ABC):
             file: The file being reviewed
             hunk: The code hunk to review
             pr_details: Pull request details
+            scope: Enclosing function or class of the hunk, if known
             
         Returns:
-            str: Formatted prompt for the LLM
+            ReviewPrompt: Formatted prompt for the LLM
         """
-        pass
+        return build_review_prompt([(file, hunk)], pr_details, [scope])
+
+    def create_batch_prompt(
+        self,
+        entries: List[Tuple[FileInfo, DiffHunk]],
+        pr_details: PRDetails,
+        scopes: Optional[List[Optional[str]]] = None,
+    ) -> ReviewPrompt:
+        """
+        Create a single prompt reviewing several hunks, possibly from several files.
+
+        Hunks are numbered from 1 in the order given. The response schema asks
+        for the hunk id and file path of every review so that comments can be
+        routed back to the hunk they belong to.
+        
+        Args:
+            entries: (file, hunk) pairs to review together
+            pr_details: Pull request details
+            scopes: Enclosing function or class of each hunk, None where unknown
+            
+        Returns:
+            ReviewPrompt: Formatted prompt covering every hunk
+        """
+        return build_review_prompt(entries, pr_details, scopes)
 
     @abstractmethod
-    def get_ai_response(self, prompt: str) -> List[Dict[str, str]]:
+    def _complete(self, prompt: ReviewPrompt) -> str:
+        """
+        Send the prompt to the provider and return the raw completion text.
+
+        Implementations should pass rate-limit response headers to
+        `self.rate_limiter.observe_headers` when the SDK exposes them, and
+        send `prompt.prefix` ahead of `prompt.suffix` in a form the provider
+        can cache (system instructions, a cache breakpoint).
+        
+        Args:
+            prompt: The formatted prompt to send to the LLM
+            
+        Returns:
+            str: Raw response text
+        """
+        pass
+
+    async def _acomplete(self, prompt: ReviewPrompt) -> str:
+        """
+        Async variant of `_complete`.
+
+        Providers override this with their SDK's native async client. The
+        default runs the blocking `_complete` in a worker thread.
+        """
+        return await asyncio.to_thread(self._complete, prompt)
+
+    def _stream(self, prompt: ReviewPrompt) -> Iterator[str]:
+        """
+        Send the prompt and yield the completion text as it is generated.
+
+        Providers override this with their SDK's streaming API, recording
+        rate-limit headers and usage like `_complete`. The default yields the
+        whole completion of `_complete` at once.
+        
+        Args:
+            prompt: The formatted prompt to send to the LLM
+            
+        Returns:
+            Iterator[str]: Successive pieces of the response text
+        """
+        yield self._complete(prompt)
+
+    async def _astream(self, prompt: ReviewPrompt) -> AsyncIterator[str]:
+        """Async variant of `_stream`; the default yields the whole completion of `_acomplete`."""
+        yield await self._acomplete(prompt)
+
+    def close(self) -> None:
+        """Release provider-side resources such as context caches."""
+
+    async def aclose(self) -> None:
+        """Release async clients; called on the event loop that used them."""
+
+    def get_ai_response(self, prompt: ReviewPrompt) -> List[Dict[str, str]]:
         """
         Get response from the LLM model.
+
+        Requests go through the shared client-side rate limiter and are
+        retried with jittered exponential backoff on rate limits and transient
+        errors, honoring Retry-After / x-ratelimit-* hints. API errors that
+        persist are raised to the caller so that failed requests can be told
+        apart from reviews that found no issues.
         
         Args:
             prompt: The formatted prompt to send to the LLM
@@ -37,47 +178,322 @@ class BaseLLMService(ABC):
         Returns:
             List[Dict[str, str]]: List of review comments
         """
-        pass
+        if Config.LLM_STREAMING:
+            reviews = ReviewList()
+            try:
+                for review in self.iter_ai_response(prompt):
+                    reviews.append(review)
+            except IncompleteResponseError:
+                reviews.complete = False
+            return reviews
+        started = time.perf_counter()
+        try:
+            response_text = self._complete_with_retry(prompt)
+        except Exception:
+            metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started, ok=False)
+            raise
+        metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started)
+        return self._parse_response(response_text)
+
+    async def aget_ai_response(self, prompt: ReviewPrompt) -> List[Dict[str, str]]:
+        """
+        Async variant of `get_ai_response`, with the same rate limiting and retries.
 
-    def _clean_response_text(self, text: str) -> str:
+        Waiting requests hold no thread, so many can be in flight at once on
+        a single event loop.
         """
-        Clean the raw response text from the LLM.
+        if Config.LLM_STREAMING:
+            reviews = ReviewList()
+            try:
+                async for review in self.aiter_ai_response(prompt):
+                    reviews.append(review)
+            except IncompleteResponseError:
+                reviews.complete = False
+            return reviews
+        started = time.perf_counter()
+        try:
+            response_text = await self._acomplete_with_retry(prompt)
+        except Exception:
+            metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started, ok=False)
+            raise
+        metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started)
+        return self._parse_response(response_text)
+
+    def iter_ai_response(self, prompt: ReviewPrompt) -> Iterator[Dict[str, str]]:
+        """
+        Stream the response and yield each review as soon as its object closes.
+
+        Requests are rate limited like `get_ai_response`. A failed attempt is
+        retried only while no review has been yielded; once one has, the
+        reviews received so far stay with the caller, so output cut off by a
+        dropped connection or the token limit is not lost.
         
         Args:
-            text: Raw response text
+            prompt: The formatted prompt to send to the LLM
             
         Returns:
-            str: Cleaned text
+            Iterator[Dict[str, str]]: Valid review comments, in response order
+
+        Raises:
+            IncompleteResponseError: After the last review, if the stream broke
+                off or its JSON document was never closed
+        """
+        limiter = self.rate_limiter
+        estimated_tokens = self.count_tokens(str(prompt)) + self.MAX_OUTPUT_TOKENS
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            limiter.acquire(estimated_tokens)
+            parser = IncrementalReviewParser()
+            yielded = 0
+            received = False
+            try:
+                for text in self._stream(prompt):
+                    received = received or bool(text.strip())
+                    for review in parser.feed(text):
+                        if self._is_valid_review(review):
+                            yielded += 1
+                            yield review
+            except Exception as error:
+                if yielded:
+                    self._stream_failed(error, started, yielded)
+                    raise IncompleteResponseError(f"stream failed after {yielded} review(s)") from error
+                delay = self._backoff(error, attempt, limiter)
+                if delay is None:
+                    metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started, ok=False)
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if not self._stream_finished(parser, started, received):
+                raise IncompleteResponseError("response ended before its reviews were complete")
+            return
+
+    async def aiter_ai_response(self, prompt: ReviewPrompt) -> AsyncIterator[Dict[str, str]]:
+        """Async variant of `iter_ai_response`, with the same retries and partial-output handling."""
+        limiter = self.rate_limiter
+        estimated_tokens = self.count_tokens(str(prompt)) + self.MAX_OUTPUT_TOKENS
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            await limiter.aacquire(estimated_tokens)
+            parser = IncrementalReviewParser()
+            yielded = 0
+            received = False
+            try:
+                async for text in self._astream(prompt):
+                    received = received or bool(text.strip())
+                    for review in parser.feed(text):
+                        if self._is_valid_review(review):
+                            yielded += 1
+                            yield review
+            except Exception as error:
+                if yielded:
+                    self._stream_failed(error, started, yielded)
+                    raise IncompleteResponseError(f"stream failed after {yielded} review(s)") from error
+                delay = self._backoff(error, attempt, limiter)
+                if delay is None:
+                    metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started, ok=False)
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if not self._stream_finished(parser, started, received):
+                raise IncompleteResponseError("response ended before its reviews were complete")
+            return
+
+    def _stream_finished(self, parser: IncrementalReviewParser, started: float, received: bool) -> bool:
+        """
+        Record a stream that ran to its end.
+
+        Returns:
+            bool: False if its document was left open (truncated output) or
+                held malformed reviews
+        """
+        metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started)
+        failed = received and (parser.malformed > 0 or not parser.complete)
+        # The text is never held whole, so a repaired response cannot be told from a clean one
+        metrics.record_parse(self.PROVIDER, self.model_name, failed=failed)
+        if failed:
+            metrics.increment("partial_responses")
+        return not failed
+
+    def _stream_failed(self, error: Exception, started: float, kept: int) -> None:
+        """Record a stream that broke off after some reviews were received."""
+        print(f"{self.PROVIDER} response stream failed after {kept} review(s), keeping them: {error}")
+        metrics.record_request(self.PROVIDER, self.model_name, time.perf_counter() - started, ok=False)
+        metrics.record_parse(self.PROVIDER, self.model_name, failed=True)
+        metrics.increment("partial_responses")
+
+    def _record_usage(self, input_tokens: Optional[int], output_tokens: Optional[int], cached_tokens: Optional[int] = 0) -> None:
         """
-        text = text.strip()
-        if text.startswith('```json'):
-            text = text[7:]
-        if text.endswith('```'):
-            text = text[:-3]
-        return text.strip()
+        Record the token usage reported by a provider response in the run metrics.
+
+        `input_tokens` counts the whole prompt, `cached_tokens` the part of it
+        served from the provider's prompt cache.
+        """
+        metrics.record_tokens(self.PROVIDER, self.model_name, input_tokens, output_tokens, cached_tokens)
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Rate limiter shared by every caller of this provider and model."""
+        return RateLimiter.for_model(
+            self.__class__.__name__,
+            self.model_name,
+            requests_per_minute=getattr(Config, f"{self.PROVIDER.upper()}_RPM", 0),
+            tokens_per_minute=getattr(Config, f"{self.PROVIDER.upper()}_TPM", 0)
+        )
+
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """
+        Get request, retry and throttling counters for this provider and model.
+
+        Returns:
+            Dict[str, Any]: Rate limiter statistics
+        """
+        return self.rate_limiter.stats()
+
+    def _complete_with_retry(self, prompt: ReviewPrompt) -> str:
+        """Call `_complete` under the rate limiter, retrying transient failures."""
+        limiter = self.rate_limiter
+        estimated_tokens = self.count_tokens(str(prompt)) + self.MAX_OUTPUT_TOKENS
+        attempt = 0
+
+        while True:
+            limiter.acquire(estimated_tokens)
+            try:
+                return self._complete(prompt)
+            except Exception as error:
+                delay = self._backoff(error, attempt, limiter)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def _acomplete_with_retry(self, prompt: ReviewPrompt) -> str:
+        """Async variant of `_complete_with_retry`."""
+        limiter = self.rate_limiter
+        estimated_tokens = self.count_tokens(str(prompt)) + self.MAX_OUTPUT_TOKENS
+        attempt = 0
+
+        while True:
+            await limiter.aacquire(estimated_tokens)
+            try:
+                return await self._acomplete(prompt)
+            except Exception as error:
+                delay = self._backoff(error, attempt, limiter)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _backoff(self, error: Exception, attempt: int, limiter: RateLimiter) -> Optional[float]:
+        """
+        Decide how to handle a failed attempt.
+
+        Returns:
+            Optional[float]: Seconds to sleep before the next attempt, or None
+                if the error must be raised
+        """
+        status = self._error_status(error)
+        if attempt >= Config.LLM_MAX_RETRIES or not self._is_retryable(error, status):
+            limiter.record_failure()
+            return None
+
+        delay = self._retry_delay(error, attempt)
+        limiter.record_retry(rate_limited=status == 429)
+        if status == 429:
+            # Hold back every parallel caller, not just this one; the next acquire waits
+            limiter.cool_down(delay)
+            return 0.0
+        return delay
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Delay before the next attempt: the server's hint if any, else full-jitter backoff."""
+        backoff = min(Config.LLM_RETRY_MAX_DELAY, Config.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+        hinted = retry_after(self._error_headers(error))
+        if hinted is not None:
+            return min(hinted, Config.LLM_RETRY_MAX_DELAY) + random.uniform(0, Config.LLM_RETRY_BASE_DELAY)
+        return random.uniform(0, backoff)
+
+    @staticmethod
+    def _error_status(error: Exception) -> Optional[int]:
+        """Extract the HTTP status of an SDK error, if it has one."""
+        for candidate in (
+            getattr(error, 'status_code', None),
+            getattr(getattr(error, 'response', None), 'status_code', None),
+            getattr(error, 'code', None),
+        ):
+            if isinstance(candidate, int):
+                return candidate
+        return None
+
+    @staticmethod
+    def _error_headers(error: Exception) -> Optional[Dict[str, str]]:
+        """Extract the HTTP response headers of an SDK error, if it has them."""
+        return getattr(getattr(error, 'response', None), 'headers', None)
+
+    @staticmethod
+    def _is_retryable(error: Exception, status: Optional[int]) -> bool:
+        """Rate limits, server errors, timeouts and dropped connections are retried."""
+        if status is not None:
+            return status in RETRYABLE_STATUSES
+        name = type(error).__name__
+        return 'Timeout' in name or 'Connection' in name
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Estimate how many tokens the text occupies for this provider.
+
+        The default implementation is a character-based heuristic; providers
+        with a local tokenizer override it.
+        
+        Args:
+            text: Text to measure
+            
+        Returns:
+            int: Estimated token count
+        """
+        return int(len(text) / self.CHARS_PER_TOKEN) + 1
 
     def _parse_response(self, response_text: str) -> List[Dict[str, str]]:
         """
-        Parse the cleaned response text into structured review comments.
+        Parse the response text into structured review comments.
+
+        Structured output makes the response a plain JSON document, which is
+        decoded directly. Anything else (code fences, surrounding prose,
+        truncated output) goes through IncrementalReviewParser, which keeps
+        every complete review object; responses that lost content on the way
+        are counted as parse failures in the run metrics.
         
         Args:
             response_text: JSON formatted response text from LLM
             
         Returns:
-            List[Dict[str, str]]: List of valid review comments containing lineNumber and reviewComment
+            List[Dict[str, str]]: List of valid review comments containing lineNumber and reviewComment,
+                a ReviewList marked incomplete if reviews were lost
         """
-        if not response_text:
+        if not response_text or not response_text.strip():
             return []
             
         try:
             data = json.loads(response_text)
-            reviews = data.get("reviews", [])
-            
-            return [
-                review for review in reviews
-                if isinstance(review, dict) 
-                and review.get("lineNumber") 
-                and review.get("reviewComment")
-            ]
+            reviews = data.get("reviews", []) if isinstance(data, dict) else data
+            repaired = failed = False
         except json.JSONDecodeError:
+            parser = IncrementalReviewParser.parse(response_text)
+            reviews = parser.reviews
+            repaired = True
+            failed = parser.malformed > 0 or not parser.complete
+        metrics.record_parse(self.PROVIDER, self.model_name, repaired=repaired, failed=failed)
+
+        if not isinstance(reviews, list):
             return []
+        return ReviewList((review for review in reviews if self._is_valid_review(review)), complete=not failed)
+
+    @staticmethod
+    def _is_valid_review(review: Any) -> bool:
+        """A review is usable if it names a line and has a comment."""
+        return isinstance(review, dict) and bool(review.get("lineNumber")) and bool(review.get("reviewComment"))
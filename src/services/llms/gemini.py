@@ -1,70 +1,168 @@
-from typing import List, Dict
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import AsyncIterator, Iterator, List, Dict, Any, Optional
 import google.generativeai as Client
-from unidiff import Hunk, PatchedFile
 from ...core.config import Config
-from ...core.models import PRDetails
-from .base import BaseLLMService
+from ...core.models import ReviewPrompt
+from .base import BaseLLMService, REVIEW_SCHEMA
+
+def _to_gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a JSON Schema to the OpenAPI subset Gemini accepts: nullable
+    instead of a ["type", "null"] union, enum format for string enums and
+    no additionalProperties.
+    """
+    converted = {'format': 'enum'} if 'enum' in schema else {}
+    for key, value in schema.items():
+        if key == 'additionalProperties':
+            continue
+        if key == 'type' and isinstance(value, list):
+            converted['type'] = next(item for item in value if item != 'null')
+            converted['nullable'] = 'null' in value
+        elif key == 'properties':
+            converted[key] = {name: _to_gemini_schema(prop) for name, prop in value.items()}
+        elif key == 'items':
+            converted[key] = _to_gemini_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+RESPONSE_SCHEMA = _to_gemini_schema(REVIEW_SCHEMA)
+
+# Prompt prefixes (one per pull request) whose model is kept around
+MAX_PREFIX_MODELS = 8
+# Lifetime of a context cache; it is deleted when the service closes
+CONTEXT_CACHE_TTL = timedelta(hours=1)
 
 class GeminiService(BaseLLMService):
     """
     Implementation of BaseLLMService for Google's Gemini model.
     """
+
+    PROVIDER = 'gemini'
     
     def __init__(self):
         """Initialize the Gemini service with configuration."""
         Client.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = Client.GenerativeModel(Config.GEMINI_MODEL)
+        self.model_name = Config.GEMINI_MODEL
+        # Prompt prefix -> (model carrying it as system instruction, monotonic expiry or None)
+        self._models: OrderedDict = OrderedDict()
+        self._context_caches = []
+        self._models_lock = threading.Lock()
         
-    def create_prompt(self, file: PatchedFile, hunk: Hunk, pr_details: PRDetails) -> str:
-        """Create a prompt formatted for Gemini's expectations."""
-        return f"""
-            Your task is to review the following code changes. Please follow these guidelines:
-            Provide your response in this JSON format:
-            {{"reviews": [{{"lineNumber": <line_number>, "reviewComment": "<review comment>, side: "<left or right >, "filepath": "<file path>"}}]}}
-            Important Rules:
-            1. Line Number Validation:
-            - For "left" side: {hunk.source_start} ≤ lineNumber < {hunk.source_start + hunk.source_length}
-            - For "right" side: {hunk.target_start} ≤ lineNumber < {hunk.target_start + hunk.target_length}
-
-            2. Review Focus Areas:
-            - Critical bugs and errors
-            - Security vulnerabilities and risks
-            - Performance optimization opportunities 
-            - Code architecture and maintainability issues
-            - Suggest code for improvement and optimization
-
-            3. Key Requirements:
-            - Return empty "reviews" array if no issues found
-            - Use GitHub Markdown formatting in your comments
-            - Do NOT suggest adding code comments
-            - Provide feedback in language: {Config.HUMAN_LANGUAGE}
-
-            Context Information:
-            File: {file.path}
-            PR Title: {pr_details.title}
-            PR Description: 
-            ---
-            {pr_details.description or 'No description provided'}
-            ---
-
-            Git Diff Details:
-            - Source Start: {hunk.source_start}
-            - Source Length: {hunk.source_length} 
-            - Target Start: {hunk.target_start}
-            - Target Length: {hunk.target_length}
-
-            Code Diff to Review:
-            ```diff
-            {hunk.__str__()}
-            ```
+    def _complete(self, prompt: ReviewPrompt) -> str:
+        """Get response text from Gemini model."""
+        model = self._model_for(prompt.prefix)
+        response = model.generate_content(prompt.suffix, generation_config=self._generation_config())
+        return self._read_response(response)
+
+    async def _acomplete(self, prompt: ReviewPrompt) -> str:
+        """Get response text from Gemini model with the SDK's async API."""
+        model = self._model_for(prompt.prefix)
+        response = await model.generate_content_async(prompt.suffix, generation_config=self._generation_config())
+        return self._read_response(response)
+
+    def _stream(self, prompt: ReviewPrompt) -> Iterator[str]:
+        """Stream response text from Gemini model."""
+        model = self._model_for(prompt.prefix)
+        response = model.generate_content(prompt.suffix, generation_config=self._generation_config(), stream=True)
+        last_chunk = None
+        try:
+            for chunk in response:
+                last_chunk = chunk
+                if chunk.parts:
+                    yield chunk.text
+        finally:
+            if last_chunk is not None:
+                self._record_response_usage(last_chunk)
+
+    async def _astream(self, prompt: ReviewPrompt) -> AsyncIterator[str]:
+        """Stream response text from Gemini model with the SDK's async API."""
+        model = self._model_for(prompt.prefix)
+        response = await model.generate_content_async(
+            prompt.suffix, generation_config=self._generation_config(), stream=True
+        )
+        last_chunk = None
+        try:
+            async for chunk in response:
+                last_chunk = chunk
+                if chunk.parts:
+                    yield chunk.text
+        finally:
+            if last_chunk is not None:
+                self._record_response_usage(last_chunk)
+
+    def _model_for(self, prefix: str) -> Client.GenerativeModel:
         """
+        Get the model that carries a prompt prefix as its system instruction.
+
+        Prefixes of at least GEMINI_CACHE_MIN_TOKENS are stored once as a
+        context cache, so later requests are billed for them at the cached
+        rate; shorter prefixes are sent with every request.
+        """
+        with self._models_lock:
+            entry = self._models.get(prefix)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._models.move_to_end(prefix)
+                return entry[0]
+
+            model, expires = self._create_cached_model(prefix), None
+            if model is not None:
+                # Rebuild shortly before the cache expires rather than failing requests
+                expires = time.monotonic() + CONTEXT_CACHE_TTL.total_seconds() - 60
+            else:
+                model = Client.GenerativeModel(self.model_name, system_instruction=prefix)
+            self._models[prefix] = (model, expires)
+            if len(self._models) > MAX_PREFIX_MODELS:
+                self._models.popitem(last=False)
+            return model
 
-    def get_ai_response(self, prompt: str) -> List[Dict[str, str]]:
-        """Get response from Gemini model."""
+    def _create_cached_model(self, prefix: str) -> Optional[Client.GenerativeModel]:
+        """Create a context cache holding the prefix, or None if it is too short or caching fails."""
+        if Config.GEMINI_CACHE_MIN_TOKENS <= 0 or self.count_tokens(prefix) < Config.GEMINI_CACHE_MIN_TOKENS:
+            return None
         try:
-            response = self.model.generate_content(prompt, generation_config={'max_output_tokens': 1024, 'temperature': 0.3})
-            response_text = self._clean_response_text(response.text)
-            return self._parse_response(response_text)
+            from google.generativeai import caching
+            cached_content = caching.CachedContent.create(
+                model=self.model_name, system_instruction=prefix, ttl=CONTEXT_CACHE_TTL
+            )
         except Exception as e:
-            print(f"Error during Gemini API call: {e}")
-            return []
+            print(f"Gemini context caching unavailable, sending the prompt prefix with every request: {e}")
+            return None
+        self._context_caches.append(cached_content)
+        return Client.GenerativeModel.from_cached_content(cached_content)
+
+    def close(self) -> None:
+        """Delete the context caches created by this service."""
+        with self._models_lock:
+            caches, self._context_caches = self._context_caches, []
+            self._models.clear()
+        for cached_content in caches:
+            try:
+                cached_content.delete()
+            except Exception as e:
+                print(f"Failed to delete Gemini context cache: {e}")
+
+    def _generation_config(self) -> Dict[str, Any]:
+        config = {'max_output_tokens': self.MAX_OUTPUT_TOKENS, 'temperature': 0.3}
+        if Config.STRUCTURED_OUTPUT:
+            config['response_mime_type'] = 'application/json'
+            config['response_schema'] = RESPONSE_SCHEMA
+        return config
+
+    def _read_response(self, response) -> str:
+        """Extract the completion text from a response, recording usage."""
+        self._record_response_usage(response)
+        return response.text
+
+    def _record_response_usage(self, response) -> None:
+        """Record the usage of a response, or of a stream from its last chunk, which carries the totals."""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            self._record_usage(
+                usage.prompt_token_count,
+                usage.candidates_token_count,
+                getattr(usage, 'cached_content_token_count', 0)
+            )
@@ -1,79 +1,145 @@
-from typing import List, Dict
-from openai import OpenAI
-from unidiff import Hunk, PatchedFile
+import threading
+from typing import AsyncIterator, Iterator, List, Dict, Any
+from openai import OpenAI, AsyncOpenAI
 from ...core.config import Config
-from ...core.models import PRDetails
-from .base import BaseLLMService
+from ...core.models import ReviewPrompt
+from .base import BaseLLMService, REVIEW_SCHEMA
 
 class OpenAIService(BaseLLMService):
     """
     Implementation of BaseLLMService for OpenAI's models.
     """
+
+    PROVIDER = 'openai'
     
     def __init__(self):
         """Initialize the OpenAI client with configuration."""
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        # Retries are handled by BaseLLMService so that they share the rate limiter
+        self.client = OpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0)
+        # Created on first async use, on the event loop that drives it
+        self.async_client = None
         self.model = Config.OPENAI_MODEL
+        self.model_name = self.model
+        self._encoding = None
+        self._encoding_lock = threading.Lock()
         
-    def create_prompt(self, file: PatchedFile, hunk: Hunk, pr_details: PRDetails) -> str:
-        """Create a prompt formatted for OpenAI's expectations."""
-        return f"""
-        Your task is to review the following code changes. Please follow these guidelines:
-        Provide your response in this JSON format:
-        {{"reviews": [{{"lineNumber": <line_number>, "reviewComment": "<review comment>, side: "<left or right >, "filepath": "<file path>"}}]}}
-        Important Rules:
-        1. Line Number Validation:
-        - For "left" side: {hunk.source_start} ≤ lineNumber < {hunk.source_start + hunk.source_length}
-        - For "right" side: {hunk.target_start} ≤ lineNumber < {hunk.target_start + hunk.target_length}
-
-        2. Review Focus Areas:
-        - Critical bugs and errors
-        - Security vulnerabilities and risks
-        - Performance optimization opportunities 
-        - Code architecture and maintainability issues
-        - Suggest code for improvement and optimization
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with tiktoken, falling back to the character heuristic."""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return super().count_tokens(text)
+        return len(encoding.encode(text, disallowed_special=()))
 
-        3. Key Requirements:
-        - Return empty "reviews" array if no issues found
-        - Use GitHub Markdown formatting in your comments
-        - Do NOT suggest adding code comments
-        - Provide feedback in language: {Config.HUMAN_LANGUAGE}
+    def _get_encoding(self):
+        """Load the tiktoken encoding for the configured model once."""
+        with self._encoding_lock:
+            if self._encoding is None:
+                try:
+                    import tiktoken
+                    try:
+                        self._encoding = tiktoken.encoding_for_model(self.model)
+                    except KeyError:
+                        self._encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    print(f"tiktoken unavailable, estimating tokens from characters: {e}")
+                    self._encoding = False
+            return self._encoding or None
 
-        Context Information:
-        File: {file.path}
-        PR Title: {pr_details.title}
-        PR Description: 
-        ---
-        {pr_details.description or 'No description provided'}
-        ---
+    def _complete(self, prompt: ReviewPrompt) -> str:
+        """Get response text from OpenAI model."""
+        raw_response = self.client.chat.completions.with_raw_response.create(**self._request_args(prompt))
+        return self._read_response(raw_response)
 
-        Git Diff Details:
-        - Source Start: {hunk.source_start}
-        - Source Length: {hunk.source_length} 
-        - Target Start: {hunk.target_start}
-        - Target Length: {hunk.target_length}
+    async def _acomplete(self, prompt: ReviewPrompt) -> str:
+        """Get response text from OpenAI model with the async client."""
+        if self.async_client is None:
+            self.async_client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0)
+        raw_response = await self.async_client.chat.completions.with_raw_response.create(
+            **self._request_args(prompt)
+        )
+        return self._read_response(raw_response)
 
-        Code Diff to Review:
-        ```diff
-        {hunk.__str__()}
-        ```
-        """
+    def _stream(self, prompt: ReviewPrompt) -> Iterator[str]:
+        """Stream response text from OpenAI model."""
+        raw_response = self.client.chat.completions.with_raw_response.create(
+            **self._request_args(prompt), stream=True, stream_options={"include_usage": True}
+        )
+        self.rate_limiter.observe_headers(raw_response.headers)
+        stream = raw_response.parse()
+        try:
+            for chunk in stream:
+                text = self._read_chunk(chunk)
+                if text:
+                    yield text
+        finally:
+            stream.close()
 
-    def get_ai_response(self, prompt: str) -> List[Dict[str, str]]:
-        """Get response from OpenAI model."""
+    async def _astream(self, prompt: ReviewPrompt) -> AsyncIterator[str]:
+        """Stream response text from OpenAI model with the async client."""
+        if self.async_client is None:
+            self.async_client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0)
+        raw_response = await self.async_client.chat.completions.with_raw_response.create(
+            **self._request_args(prompt), stream=True, stream_options={"include_usage": True}
+        )
+        self.rate_limiter.observe_headers(raw_response.headers)
+        stream = raw_response.parse()
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                temperature=0.3,
-                messages=[
-                    {"role": "system", "content": "You are an expert code reviewer."},
-                    {"role": "user", "content": prompt}
-                ]
+            async for chunk in stream:
+                text = self._read_chunk(chunk)
+                if text:
+                    yield text
+        finally:
+            await stream.close()
+
+    async def aclose(self) -> None:
+        """Close the async client's connection pool."""
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
+
+    def _request_args(self, prompt: ReviewPrompt) -> Dict[str, Any]:
+        args = {
+            "model": self.model,
+            "temperature": 0.3,
+            # OpenAI caches long prompt prefixes automatically; the shared prefix
+            # goes first so every request of a PR starts with the same tokens
+            "messages": [
+                {"role": "system", "content": prompt.prefix},
+                {"role": "user", "content": prompt.suffix}
+            ]
+        }
+        if Config.STRUCTURED_OUTPUT:
+            # Strict mode guarantees the content matches the schema
+            args["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "code_review", "strict": True, "schema": REVIEW_SCHEMA},
+            }
+        return args
+
+    def _read_response(self, raw_response) -> str:
+        """Extract the completion text from a raw response, recording rate limits and usage."""
+        self.rate_limiter.observe_headers(raw_response.headers)
+        response = raw_response.parse()
+        if response.usage:
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            self._record_usage(
+                response.usage.prompt_tokens,
+                response.usage.completion_tokens,
+                getattr(details, "cached_tokens", 0) or 0
+            )
+        if response.choices:
+            return response.choices[0].message.content or ""
+        return ""
+
+    def _read_chunk(self, chunk) -> str:
+        """Extract the text delta of a streamed chunk; the last chunk carries the usage."""
+        if chunk.usage:
+            details = getattr(chunk.usage, "prompt_tokens_details", None)
+            self._record_usage(
+                chunk.usage.prompt_tokens,
+                chunk.usage.completion_tokens,
+                getattr(details, "cached_tokens", 0) or 0
             )
-            if response.choices:
-                response_text = self._clean_response_text(response.choices[0].message.content)
-                return self._parse_response(response_text)
-            return []
-        except Exception as e:
-            print(f"Error during OpenAI API call: {e}")
-            return []
+        if chunk.choices:
+            return chunk.choices[0].delta.content or ""
+        return ""
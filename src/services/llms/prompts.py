@@ -0,0 +1,105 @@
+from typing import List, Optional, Tuple
+from ...core.config import Config
+from ...core.models import PRDetails, FileInfo, DiffHunk, ReviewPrompt
+
+# Everything up to and including the PR context is the same for every request
+# of a pull request, so providers can cache it. Nothing hunk-specific may be
+# added to this template.
+PREFIX_TEMPLATE = """You are an expert code reviewer.
+Your task is to review the code changes of a pull request. Please follow these guidelines:
+Provide your response in this JSON format:
+{{"reviews": [{{"hunkId": <hunk id>, "filepath": "<file path>", "lineNumber": <line_number>, "reviewComment": "<review comment>", "side": "<left or right>"}}]}}
+Important Rules:
+1. Routing and Line Number Validation:
+- Every review must copy the "hunkId" and "filepath" of the hunk it refers to
+- lineNumber must fall inside the left or right range listed for that hunk
+
+2. Review Focus Areas:
+- Critical bugs and errors
+- Security vulnerabilities and risks
+- Performance optimization opportunities
+- Code architecture and maintainability issues
+- Suggest code for improvement and optimization
+
+3. Key Requirements:
+- Return empty "reviews" array if no issues found
+- Use GitHub Markdown formatting in your comments
+- Do NOT suggest adding code comments
+- Provide feedback in language: {language}
+
+Context Information:
+PR Title: {title}
+PR Description:
+---
+{description}
+---
+"""
+
+HUNK_TEMPLATE = """
+### Hunk {hunk_id}
+File: {path}
+- For "left" side: {source_start} ≤ lineNumber < {source_end}
+- For "right" side: {target_start} ≤ lineNumber < {target_end}
+{scope}```diff
+{diff}
+```"""
+
+# Read-only context around a hunk; reviews must still target the diff's lines
+SCOPE_TEMPLATE = """Enclosing scope in the new version, for context only:
+```
+{scope}
+```
+"""
+
+
+def build_prefix(pr_details: PRDetails) -> str:
+    """
+    Render the cacheable part of every prompt of a pull request.
+
+    Args:
+        pr_details: Pull request details
+
+    Returns:
+        str: Review instructions followed by the PR context
+    """
+    return PREFIX_TEMPLATE.format(
+        language=Config.HUMAN_LANGUAGE,
+        title=pr_details.title,
+        description=pr_details.description or 'No description provided',
+    )
+
+
+def build_review_prompt(
+    entries: List[Tuple[FileInfo, DiffHunk]],
+    pr_details: PRDetails,
+    scopes: Optional[List[Optional[str]]] = None,
+) -> ReviewPrompt:
+    """
+    Render the prompt reviewing one or more hunks, possibly from several files.
+
+    Hunks are numbered from 1 in the order given, so batched reviews can be
+    routed back to their hunk; a single hunk is simply hunk 1.
+
+    Args:
+        entries: (file, hunk) pairs to review together
+        pr_details: Pull request details
+        scopes: Enclosing function or class of each hunk, None where unknown
+
+    Returns:
+        ReviewPrompt: Shared prefix and the hunks to review as suffix
+    """
+    scopes = scopes or [None] * len(entries)
+    sections = [
+        HUNK_TEMPLATE.format(
+            hunk_id=hunk_id,
+            path=file.path.strip(),
+            source_start=hunk.source_start,
+            source_end=hunk.source_start + hunk.source_length,
+            target_start=hunk.target_start,
+            target_end=hunk.target_start + hunk.target_length,
+            scope=SCOPE_TEMPLATE.format(scope=scope) if scope else '',
+            diff=hunk.__str__(),
+        )
+        for hunk_id, ((file, hunk), scope) in enumerate(zip(entries, scopes), start=1)
+    ]
+    return ReviewPrompt(build_prefix(pr_details), "\nHunks to Review:" + "".join(sections) + "\n")
@@ -0,0 +1,202 @@
+import asyncio
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Mapping, Optional, Tuple
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+# Header names carrying the remaining quota and its reset time, per provider
+_QUOTA_HEADERS = (
+    ('x-ratelimit-remaining-requests', 'x-ratelimit-reset-requests'),
+    ('x-ratelimit-remaining-tokens', 'x-ratelimit-reset-tokens'),
+    ('anthropic-ratelimit-requests-remaining', 'anthropic-ratelimit-requests-reset'),
+    ('anthropic-ratelimit-tokens-remaining', 'anthropic-ratelimit-tokens-reset'),
+    ('anthropic-ratelimit-input-tokens-remaining', 'anthropic-ratelimit-input-tokens-reset'),
+)
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Convert a rate-limit reset header into seconds from now.
+
+    Understands plain seconds ("20"), Go-style durations ("6m0s", "250ms"),
+    RFC 3339 timestamps and HTTP dates.
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the value is not understood
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if parts and ''.join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+    for parse in (lambda v: datetime.fromisoformat(v.replace('Z', '+00:00')), parsedate_to_datetime):
+        try:
+            moment = parse(value)
+        except (TypeError, ValueError):
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    return None
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Read how long the server asked us to wait from response headers.
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the headers do not say
+    """
+    if not headers:
+        return None
+    milliseconds = headers.get('retry-after-ms')
+    if milliseconds:
+        try:
+            return float(milliseconds) / 1000
+        except ValueError:
+            pass
+    delay = parse_reset(headers.get('retry-after'))
+    if delay is not None:
+        return delay
+
+    resets = [
+        parse_reset(headers.get(reset_header))
+        for remaining_header, reset_header in _QUOTA_HEADERS
+        if headers.get(remaining_header) == '0'
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`.
+
+    A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self._available = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` from the bucket, possibly going into debt.
+
+        Returns:
+            float: Seconds the caller must wait before using the reservation
+        """
+        if self.rate_per_minute <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self._updated) * self.rate_per_minute / 60
+            self._available = min(self.capacity, self._available + refill)
+            self._updated = now
+            self._available -= min(amount, self.capacity)
+            if self._available >= 0:
+                return 0.0
+            return -self._available * 60 / self.rate_per_minute
+
+class RateLimiter:
+    """
+    Client-side rate limiter shared by every service instance of one provider and model.
+
+    Combines a request bucket and a token bucket with a shared cooldown that
+    is set when the provider reports an exhausted quota or answers 429, so
+    parallel callers back off together instead of hammering the API.
+    """
+
+    _registry: Dict[Tuple[str, str], 'RateLimiter'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'failures': 0,
+            'throttled_seconds': 0.0,
+        }
+
+    @classmethod
+    def for_model(
+        cls, provider: str, model: str, requests_per_minute: float = 0, tokens_per_minute: float = 0
+    ) -> 'RateLimiter':
+        """Get the limiter shared by all callers of a provider and model."""
+        with cls._registry_lock:
+            key = (provider, model)
+            if key not in cls._registry:
+                cls._registry[key] = cls(requests_per_minute, tokens_per_minute)
+            return cls._registry[key]
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Block until a request of `tokens` estimated tokens may be sent.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int) -> float:
+        """Like `acquire`, but waits without blocking the event loop."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserve capacity for one request and return how long to wait before sending it."""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self._cooldown_until - time.monotonic())
+            self._stats['requests'] += 1
+            if wait > 0:
+                self._stats['throttled_seconds'] += wait
+        return max(wait, 0.0)
+
+    def cool_down(self, seconds: float) -> None:
+        """Hold back every caller for at least `seconds`."""
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    def observe_headers(self, headers: Optional[Mapping[str, str]]) -> None:
+        """Pause callers until the reset time when a response reports an exhausted quota."""
+        delay = retry_after(headers)
+        if delay:
+            self.cool_down(delay)
+
+    def record_retry(self, rate_limited: bool) -> None:
+        with self._lock:
+            self._stats['retries'] += 1
+            if rate_limited:
+                self._stats['rate_limited'] += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._stats['failures'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get a snapshot of the limiter counters."""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,130 @@
+import json
+from typing import Any, Dict, List, Optional
+
+# Stack entry of the array holding the reviews
+REVIEWS_ARRAY = 'R'
+
+
+class IncrementalReviewParser:
+    """
+    Extracts review objects from LLM output as it arrives.
+
+    The parser scans text fed in arbitrary chunks and yields every object of
+    the reviews array as soon as its closing brace is seen, without waiting
+    for (or requiring) a well-formed document. Only objects of the top-level
+    "reviews" array (or of a bare top-level array) are reviews; arrays
+    elsewhere, such as examples inside a field, are skipped. That makes it
+    tolerant of:
+      - code fences and prose around the JSON
+      - a bare array instead of {"reviews": [...]}
+      - output truncated mid-object (complete objects before it are kept)
+      - individual malformed objects (they are skipped and counted)
+
+    Only bracket and string state and the last object key are tracked, so
+    each chunk is scanned once and nothing before the current review object
+    is kept in memory.
+    """
+
+    def __init__(self) -> None:
+        self.reviews: List[Dict[str, Any]] = []
+        # Review objects that were closed but are not valid JSON
+        self.malformed = 0
+        # Open brackets; the reviews array is pushed as REVIEWS_ARRAY instead of '['
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        # Text of the review object being read, None between objects
+        self._current: Optional[List[str]] = None
+        self._current_depth = 0
+        # Strings of the top-level object: the one being read, the last one
+        # read and the key whose value comes next
+        self._string: Optional[List[str]] = None
+        self._last_string = ''
+        self._key: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        """True once the outermost JSON value has been closed."""
+        return self._started and not self._stack
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Scans the next chunk of output.
+
+        Args:
+            text: Next piece of the response text
+
+        Returns:
+            List[Dict[str, Any]]: Review objects completed by this chunk
+        """
+        found = []
+        start = 0
+        for index, char in enumerate(text):
+            if self.complete:
+                break
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string is not None:
+                        self._last_string = ''.join(self._string)
+                        self._string = None
+                    continue
+                if self._string is not None:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                if self._started:
+                    self._in_string = True
+                    if self._stack == ['{']:
+                        self._string = []
+            elif char == ':' and self._stack == ['{']:
+                self._key = self._last_string
+            elif char == ',' and self._stack == ['{']:
+                self._key = None
+            elif char in '{[':
+                if not self._started:
+                    # Anything before the first bracket is prose or a code fence
+                    self._started = True
+                    if char == '[':
+                        char = REVIEWS_ARRAY
+                elif char == '[' and self._stack == ['{'] and self._key == 'reviews':
+                    char = REVIEWS_ARRAY
+                elif char == '{' and self._current is None and self._stack[-1] == REVIEWS_ARRAY:
+                    self._current = []
+                    self._current_depth = len(self._stack) + 1
+                    start = index
+                self._stack.append(char)
+            elif char in '}]' and self._stack:
+                self._stack.pop()
+                if self._current is not None and len(self._stack) < self._current_depth:
+                    self._current.append(text[start:index + 1])
+                    review = self._decode(''.join(self._current))
+                    self._current = None
+                    if review is not None:
+                        found.append(review)
+
+        if self._current is not None:
+            self._current.append(text[start:])
+        self.reviews.extend(found)
+        return found
+
+    def _decode(self, source: str) -> Optional[Dict[str, Any]]:
+        try:
+            review = json.loads(source)
+        except json.JSONDecodeError:
+            self.malformed += 1
+            return None
+        return review if isinstance(review, dict) else None
+
+    @classmethod
+    def parse(cls, text: str) -> 'IncrementalReviewParser':
+        """Parses a complete response in one go and returns the parser for inspection."""
+        parser = cls()
+        parser.feed(text)
+        return parser
@@ -0,0 +1,328 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Tuple, Any
+
+from ..core.models import ReviewPrompt
+from .llms.base import BaseLLMService
+
+# Latency samples kept per provider to compute the hedging percentile
+LATENCY_WINDOW = 200
+
+class ProviderSlot:
+    """
+    Routing state for one live LLM provider.
+    """
+
+    def __init__(self, name: str, service: BaseLLMService, weight: float = 1.0):
+        self.name = name
+        self.service = service
+        self.weight = max(weight, 0.0)
+        self.outstanding = 0
+        self.current_weight = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.hedges_won = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """
+        Get a latency percentile over the recent successful requests.
+
+        Args:
+            percentile: Percentile between 0 and 100
+
+        Returns:
+            Optional[float]: Latency in seconds, or None without samples
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+class ProviderRouter:
+    """
+    Spreads requests across every live LLM provider.
+
+    Strategies:
+        primary: always use the first provider, others only for failover
+        round_robin: smooth weighted round-robin by provider weight
+        least_outstanding: provider with the fewest in-flight requests per weight
+
+    When `hedge_percentile` is set, a request that is still running after
+    that percentile of its provider's recent latency is duplicated on a
+    second provider, and whichever answers first wins.
+
+    A request makes at most two calls: the primary one plus either a hedge
+    or, if the primary call fails first, a failover. Both count as turns of
+    the weighted round-robin, so the configured weights hold for the calls
+    each provider serves.
+    """
+
+    STRATEGIES = ('primary', 'round_robin', 'least_outstanding')
+
+    def __init__(
+        self,
+        slots: List[ProviderSlot],
+        strategy: str = 'primary',
+        hedge_percentile: float = 0,
+        hedge_min_samples: int = 10,
+        max_workers: int = 4,
+        asynchronous: bool = False
+    ):
+        if not slots:
+            raise ValueError("ProviderRouter needs at least one provider")
+        if strategy not in self.STRATEGIES:
+            print(f"Unsupported PROVIDER_STRATEGY '{strategy}'. Using 'primary'.")
+            strategy = 'primary'
+
+        self.slots = slots
+        self.strategy = strategy
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedged_requests = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        if self._hedging_enabled() and not asynchronous:
+            # Each hedged call may occupy two workers, one per provider
+            self._executor = ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="hedge")
+
+    def call(self, prompt: ReviewPrompt) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """
+        Send a prompt to the selected provider, failing over to another on error.
+
+        Returns:
+            Tuple[ProviderSlot, List[Dict[str, str]]]: Provider that answered and its reviews
+        """
+        slot = self._select()
+        if self._hedging_enabled():
+            return self._call_hedged(slot, prompt)
+        try:
+            return slot, self._invoke(slot, prompt)
+        except Exception as e:
+            return self._failover(slot, prompt, e)
+
+    async def acall(self, prompt: ReviewPrompt) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """Async variant of `call`, with the same routing, hedging and failover."""
+        slot = self._select()
+        if self._hedging_enabled():
+            return await self._acall_hedged(slot, prompt)
+        try:
+            return slot, await self._ainvoke(slot, prompt)
+        except Exception as e:
+            return await self._afailover(slot, prompt, e)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get per-provider routing statistics.
+
+        Returns:
+            Dict[str, Any]: Counters and latency percentiles keyed by provider name
+        """
+        with self._lock:
+            return {
+                'hedged_requests': self.hedged_requests,
+                'providers': {
+                    slot.name: {
+                        'requests': slot.requests,
+                        'failures': slot.failures,
+                        'outstanding': slot.outstanding,
+                        'hedges_won': slot.hedges_won,
+                        'latency_p50': slot.latency_percentile(50),
+                        'latency_p95': slot.latency_percentile(95),
+                    }
+                    for slot in self.slots
+                }
+            }
+
+    def close(self) -> None:
+        """Stop the hedging workers without waiting for abandoned requests."""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _hedging_enabled(self) -> bool:
+        return self.hedge_percentile > 0 and len(self.slots) > 1
+
+    def _select(self, exclude: Optional[ProviderSlot] = None) -> Optional[ProviderSlot]:
+        """
+        Pick the provider for the next call according to the strategy.
+
+        `exclude` (the provider already serving the request) is not eligible,
+        but the round-robin still advances it like every other provider, so
+        failovers and hedges do not shift the rotation away from it.
+        """
+        with self._lock:
+            live = [slot for slot in self.slots if slot.weight > 0]
+            candidates = [slot for slot in live if slot is not exclude]
+            if not candidates:
+                return None
+
+            if self.strategy == 'least_outstanding':
+                return min(candidates, key=lambda slot: slot.outstanding / slot.weight)
+
+            if self.strategy == 'round_robin':
+                total = sum(slot.weight for slot in live)
+                for slot in live:
+                    slot.current_weight += slot.weight
+                chosen = max(candidates, key=lambda slot: slot.current_weight)
+                chosen.current_weight -= total
+                return chosen
+
+            return candidates[0]
+
+    def _failover(
+        self, slot: ProviderSlot, prompt: ReviewPrompt, error: Exception
+    ) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """Retry a request that failed on `slot` once on another provider, else raise `error`."""
+        fallback = self._select(exclude=slot)
+        if fallback is None:
+            raise error
+        print(f"{slot.name} request failed ({error}), retrying on {fallback.name}")
+        return fallback, self._invoke(fallback, prompt)
+
+    async def _afailover(
+        self, slot: ProviderSlot, prompt: ReviewPrompt, error: Exception
+    ) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """Async variant of `_failover`."""
+        fallback = self._select(exclude=slot)
+        if fallback is None:
+            raise error
+        print(f"{slot.name} request failed ({error}), retrying on {fallback.name}")
+        return fallback, await self._ainvoke(fallback, prompt)
+
+    def _invoke(self, slot: ProviderSlot, prompt: ReviewPrompt) -> List[Dict[str, str]]:
+        """Call one provider, tracking its in-flight count and latency."""
+        with self._lock:
+            slot.outstanding += 1
+            slot.requests += 1
+        started = time.monotonic()
+        try:
+            reviews = slot.service.get_ai_response(prompt)
+        except Exception:
+            with self._lock:
+                slot.failures += 1
+            raise
+        finally:
+            with self._lock:
+                slot.outstanding -= 1
+
+        with self._lock:
+            slot.latencies.append(time.monotonic() - started)
+        return reviews
+
+    async def _ainvoke(self, slot: ProviderSlot, prompt: ReviewPrompt) -> List[Dict[str, str]]:
+        """Async variant of `_invoke`."""
+        with self._lock:
+            slot.outstanding += 1
+            slot.requests += 1
+        started = time.monotonic()
+        try:
+            reviews = await slot.service.aget_ai_response(prompt)
+        except Exception:
+            with self._lock:
+                slot.failures += 1
+            raise
+        finally:
+            with self._lock:
+                slot.outstanding -= 1
+
+        with self._lock:
+            slot.latencies.append(time.monotonic() - started)
+        return reviews
+
+    async def _acall_hedged(self, slot: ProviderSlot, prompt: ReviewPrompt) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """Async variant of `_call_hedged`; the losing call is cancelled."""
+        first = asyncio.ensure_future(self._ainvoke(slot, prompt))
+        with self._lock:
+            enough_samples = len(slot.latencies) >= self.hedge_min_samples
+            delay = slot.latency_percentile(self.hedge_percentile) if enough_samples else None
+        if delay is None:
+            return await self._aresult_or_failover(slot, first, prompt)
+
+        done, _ = await asyncio.wait([first], timeout=delay)
+        backup = None if done else self._select(exclude=slot)
+        if backup is None:
+            return await self._aresult_or_failover(slot, first, prompt)
+
+        with self._lock:
+            self.hedged_requests += 1
+        pending = {first: slot, asyncio.ensure_future(self._ainvoke(backup, prompt)): backup}
+        error = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    owner = pending.pop(task)
+                    try:
+                        reviews = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    if owner is backup:
+                        with self._lock:
+                            backup.hedges_won += 1
+                    return owner, reviews
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _call_hedged(self, slot: ProviderSlot, prompt: ReviewPrompt) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """
+        Run a request, duplicating it on a second provider if it is slower than usual.
+
+        A call that fails before the hedge is issued fails over instead; once
+        both calls are out, the request fails only if both do.
+        """
+        first = self._executor.submit(self._invoke, slot, prompt)
+        with self._lock:
+            enough_samples = len(slot.latencies) >= self.hedge_min_samples
+            delay = slot.latency_percentile(self.hedge_percentile) if enough_samples else None
+        if delay is None:
+            return self._result_or_failover(slot, first, prompt)
+
+        done, _ = wait([first], timeout=delay)
+        backup = None if done else self._select(exclude=slot)
+        if backup is None:
+            return self._result_or_failover(slot, first, prompt)
+
+        with self._lock:
+            self.hedged_requests += 1
+        pending = {first: slot, self._executor.submit(self._invoke, backup, prompt): backup}
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                owner = pending.pop(future)
+                try:
+                    reviews = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if owner is backup:
+                    with self._lock:
+                        backup.hedges_won += 1
+                return owner, reviews
+        raise error
+
+    def _result_or_failover(
+        self, slot: ProviderSlot, future: Future, prompt: ReviewPrompt
+    ) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """Wait for the only call of a request, failing over once if it fails."""
+        try:
+            return slot, future.result()
+        except Exception as e:
+            return self._failover(slot, prompt, e)
+
+    async def _aresult_or_failover(
+        self, slot: ProviderSlot, task: asyncio.Future, prompt: ReviewPrompt
+    ) -> Tuple[ProviderSlot, List[Dict[str, str]]]:
+        """Async variant of `_result_or_failover`."""
+        try:
+            return slot, await task
+        except Exception as e:
+            return await self._afailover(slot, prompt, e)
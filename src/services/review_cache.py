@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional
+
+class ReviewCache:
+    """
+    Persistent, content-addressed cache of LLM review responses.
+
+    Entries are keyed by a hash of the provider, the model and the rendered
+    prompt, so any change to the hunk, the PR context or the prompt template
+    produces a new key. Entries expire after `ttl_seconds` and the least
+    recently used ones are evicted once the store exceeds `max_entries`.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        """
+        Open (or create) the SQLite store backing the cache.
+
+        Args:
+            path: Location of the SQLite database file
+            ttl_seconds: Maximum age of an entry before it is ignored
+            max_entries: Maximum number of entries kept after pruning
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_accessed ON reviews (accessed_at)")
+        self._conn.commit()
+        self.prune()
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str) -> str:
+        """
+        Build the cache key for a prompt sent to a given provider and model.
+
+        Returns:
+            str: Hex SHA-256 digest identifying the request
+        """
+        digest = hashlib.sha256()
+        for part in (provider, model, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, str]]]:
+        """
+        Look up a cached response.
+
+        Returns:
+            Optional[List[Dict[str, str]]]: Cached review comments, or None on a miss
+        """
+        return self.get_first([key])
+
+    def get_first(self, keys: List[str]) -> Optional[List[Dict[str, str]]]:
+        """
+        Look up several candidate keys, returning the first live entry.
+
+        Counts as a single hit or miss, whatever the number of keys.
+
+        Returns:
+            Optional[List[Dict[str, str]]]: Cached review comments, or None on a miss
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                for key in keys:
+                    row = self._conn.execute(
+                        "SELECT response, created_at FROM reviews WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and now - row[1] <= self.ttl_seconds:
+                        self._conn.execute("UPDATE reviews SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._conn.commit()
+                        self.hits += 1
+                        return json.loads(row[0])
+                self.misses += 1
+        except sqlite3.Error as e:
+            print(f"Review cache read failed: {e}")
+        return None
+
+    def set(self, key: str, reviews: List[Dict[str, str]]) -> None:
+        """Store the review comments returned for a request."""
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO reviews (key, response, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(reviews), now, now)
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"Review cache write failed: {e}")
+
+    def prune(self) -> None:
+        """Drop expired entries and evict the least recently used beyond `max_entries`."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM reviews WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.execute(
+                "DELETE FROM reviews WHERE key NOT IN "
+                "(SELECT key FROM reviews ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Prune the store and close the underlying connection."""
+        try:
+            self.prune()
+        finally:
+            self._conn.close()
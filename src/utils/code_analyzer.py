@@ -1,93 +1,266 @@
-import re
-from typing import List, Dict, Any
-from unidiff import Hunk
-from unidiff.patch import Line
-from ..core.models import PRDetails, FileInfo
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+from ..core.config import Config
+from ..core.models import PRDetails, FileInfo, DiffFile, DiffHunk
 from ..services.ai_service import AIService
-from ..libs.Hunk import NumberedHunk
+from .context_store import PRContextStore
+from .fair_scheduler import SchedulerLane
+from .hunk_dedup import HunkDeduplicator
+from .hunk_scheduler import HunkScheduler, ReviewBudget
+from .metrics import metrics
+from .prompt_planner import PromptPlanner, PromptRequest
+
+# Requests rendered ahead of the worker pool, per worker
+PENDING_REQUESTS_PER_WORKER = 2
 
 
 class CodeAnalyzer:
-  def __init__(self, ai_service: AIService):
+  def __init__(self, ai_service: AIService, max_workers: int = None, lane: Optional[SchedulerLane] = None):
     self.ai_service = ai_service
+    self.max_workers = max_workers or Config.MAX_CONCURRENCY
+    # Slots shared with other jobs; without it, this analyzer has max_workers to itself
+    self.lane = lane
+    self.planner = PromptPlanner(ai_service)
+    # Requests that got no answer; their hunks were not reviewed
+    self.failed_requests = 0
+    # Hunks left out by the review budget; like failed requests, they are still unreviewed
+    self.skipped_hunks = 0
+    self._failed_lock = threading.Lock()
 
   def analyze_code(
-    self, parsed_diff: List[Dict[str, Any]], pr_details: PRDetails
+    self, parsed_diff: Iterable[DiffFile], pr_details: PRDetails, context: Optional[PRContextStore] = None
   ) -> List[Dict[str, Any]]:
     """
     Analyzes code changes and generates review comments.
+
+    `parsed_diff` may be a lazy iterator: hunks are sized into requests by
+    the PromptPlanner and dispatched as soon as their file has been parsed,
+    with at most `max_workers` requests in flight. Comments keep diff order,
+    or priority order under a review budget.
+    With a `context` store, prompts include each hunk's enclosing scope.
     """
     comments = []
-    
-    for file_data in self._get_valid_files(parsed_diff):
-      file_info = FileInfo(file_data["path"])
-      comments.extend(self._process_file_hunks(file_info, file_data, pr_details))
+    for request_comments in self.iter_comments(parsed_diff, pr_details, context):
+      comments.extend(request_comments)
       
     return comments
 
-  def _get_valid_files(self, parsed_diff: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Filters out invalid file paths from the diff."""
-    return [
-      file_data for file_data in parsed_diff
-      if file_data.get("path") and file_data["path"] != "/dev/null"
-    ]
-  
-  def _get_source_target_start(self, hunk_headers: str):
-    match = re.match(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@', hunk_headers)
+  def iter_comments(
+    self, parsed_diff: Iterable[DiffFile], pr_details: PRDetails, context: Optional[PRContextStore] = None
+  ) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields the comments of each request as soon as it and every earlier
+    request have completed, so callers can post results incrementally
+    while keeping diff order.
 
-    if match:
-      source_start = int(match.group(1))
-      target_start = int(match.group(3))
-      source_length = int(match.group(2)) if match.group(2) else 1
-      target_length = int(match.group(4)) if match.group(4) else 1
-      return source_start, target_start, source_length, target_length
+    With a review budget (REVIEW_MAX_TOKENS / _SECONDS / _COST), hunks are
+    reviewed in order of their HunkScorer value instead, and requests that
+    do not fit the budget are skipped and reported. With DEDUP_MODE, only
+    one of each group of near-identical hunks is reviewed and its comments
+    are applied to the others.
+    """
+    jobs = self._iter_jobs(parsed_diff)
+    dedup = None
+    if Config.DEDUP_MODE in ("fanout", "collapse"):
+      dedup = HunkDeduplicator(Config.DEDUP_MODE, Config.DEDUP_THRESHOLD, Config.DEDUP_MIN_CHANGED_LINES)
+      jobs = metrics.timed_iter("hunk.dedup", dedup.cluster(jobs))
+    elif Config.DEDUP_MODE != "off":
+      print(f"Unsupported DEDUP_MODE '{Config.DEDUP_MODE}', expected off, fanout or collapse. Not deduplicating.")
+    budget = ReviewBudget.from_config()
+    scheduler = HunkScheduler(budget) if budget.limited else None
+    if scheduler is not None:
+      jobs = metrics.timed_iter("hunk.prioritize", scheduler.prioritize(jobs))
+    requests = self._track_plan(metrics.timed_iter("prompt.build", self.planner.plan(jobs, pr_details, context)))
+    if scheduler is not None:
+      requests = scheduler.within_budget(requests)
+    yield from self._run_requests(requests, dedup)
+    if scheduler is not None and scheduler.skipped:
+      with self._failed_lock:
+        self.skipped_hunks += len(scheduler.skipped)
 
-    return 1, 1, 1, 1
+  def _iter_jobs(self, parsed_diff: Iterable[DiffFile]) -> Iterator[Tuple[FileInfo, DiffHunk]]:
+    """Yields a (file, hunk) review job for every hunk of every valid file."""
+    for file_data in self._get_valid_files(parsed_diff):
+      file_info = FileInfo(file_data.path)
+      yield from self._process_file_hunks(file_info, file_data)
 
-  def _process_file_hunks(
-    self, file_info: FileInfo, file_data: Dict[str, Any], pr_details: PRDetails
+  def _track_plan(self, requests: Iterable[PromptRequest]) -> Iterator[PromptRequest]:
+    """Passes requests through while tallying their token estimates for the forecast."""
+    request_count = hunk_count = total_tokens = largest = 0
+    for request in requests:
+      request_count += 1
+      hunk_count += len(request.entries)
+      total_tokens += request.estimated_tokens
+      largest = max(largest, request.estimated_tokens)
+      yield request
+
+    if request_count:
+      print(
+        f"Planned {request_count} requests for {hunk_count} hunks: "
+        f"~{total_tokens} input tokens (largest request ~{largest})"
+      )
+
+  def _run_requests(
+    self, requests: Iterable[PromptRequest], dedup: Optional[HunkDeduplicator] = None
+  ) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Sends requests as they are planned, yielding per-request comments in request order.
+
+    At most PENDING_REQUESTS_PER_WORKER requests per worker are queued ahead
+    of the pool, so a huge diff is not rendered into prompts all at once.
+    With the AI service's event loop, requests run as coroutines instead and
+    exactly `max_workers` are in flight, without a thread each. With a
+    scheduler lane, a request is only submitted once the lane grants it a
+    slot, so it never waits in the pool while holding one.
+    """
+    event_loop = getattr(self.ai_service, "event_loop", None)
+    if event_loop is not None:
+      yield from self._submit_in_order(
+        requests, lambda request: event_loop.submit(self._areview_request(request, dedup)),
+        self.lane or threading.BoundedSemaphore(self.max_workers)
+      )
+      return
+
+    if self.max_workers <= 1 and self.lane is None:
+      for request in requests:
+        yield self._review_request(request, dedup)
+      return
+
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      yield from self._submit_in_order(
+        requests, lambda request: executor.submit(self._review_request, request, dedup),
+        self.lane or threading.BoundedSemaphore(self.max_workers * PENDING_REQUESTS_PER_WORKER)
+      )
+
+  def _submit_in_order(
+    self,
+    requests: Iterable[PromptRequest],
+    submit: Callable[[PromptRequest], Future],
+    slots: Any,
+  ) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Submits requests as `slots` (a semaphore or scheduler lane) allows,
+    yielding results in request order.
+    """
+    futures = deque()
+    for request in requests:
+      with metrics.stage("llm.wait"):
+        slots.acquire()
+      try:
+        future = submit(request)
+      except BaseException:
+        # A shared lane would otherwise lose the slot for every other job
+        slots.release()
+        raise
+      future.add_done_callback(lambda _: slots.release())
+      futures.append(future)
+      while futures and futures[0].done():
+        yield futures.popleft().result()
+
+    while futures:
+      with metrics.stage("llm.wait"):
+        comments = futures.popleft().result()
+      yield comments
+
+  def _review_request(
+    self, request: PromptRequest, dedup: Optional[HunkDeduplicator] = None
   ) -> List[Dict[str, Any]]:
-    """Processes hunks for a single file and generates comments."""
+    """Reviews the hunks of one request; failures are isolated to that request."""
+    try:
+      ai_response = self.ai_service.get_ai_response(request.prompt)
+    except Exception as e:
+      return self._request_failed(request, e)
+    return self._comments_for_request(request, ai_response, dedup)
+
+  async def _areview_request(
+    self, request: PromptRequest, dedup: Optional[HunkDeduplicator] = None
+  ) -> List[Dict[str, Any]]:
+    """Async variant of `_review_request`, run on the AI service's event loop."""
+    try:
+      ai_response = await self.ai_service.aget_ai_response(request.prompt)
+    except Exception as e:
+      return self._request_failed(request, e)
+    return self._comments_for_request(request, ai_response, dedup)
+
+  def _request_failed(self, request: PromptRequest, error: Exception) -> List[Dict[str, Any]]:
+    """Reports a request that got no answer; its hunks yield no comments."""
+    paths = ", ".join(sorted({file_info.path.strip() for file_info, _ in request.entries}))
+    print(f"Error reviewing {len(request.entries)} hunk(s) in {paths}: {error}")
+    with self._failed_lock:
+      self.failed_requests += 1
+    metrics.increment("failed_requests")
+    return []
+
+  def _comments_for_request(
+    self, request: PromptRequest, ai_response: List[Dict[str, Any]], dedup: Optional[HunkDeduplicator] = None
+  ) -> List[Dict[str, Any]]:
+    """
+    Turns the reviews of one request into comments, routing batched reviews
+    to their hunk and applying them to the hunk's duplicates.
+    """
+    if len(request.entries) == 1:
+      file_info, hunk = request.entries[0]
+      comments = self._create_comments(file_info, hunk, ai_response)
+      return dedup.expand(request.origins[0], comments) if dedup is not None else comments
+
+    routed = [[] for _ in request.entries]
+    for response in ai_response:
+      index = self._route_response(request.entries, response)
+      if index is not None:
+        routed[index].append(response)
+
     comments = []
-    
-    for hunk_data in file_data.get("hunks", []):
-      hunk_lines = hunk_data.get("lines", [])
-      hunk_header = hunk_data.get("header", "")
-      source_start, target_start, source_length, target_length = self._get_source_target_start(hunk_header)
-      if not hunk_lines:
-        continue
-        
-      hunk = self._create_hunk(hunk_lines, source_start, target_start, source_length, target_length)
-      ai_response = self._get_ai_review(file_info, hunk, pr_details)
-      if ai_response:
-        comments.extend(self._create_comments(file_info, hunk, ai_response))
-        
+    for (file_info, hunk), origin, responses in zip(request.entries, request.origins, routed):
+      hunk_comments = self._create_comments(file_info, hunk, responses)
+      comments.extend(dedup.expand(origin, hunk_comments) if dedup is not None else hunk_comments)
     return comments
 
-  def _create_hunk(self, hunk_lines: List[str], source_start, target_start, source_length, target_length) -> Hunk:
-    """Creates a Hunk object from a list of lines."""
-    hunk = NumberedHunk(src_start=source_start, tgt_start=target_start, src_len=source_length, tgt_len=target_length)
-    for line_str in hunk_lines:
-        if line_str.startswith('+'):
-            line = Line(value=line_str[1:], line_type='+')
-        elif line_str.startswith('-'):
-            line = Line(value=line_str[1:], line_type='-')
-        else:
-            line = Line(value=line_str, line_type=' ')
-            
-        hunk.append(line)
-    
-    return hunk
-
-  def _get_ai_review(
-    self, file_info: FileInfo, hunk: Hunk, pr_details: PRDetails
-  ) -> List[Dict[str, str]]:
-    """Gets AI review comments for a code hunk."""
-    prompt = self.ai_service.create_prompt(file_info, hunk, pr_details)
-    return self.ai_service.get_ai_response(prompt)
+  def _route_response(
+    self, entries: List[Tuple[FileInfo, DiffHunk]], response: Dict[str, Any]
+  ) -> Optional[int]:
+    """Finds the index of the hunk a batched review refers to."""
+    filepath = str(response.get("filepath", "")).strip()
+    try:
+      index = int(response.get("hunkId")) - 1
+    except (TypeError, ValueError):
+      index = -1
+
+    if 0 <= index < len(entries):
+      if not filepath or entries[index][0].path.strip() == filepath:
+        return index
+
+    # Fall back to the file path and line number when the hunk id is unusable
+    for index, (file_info, hunk) in enumerate(entries):
+      if file_info.path.strip() == filepath and self._format_comment(file_info, hunk, response):
+        return index
+
+    # Without a path either, the line number alone decides if it fits exactly one hunk
+    if not filepath:
+      matches = [
+        index for index, (file_info, hunk) in enumerate(entries)
+        if self._format_comment(file_info, hunk, response)
+      ]
+      if len(matches) == 1:
+        return matches[0]
+    return None
+
+  def _get_valid_files(self, parsed_diff: Iterable[DiffFile]) -> Iterator[DiffFile]:
+    """Filters out invalid file paths from the diff."""
+    return (
+      file_data for file_data in parsed_diff
+      if file_data.path and file_data.path != "/dev/null"
+    )
+
+  def _process_file_hunks(
+    self, file_info: FileInfo, file_data: DiffFile
+  ) -> List[Tuple[FileInfo, DiffHunk]]:
+    """Builds the review jobs for the non-empty hunks of a single file."""
+    return [(file_info, hunk) for hunk in file_data.hunks if len(hunk)]
 
   def _create_comments(
-    self, file: FileInfo, hunk: Hunk, ai_responses: List[Dict[str, str]]
+    self, file: FileInfo, hunk: DiffHunk, ai_responses: List[Dict[str, str]]
   ) -> List[Dict[str, Any]]:
     """Creates formatted comments from AI responses."""
     comments = []
@@ -98,7 +271,7 @@ class CodeAnalyzer:
     return comments
 
   def _format_comment(
-    self, file: FileInfo, hunk: Hunk, response: Dict[str, str]
+    self, file: FileInfo, hunk: DiffHunk, response: Dict[str, str]
   ) -> Dict[str, Any]:
     """Formats a single AI response into a comment."""
     try:
@@ -0,0 +1,307 @@
+import mmap
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from ..core.models import PRDetails, DiffHunk
+from ..services.github_service import GitHubService
+from .metrics import metrics
+
+# Lines that open a function, method, class or similar block in common languages
+DEFINITION_PATTERN = re.compile(
+  r"^\s*(?:(?:export|default|public|private|protected|internal|static|async|abstract|final|override|"
+  r"virtual|inline|unsafe|extern|open|sealed|suspend|data|pub(?:\([^)]*\))?)\s+)*"
+  r"(?:def|class|function|func|fn|interface|struct|enum|impl|trait|module|object|namespace|sub|proc)\b"
+  # C-family methods: a signature ending in an opening brace, but not a control statement
+  r"|^\s*(?!(?:if|for|foreach|while|switch|catch|else|do|return|try|using|lock)\b)"
+  r"[\w$.<>\[\]*&:,~ ]+\([^;]*\)[\w\s:,<>*&]*\{\s*$"
+  # Functions assigned to variables (JavaScript / TypeScript)
+  r"|^\s*(?:export\s+)?(?:const|let|var)\s+[\w$]+\s*=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>|[\w$]+\s*=>)"
+)
+# Lines closing a block at the indentation of its opening line
+CLOSING_PATTERN = re.compile(r"^\s*(?:[}\])]|end\b)")
+
+# How far to look for the enclosing definition above and its end below a hunk
+SCAN_LIMIT = 400
+
+
+class _MappedText:
+  """Line-addressable, read-only view of a memory-mapped file."""
+
+  def __init__(self, buffer: mmap.mmap):
+    self._buffer = buffer
+    self._starts = array("I", [0])
+    position = buffer.find(b"\n")
+    while position != -1:
+      self._starts.append(position + 1)
+      position = buffer.find(b"\n", position + 1)
+    if self._starts[-1] == len(buffer):
+      self._starts.pop()
+    self.line_count = len(self._starts)
+
+  def line(self, number: int) -> str:
+    """Returns line `number` (1-based) without its line ending."""
+    start = self._starts[number - 1]
+    end = self._starts[number] if number < self.line_count else len(self._buffer)
+    return self._buffer[start:end].decode("utf-8", errors="replace").rstrip("\r\n")
+
+  def close(self) -> None:
+    self._buffer.close()
+
+
+class PRContextStore:
+  """
+  Head content of the files touched by a pull request, fetched once per file.
+
+  Files are read from the local checkout when it is at the PR head, from
+  the local git object store when it has the head commit (e.g. after
+  `actions/checkout` with `fetch-depth: 0`), and otherwise downloaded from
+  the GitHub API in the background as soon as the diff names the file.
+  Content is memory-mapped rather than held as Python strings, and each
+  file is indexed by line once, however many hunks it has.
+
+  `enclosing_scope` returns the function or class around a hunk, found by
+  indentation, for the hunk's prompt.
+  """
+
+  def __init__(
+    self,
+    github_service: GitHubService,
+    pr_details: PRDetails,
+    workspace: Optional[str] = None,
+    max_lines: int = 60,
+    max_file_bytes: int = 1024 * 1024,
+    max_workers: int = 4,
+  ):
+    self.github_service = github_service
+    self.pr_details = pr_details
+    self.max_lines = max_lines
+    self.max_file_bytes = max_file_bytes
+    self._lock = threading.Lock()
+    self._files: Dict[str, Future] = {}
+    self._workspace = self._find_workspace(workspace, pr_details.head_sha)
+    self._git_objects = self._workspace is not None and self._workspace[1]
+    self._git_batch: Optional[subprocess.Popen] = None
+    self._git_lock = threading.Lock()
+    self._executor: Optional[ThreadPoolExecutor] = None
+    if self._workspace is None:
+      self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="context-fetch")
+
+  def prefetch(self, path: str) -> None:
+    """Starts loading a file's head content, if it is not loaded or loading yet."""
+    path = path.strip()
+    with self._lock:
+      if path in self._files:
+        return
+      if self._executor is not None:
+        self._files[path] = self._executor.submit(self._load, path)
+        return
+      future = self._files[path] = Future()
+    # Local reads are cheap enough to do inline
+    try:
+      future.set_result(self._load(path))
+    except Exception as e:
+      future.set_exception(e)
+
+  def enclosing_scope(self, path: str, hunk: DiffHunk) -> Optional[str]:
+    """
+    Renders the function or class enclosing a hunk in the head version.
+
+    The hunk's own lines are elided, since the diff shows them. Scopes
+    longer than `max_lines` are cut to their first line and a window
+    around the hunk.
+
+    Returns:
+      Numbered source lines, or None for top-level code and unreadable files
+    """
+    text = self._text(path)
+    if text is None:
+      return None
+
+    first = max(1, hunk.target_start)
+    last = min(text.line_count, first + max(hunk.target_length, 1) - 1)
+    if first > text.line_count:
+      return None
+    scope = self._find_scope(text, first, last)
+    if scope is None:
+      return None
+    start, end = scope
+    return self._render(text, start, end, first, last)
+
+  def close(self) -> None:
+    """Stops pending downloads and unmaps every file."""
+    if self._executor is not None:
+      self._executor.shutdown(wait=True, cancel_futures=True)
+    with self._lock:
+      futures, self._files = list(self._files.values()), {}
+    for future in futures:
+      if future.done() and not future.cancelled() and future.exception() is None and future.result():
+        future.result().close()
+    if self._git_batch is not None:
+      self._git_batch.stdin.close()
+      self._git_batch.wait()
+      self._git_batch = None
+
+  def _text(self, path: str) -> Optional[_MappedText]:
+    path = path.strip()
+    self.prefetch(path)
+    with metrics.stage("context.wait"):
+      try:
+        return self._files[path].result()
+      except Exception as e:
+        print(f"Context for {path} unavailable: {e}")
+        return None
+
+  def _load(self, path: str) -> Optional[_MappedText]:
+    """Reads a file's head content into a memory map; None if it is missing, empty or too large."""
+    with metrics.stage("context.fetch"):
+      if self._workspace is not None and not self._git_objects:
+        local_path = os.path.join(self._workspace[0], path)
+        if not os.path.isfile(local_path) or os.path.getsize(local_path) > self.max_file_bytes:
+          return None
+        with open(local_path, "rb") as f:
+          return self._map(f)
+
+      with tempfile.TemporaryFile() as f:
+        if self._git_objects:
+          found = self._read_git_object(path, f)
+        else:
+          found = self.github_service.download_file(
+            self.pr_details.owner, self.pr_details.repo, path, self.pr_details.head_sha, f, self.max_file_bytes
+          )
+        metrics.increment("context_files_fetched")
+        return self._map(f) if found else None
+
+  def _read_git_object(self, path: str, out) -> bool:
+    """Copies `<head>:<path>` from the local object store into `out`."""
+    with self._git_lock:
+      if self._git_batch is None:
+        # One long-lived process serves every file of the run
+        self._git_batch = subprocess.Popen(
+          ["git", "-C", self._workspace[0], "cat-file", "--batch"],
+          stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+      self._git_batch.stdin.write(f"{self.pr_details.head_sha}:{path}\n".encode("utf-8"))
+      self._git_batch.stdin.flush()
+      header = self._git_batch.stdout.readline().split()
+      if len(header) != 3:
+        # "<object> missing" and the like carry no content
+        return False
+      # Any other object (a tree, a submodule commit) is read past too, or the pipe gets out of step
+      wanted = header[1] == b"blob"
+      remaining = int(header[2])
+      too_large = remaining > self.max_file_bytes
+      while remaining:
+        chunk = self._git_batch.stdout.read(min(remaining, 64 * 1024))
+        if not chunk:
+          raise OSError("git cat-file exited early")
+        remaining -= len(chunk)
+        if wanted and not too_large:
+          out.write(chunk)
+      self._git_batch.stdout.read(1)
+      return wanted and not too_large
+
+  @staticmethod
+  def _map(f) -> Optional[_MappedText]:
+    f.flush()
+    if os.fstat(f.fileno()).st_size == 0:
+      return None
+    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if b"\0" in buffer[:8192]:
+      # Binary file
+      buffer.close()
+      return None
+    return _MappedText(buffer)
+
+  @staticmethod
+  def _find_workspace(workspace: Optional[str], head_sha: str) -> Optional[Tuple[str, bool]]:
+    """
+    Finds a local checkout able to serve head content.
+
+    Returns:
+      (path, False) if the working tree is at the head commit, (path, True)
+      if only the object store has it, None to download from GitHub
+    """
+    if not workspace or not head_sha or not os.path.isdir(os.path.join(workspace, ".git")):
+      return None
+    try:
+      head = subprocess.run(
+        ["git", "-C", workspace, "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10
+      )
+      if head.returncode == 0 and head.stdout.strip() == head_sha:
+        return workspace, False
+      has_commit = subprocess.run(
+        ["git", "-C", workspace, "cat-file", "-e", f"{head_sha}^{{commit}}"], capture_output=True, timeout=10
+      )
+      if has_commit.returncode == 0:
+        return workspace, True
+    except (OSError, subprocess.SubprocessError):
+      pass
+    return None
+
+  def _find_scope(self, text: _MappedText, first: int, last: int) -> Optional[Tuple[int, int]]:
+    """Finds the lines [start, end] of the innermost definition enclosing lines first..last."""
+    indent = min(
+      (self._indent(line) for line in (text.line(n) for n in range(first, last + 1)) if line.strip()),
+      default=None
+    )
+    if indent is None:
+      return None
+
+    start = None
+    for number in range(first - 1, max(0, first - SCAN_LIMIT), -1):
+      line = text.line(number)
+      if not line.strip():
+        continue
+      line_indent = self._indent(line)
+      if line_indent < indent:
+        if DEFINITION_PATTERN.match(line):
+          start = number
+          break
+        # A block between the hunk and its definition, e.g. an if or a loop
+        indent = line_indent
+    if start is None:
+      return None
+
+    start_indent = self._indent(text.line(start))
+    end = last
+    for number in range(last + 1, min(text.line_count, last + SCAN_LIMIT) + 1):
+      line = text.line(number)
+      if not line.strip():
+        continue
+      if self._indent(line) <= start_indent:
+        if CLOSING_PATTERN.match(line):
+          end = number
+        break
+      end = number
+    return start, end
+
+  def _render(self, text: _MappedText, start: int, end: int, first: int, last: int) -> str:
+    """Numbers the scope's lines, eliding the hunk and anything beyond `max_lines`."""
+    numbers = [n for n in range(start, end + 1) if not first <= n <= last]
+    if len(numbers) > self.max_lines:
+      margin = max(1, (self.max_lines - 1) // 2)
+      numbers = [start] + [n for n in numbers if n != start and first - margin <= n <= last + margin]
+
+    lines = []
+    previous = None
+    for number in numbers:
+      if previous is not None and number != previous + 1:
+        if previous < first and number > last:
+          lines.append(f"     | ... lines {first}-{last} are shown in the diff ...")
+        else:
+          lines.append("     | ...")
+      lines.append(f"{number:4d} | {text.line(number)}")
+      previous = number
+    if previous is not None and previous < first:
+      lines.append(f"     | ... lines {first}-{last} are shown in the diff ...")
+    return "\n".join(lines)
+
+  @staticmethod
+  def _indent(line: str) -> int:
+    expanded = line.expandtabs(4)
+    return len(expanded) - len(expanded.lstrip())
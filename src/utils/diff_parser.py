@@ -1,40 +1,91 @@
-from typing import List, Dict, Any
-from unidiff import PatchSet, PatchedFile, Hunk
+from typing import List, Iterable, Iterator
+from ..core.models import DiffFile, HUNK_HEADER_PATTERN
+from ..libs.Hunk import NumberedHunk
+from .metrics import metrics
 
 class DiffParser:
   @staticmethod
-  def parse_diff(diff_str: str) -> List[Dict[str, Any]]:
+  def parse_diff(diff_str: str) -> List[DiffFile]:
     """Parses the diff string and returns a structured format."""
-    files = []
+    return list(DiffParser.iter_files(DiffParser.split_lines(diff_str)))
+
+  @staticmethod
+  def split_lines(diff_str: str) -> Iterator[str]:
+    """
+    Splits a diff into lines, keeping line endings.
+
+    Only "\n" ends a line, as in the line counts of hunk headers;
+    `str.splitlines` would also split on `\r`, form feeds or U+2028 inside
+    a line and misalign every hunk after it.
+    """
+    start = 0
+    while start < len(diff_str):
+      end = diff_str.find('\n', start)
+      if end < 0:
+        yield diff_str[start:]
+        return
+      yield diff_str[start:end + 1]
+      start = end + 1
+
+  @staticmethod
+  def iter_files(lines: Iterable[str]) -> Iterator[DiffFile]:
+    """
+    Lazily parses diff lines, yielding each file as soon as all its hunks are read.
+
+    Accepts any iterable of lines, such as a streamed HTTP response, so the
+    whole diff never has to be held in memory. Hunk bodies are delimited by
+    the line counts in their headers, so content lines that look like diff
+    headers are never misread.
+    """
+    return metrics.timed_iter("diff.parse", DiffParser._iter_files(lines))
+
+  @staticmethod
+  def _iter_files(lines: Iterable[str]) -> Iterator[DiffFile]:
     current_file = None
-    current_hunk = None
+    hunk_header = None
+    hunk_lines = []
+    source_left = target_left = 0
 
-    for line in diff_str.splitlines(keepends=True):
-        if line.startswith('index'):
-            continue
+    for line in lines:
+        if hunk_header is not None:
+            if source_left > 0 or target_left > 0:
+                prefix = line[:1]
+                if prefix == '+':
+                    target_left -= 1
+                elif prefix == '-':
+                    source_left -= 1
+                elif prefix != '\\':
+                    source_left -= 1
+                    target_left -= 1
+                hunk_lines.append(line)
+                continue
+            if line.startswith('\\'):
+                hunk_lines.append(line)
+                continue
+            current_file.hunks.append(NumberedHunk.from_lines(hunk_header, hunk_lines))
+            hunk_header, hunk_lines = None, []
 
         if line.startswith('diff --git'):
             if current_file:
-                files.append(current_file)
-            current_file = {'path': '', 'hunks': []}
+                yield current_file
+            current_file = DiffFile()
             
         elif line.startswith('--- a/'):
             if current_file:
-                current_file['path'] = line[6:]
+                current_file.path = line[6:].rstrip('\r\n')
                 
         elif line.startswith('+++ b/'):
             if current_file:
-                current_file['path'] = line[6:]
+                current_file.path = line[6:].rstrip('\r\n')
                 
         elif line.startswith('@@'):
-            if current_file:
-                current_hunk = {'header': line, 'lines': []}
-                current_file['hunks'].append(current_hunk)
+            match = HUNK_HEADER_PATTERN.match(line)
+            if current_file and match:
+                hunk_header = line
+                source_left = int(match.group(2)) if match.group(2) else 1
+                target_left = int(match.group(4)) if match.group(4) else 1
 
-        elif current_hunk is not None:
-            current_hunk['lines'].append(line)
-            
+    if hunk_header is not None:
+        current_file.hunks.append(NumberedHunk.from_lines(hunk_header, hunk_lines))
     if current_file:
-        files.append(current_file)
-        
-    return files
+        yield current_file
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class EventLoopThread:
+  """
+  An asyncio event loop running on a background thread.
+
+  Lets synchronous code (the review pipeline) drive async provider clients:
+  coroutines are submitted from any thread and their results come back as
+  concurrent.futures.Future objects. One loop is shared by every request of
+  a run, so async clients and their connection pools are reused.
+  """
+
+  def __init__(self, name: str = "llm-event-loop"):
+    self.loop = asyncio.new_event_loop()
+    self._thread: Optional[threading.Thread] = threading.Thread(
+      target=self._run, name=name, daemon=True
+    )
+    self._thread.start()
+
+  def submit(self, coroutine: Coroutine[Any, Any, T]) -> 'Future[T]':
+    """Schedules a coroutine on the loop and returns a future of its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+  def run(self, coroutine: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """Runs a coroutine on the loop and blocks until it completes."""
+    return self.submit(coroutine).result(timeout)
+
+  def close(self) -> None:
+    """Stops the loop and waits for its thread to exit."""
+    if self._thread is None:
+      return
+    self.loop.call_soon_threadsafe(self.loop.stop)
+    self._thread.join()
+    self._thread = None
+    self.loop.close()
+
+  def _run(self) -> None:
+    asyncio.set_event_loop(self.loop)
+    self.loop.run_forever()
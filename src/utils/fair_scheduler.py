@@ -0,0 +1,70 @@
+import threading
+from collections import deque
+from typing import Deque
+
+
+class SchedulerLane:
+  """
+  One job's handle on a FairScheduler, used like a semaphore.
+
+  `acquire` blocks until the scheduler grants this job one of the shared
+  slots; `release` hands the slot back once the request finished.
+  """
+
+  def __init__(self, scheduler: 'FairScheduler', name: str):
+    self.scheduler = scheduler
+    self.name = name
+    # Slots held by this job's requests in flight
+    self.active = 0
+    self._waiting = 0
+
+  def acquire(self) -> None:
+    self.scheduler._acquire(self)
+
+  def release(self) -> None:
+    self.scheduler._release(self)
+
+
+class FairScheduler:
+  """
+  Shares a fixed number of concurrent LLM requests between review jobs.
+
+  Free slots are granted round-robin over the jobs waiting for one, so a
+  PR with thousands of hunks gets one request in per turn like every other
+  PR and cannot starve small ones. A job alone in the scheduler can use
+  every slot.
+  """
+
+  def __init__(self, slots: int):
+    self.slots = max(1, slots)
+    self._free = self.slots
+    self._condition = threading.Condition()
+    # Jobs waiting for a slot, in the order they get one
+    self._turns: Deque[SchedulerLane] = deque()
+
+  def lane(self, name: str) -> SchedulerLane:
+    """Creates the handle through which one job acquires slots."""
+    return SchedulerLane(self, name)
+
+  def _acquire(self, lane: SchedulerLane) -> None:
+    with self._condition:
+      lane._waiting += 1
+      if lane._waiting == 1:
+        self._turns.append(lane)
+      while not (self._free and self._turns[0] is lane):
+        self._condition.wait()
+
+      self._free -= 1
+      lane.active += 1
+      lane._waiting -= 1
+      self._turns.popleft()
+      if lane._waiting:
+        # Further requests of this job queue up behind the other jobs
+        self._turns.append(lane)
+      self._condition.notify_all()
+
+  def _release(self, lane: SchedulerLane) -> None:
+    with self._condition:
+      self._free += 1
+      lane.active -= 1
+      self._condition.notify_all()
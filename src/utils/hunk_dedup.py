@@ -0,0 +1,203 @@
+import hashlib
+import random
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from ..core.models import FileInfo, DiffHunk
+from .metrics import metrics
+
+# Identifiers, numbers and string literals, the tokens normalization rewrites
+TOKEN_PATTERN = re.compile(r"[A-Za-z_$][\w$]*|\d[\w.]*|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|\S")
+# Words kept as they are: they carry the structure of a change
+KEYWORDS = frozenset((
+  "if", "else", "elif", "for", "while", "return", "def", "class", "function", "import", "from", "as",
+  "try", "except", "catch", "finally", "throw", "raise", "new", "delete", "const", "let", "var", "async",
+  "await", "yield", "with", "in", "is", "not", "and", "or", "true", "false", "True", "False", "None",
+  "null", "nil", "self", "this", "public", "private", "protected", "static", "switch", "case", "break",
+  "continue", "lambda", "fn", "func", "struct", "interface", "type", "package", "use", "go", "defer",
+))
+
+# MinHash signature of NUM_BANDS x BAND_ROWS values; hunks sharing a band are compared
+NUM_BANDS = 16
+BAND_ROWS = 4
+# Universal hash functions (a * x + b) % MERSENNE_PRIME standing in for random permutations;
+# XOR with a seed would keep the order of values sharing their high bits, biasing the minimum
+MERSENNE_PRIME = (1 << 61) - 1
+_random = random.Random(0x5EED)
+_PERMUTATIONS = [
+  (_random.randrange(1, MERSENNE_PRIME), _random.randrange(MERSENNE_PRIME)) for _ in range(NUM_BANDS * BAND_ROWS)
+]
+del _random
+SHINGLE_SIZE = 3
+
+# Locations listed in a collapsed comment
+MAX_LISTED_LOCATIONS = 10
+
+Job = Tuple[FileInfo, DiffHunk]
+
+
+class HunkDeduplicator:
+  """
+  Reviews one representative of each group of near-identical hunks.
+
+  Mass renames, codemods and vendored updates repeat the same change
+  across many files. `cluster` groups hunks whose changed lines are the
+  same after collapsing whitespace, and, for hunks with at least
+  `min_changed_lines` changes, hunks whose normalized token shingles have
+  a MinHash similarity of at least `threshold`. Normalization renames
+  identifiers and literals by order of appearance, so `foo(bar)` and
+  `baz(qux)` look alike. Candidates come from locality-sensitive hashing
+  of the signatures, so the cost stays linear in the number of hunks.
+
+  Only hunks with the same sequence of added, removed and context lines
+  are grouped. A comment on a representative's line therefore maps to the
+  line at the same offset in every follower. `expand` either copies the
+  comment to each follower ("fanout") or lists the followers' locations
+  in it ("collapse").
+
+  Clustering needs every hunk, so `cluster` reads the whole diff before
+  yielding the first representative.
+  """
+
+  def __init__(self, mode: str = "collapse", threshold: float = 0.9, min_changed_lines: int = 4):
+    self.mode = mode
+    self.threshold = threshold
+    self.min_changed_lines = min_changed_lines
+    # Followers by id() of their representative hunk
+    self.followers: Dict[int, List[Job]] = {}
+
+  def cluster(self, jobs: Iterable[Job]) -> Iterator[Job]:
+    """Yields one job per cluster, in diff order, recording the others as followers."""
+    jobs = list(jobs)
+    exact: Dict[Tuple[str, str], Job] = {}
+    buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[int]] = defaultdict(list)
+    # MinHash signatures by index in `representatives`
+    signatures: Dict[int, List[int]] = {}
+    representatives: List[Job] = []
+    followers = 0
+
+    for job in jobs:
+      hunk = job[1]
+      changes = self._changes(hunk)
+      if not changes:
+        representatives.append(job)
+        continue
+      shape = self._shape(hunk)
+      key = (shape, "\n".join(" ".join(line.split()) for line in changes))
+      representative = exact.get(key)
+      signature = None
+      if representative is None and len(changes) >= self.min_changed_lines:
+        signature = self._signature(changes)
+        representative = self._find_similar(shape, signature, buckets, signatures, representatives)
+      if representative is not None:
+        self.followers.setdefault(id(representative[1]), []).append(job)
+        followers += 1
+        continue
+
+      index = len(representatives)
+      representatives.append(job)
+      exact[key] = job
+      if signature is not None:
+        signatures[index] = signature
+        for band in range(NUM_BANDS):
+          buckets[(shape, band, tuple(signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]))].append(index)
+
+    if followers:
+      print(f"Deduplication: {followers} of {len(jobs)} hunks repeat another hunk and are not reviewed separately")
+      metrics.increment("hunks_deduplicated", followers)
+    yield from representatives
+
+  def expand(self, hunk: DiffHunk, comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Applies the comments on a representative hunk to its followers.
+
+    `hunk` is the hunk `cluster` yielded, also when the comments were made
+    on a piece of it that the PromptPlanner split off: comment lines are
+    file lines, so they map the same way.
+    """
+    followers = self.followers.get(id(hunk))
+    if not followers or not comments:
+      return comments
+
+    if self.mode == "fanout":
+      expanded = list(comments)
+      for file_info, follower in followers:
+        expanded.extend(
+          dict(comment, path=file_info.path.strip(), line=self._remap(comment, hunk, follower))
+          for comment in comments
+        )
+      return expanded
+
+    collapsed = []
+    for comment in comments:
+      locations = [
+        f"`{file_info.path.strip()}` line {self._remap(comment, hunk, follower)}"
+        for file_info, follower in followers[:MAX_LISTED_LOCATIONS]
+      ]
+      if len(followers) > MAX_LISTED_LOCATIONS:
+        locations.append(f"{len(followers) - MAX_LISTED_LOCATIONS} more")
+      note = f"\n\n_Also applies to {len(followers)} similar changes: {', '.join(locations)}._"
+      collapsed.append(dict(comment, body=comment["body"] + note))
+    return collapsed
+
+  def _find_similar(
+    self,
+    shape: str,
+    signature: List[int],
+    buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[int]],
+    signatures: Dict[int, List[int]],
+    representatives: List[Job],
+  ) -> Optional[Job]:
+    """Finds a representative of the same shape whose estimated similarity reaches the threshold."""
+    seen = set()
+    for band in range(NUM_BANDS):
+      for index in buckets.get((shape, band, tuple(signature[band * BAND_ROWS:(band + 1) * BAND_ROWS])), ()):
+        if index in seen:
+          continue
+        seen.add(index)
+        matches = sum(a == b for a, b in zip(signature, signatures[index]))
+        if matches >= self.threshold * len(signature):
+          return representatives[index]
+    return None
+
+  @staticmethod
+  def _changes(hunk: DiffHunk) -> List[str]:
+    """Added and removed lines, with their +/- prefix."""
+    return [hunk.line(index) for index in range(len(hunk)) if hunk.line(index)[:1] in "+-"]
+
+  @staticmethod
+  def _shape(hunk: DiffHunk) -> str:
+    return "".join(hunk.line(index)[:1] or " " for index in range(len(hunk)))
+
+  @staticmethod
+  def _shingles(changes: List[str]) -> Set[int]:
+    """Stable 64-bit hashes of the normalized token shingles of the changed lines."""
+    names: Dict[str, str] = {}
+    tokens = []
+    for line in changes:
+      tokens.append(line[0])
+      for token in TOKEN_PATTERN.findall(line[1:]):
+        if token in KEYWORDS or not (token[0].isalnum() or token[0] in "_$\"'"):
+          tokens.append(token)
+        else:
+          tokens.append(names.setdefault(token, f"v{len(names)}"))
+    # Not hash(): it is salted per process and may be negative
+    return {
+      int.from_bytes(
+        hashlib.blake2b("\0".join(tokens[index:index + SHINGLE_SIZE]).encode(), digest_size=8).digest(), "big"
+      )
+      for index in range(max(1, len(tokens) - SHINGLE_SIZE + 1))
+    }
+
+  @classmethod
+  def _signature(cls, changes: List[str]) -> List[int]:
+    """MinHash signature of the normalized token shingles of the changed lines."""
+    shingles = cls._shingles(changes)
+    return [min((a * shingle + b) % MERSENNE_PRIME for shingle in shingles) for a, b in _PERMUTATIONS]
+
+  @staticmethod
+  def _remap(comment: Dict[str, Any], hunk: DiffHunk, follower: DiffHunk) -> int:
+    """Moves a comment's line from the representative to the same offset in a follower."""
+    if comment["side"] == "LEFT":
+      return comment["line"] - hunk.source_start + follower.source_start
+    return comment["line"] - hunk.target_start + follower.target_start
@@ -0,0 +1,219 @@
+import math
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..core.config import Config
+from ..core.models import FileInfo, DiffHunk
+from .metrics import metrics
+from .path_matcher import PathMatcher
+from .prompt_planner import PromptRequest
+
+# Relative value of a change by file extension; unknown extensions count as 1.0
+FILE_TYPE_WEIGHTS: Dict[str, float] = {
+  **dict.fromkeys(
+    (".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".java", ".kt", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp",
+     ".cs", ".rb", ".php", ".swift", ".scala", ".sh", ".sql", ".vue", ".svelte"),
+    1.5,
+  ),
+  **dict.fromkeys((".yml", ".yaml", ".toml", ".ini", ".cfg", ".tf", ".gradle", ".xml"), 1.0),
+  **dict.fromkeys((".json", ".html", ".css", ".scss"), 0.7),
+  **dict.fromkeys((".md", ".rst", ".txt", ".adoc"), 0.3),
+  **dict.fromkeys((".lock", ".sum", ".snap", ".svg", ".csv"), 0.1),
+}
+# Whole file names overriding the extension weight
+FILE_NAME_WEIGHTS: Dict[str, float] = {
+  "dockerfile": 1.5, "makefile": 1.2, "package-lock.json": 0.1, "yarn.lock": 0.1, "pnpm-lock.yaml": 0.1,
+  "poetry.lock": 0.1, "cargo.lock": 0.1, "go.sum": 0.1,
+}
+
+# Paths whose changes are security-sensitive
+SENSITIVE_PATH_PATTERN = re.compile(
+  r"auth|login|passw|secret|token|credential|crypt|session|permission|acl|oauth|jwt|saml|"
+  r"security|sanitiz|payment|billing|migration|\.github/workflows/|dockerfile|\.env",
+  re.IGNORECASE,
+)
+SENSITIVE_WEIGHT = 2.0
+
+TEST_PATH_PATTERN = re.compile(
+  r"(^|/)(tests?|__tests__|spec|testdata|fixtures)/|(^|/)test_[^/]*$|_test\.\w+$|\.(test|spec)\.\w+$",
+  re.IGNORECASE,
+)
+TEST_WEIGHT = 0.5
+
+# Output tokens assumed per request when estimating its cost
+EXPECTED_OUTPUT_TOKENS = 200
+
+# Skipped hunks listed in the run report
+MAX_REPORTED_SKIPS = 50
+
+
+@dataclass
+class SkippedHunk:
+  path: str
+  target_start: int
+  target_length: int
+  score: float
+  reason: str
+
+
+class HunkScorer:
+  """
+  Estimates how much reviewing a hunk is worth, from the diff alone.
+
+  The score grows with the number of added lines (removed lines count
+  half), is weighted by file type, doubled for security-sensitive paths,
+  halved for tests, and raised slightly for files with much churn in the
+  pull request.
+  """
+
+  def __init__(self, sensitive_paths: Optional[PathMatcher] = None):
+    self.sensitive_paths = sensitive_paths or PathMatcher([])
+
+  def score(self, file_info: FileInfo, hunk: DiffHunk, file_churn: int = 0) -> float:
+    path = file_info.path.strip()
+    # A hunk's lines are its context plus its changes, whose sides the ranges count
+    added = max(0, len(hunk) - hunk.source_length)
+    removed = max(0, len(hunk) - hunk.target_length)
+    value = math.log1p(added) + 0.5 * math.log1p(removed)
+    value *= self._type_weight(path)
+    if SENSITIVE_PATH_PATTERN.search(path) or self.sensitive_paths.matches(path):
+      value *= SENSITIVE_WEIGHT
+    if TEST_PATH_PATTERN.search(path):
+      value *= TEST_WEIGHT
+    return value * (1 + 0.1 * math.log1p(file_churn))
+
+  @staticmethod
+  def _type_weight(path: str) -> float:
+    name = os.path.basename(path).lower()
+    if name in FILE_NAME_WEIGHTS:
+      return FILE_NAME_WEIGHTS[name]
+    return FILE_TYPE_WEIGHTS.get(os.path.splitext(name)[1], 1.0)
+
+
+class ReviewBudget:
+  """
+  Limits on the LLM work of one review: estimated input tokens, wall
+  seconds since the review started, and estimated cost in USD. A limit of
+  0 is unlimited.
+  """
+
+  def __init__(
+    self,
+    max_tokens: int = 0,
+    max_seconds: float = 0,
+    max_cost: float = 0,
+    input_price: float = 0,
+    output_price: float = 0,
+  ):
+    self.max_tokens = max_tokens
+    self.max_seconds = max_seconds
+    self.max_cost = max_cost
+    # USD per million tokens
+    self.input_price = input_price
+    self.output_price = output_price
+    self.started = time.perf_counter()
+    self.tokens = 0
+    self.cost = 0.0
+
+  @classmethod
+  def from_config(cls) -> 'ReviewBudget':
+    return cls(
+      Config.REVIEW_MAX_TOKENS, Config.REVIEW_MAX_SECONDS, Config.REVIEW_MAX_COST,
+      Config.LLM_INPUT_PRICE, Config.LLM_OUTPUT_PRICE,
+    )
+
+  @property
+  def limited(self) -> bool:
+    return bool(self.max_tokens or self.max_seconds or self.max_cost)
+
+  def request_cost(self, request: PromptRequest) -> float:
+    return (request.estimated_tokens * self.input_price + EXPECTED_OUTPUT_TOKENS * self.output_price) / 1e6
+
+  def refusal(self, request: PromptRequest) -> Optional[str]:
+    """Why `request` does not fit in what is left of the budget, or None if it does."""
+    if self.max_seconds and time.perf_counter() - self.started >= self.max_seconds:
+      return "time"
+    if self.max_tokens and self.tokens + request.estimated_tokens > self.max_tokens:
+      return "tokens"
+    if self.max_cost and self.cost + self.request_cost(request) > self.max_cost:
+      return "cost"
+    return None
+
+  def charge(self, request: PromptRequest) -> None:
+    self.tokens += request.estimated_tokens
+    self.cost += self.request_cost(request)
+
+
+class HunkScheduler:
+  """
+  Orders review jobs by value and dispatches requests within a budget.
+
+  Ordering needs every hunk's score, so `prioritize` reads the whole diff
+  before yielding the first job; it is only worth it when a budget may cut
+  the review short. Requests that do not fit the remaining token or cost
+  budget are skipped and cheaper ones after them are still tried; once
+  the time budget is spent, nothing more is dispatched. Skipped hunks are
+  printed and added to the run report.
+  """
+
+  def __init__(self, budget: ReviewBudget, scorer: Optional[HunkScorer] = None):
+    self.budget = budget
+    self.scorer = scorer or HunkScorer(PathMatcher.from_comma_separated(Config.SENSITIVE_PATHS))
+    self.skipped: List[SkippedHunk] = []
+    self._scores: Dict[Tuple[int, int], float] = {}
+
+  def prioritize(self, jobs: Iterable[Tuple[FileInfo, DiffHunk]]) -> Iterator[Tuple[FileInfo, DiffHunk]]:
+    """Yields the jobs ordered by descending score; ties keep diff order."""
+    jobs = list(jobs)
+    churn: Dict[str, int] = defaultdict(int)
+    for file_info, hunk in jobs:
+      churn[file_info.path] += max(0, 2 * len(hunk) - hunk.source_length - hunk.target_length)
+
+    scored = []
+    for file_info, hunk in jobs:
+      score = self.scorer.score(file_info, hunk, churn[file_info.path])
+      self._scores[(id(file_info), id(hunk))] = score
+      scored.append((score, file_info, hunk))
+    scored.sort(key=lambda item: -item[0])
+    for _, file_info, hunk in scored:
+      yield file_info, hunk
+
+  def within_budget(self, requests: Iterable[PromptRequest]) -> Iterator[PromptRequest]:
+    """Passes through the requests that fit the budget, recording the others as skipped."""
+    for request in requests:
+      reason = self.budget.refusal(request)
+      if reason is None:
+        self.budget.charge(request)
+        yield request
+      else:
+        self._skip(request, reason)
+    self._report()
+
+  def _skip(self, request: PromptRequest, reason: str) -> None:
+    for file_info, hunk in request.entries:
+      # Pieces of split hunks were not scored themselves
+      score = self._scores.get((id(file_info), id(hunk)))
+      if score is None:
+        score = self.scorer.score(file_info, hunk)
+      self.skipped.append(SkippedHunk(
+        file_info.path.strip(), hunk.target_start, hunk.target_length, round(score, 2), reason
+      ))
+
+  def _report(self) -> None:
+    if not self.skipped:
+      return
+    metrics.increment("hunks_skipped", len(self.skipped))
+    reasons: Dict[str, int] = defaultdict(int)
+    for skipped in self.skipped:
+      reasons[skipped.reason] += 1
+    files = len({skipped.path for skipped in self.skipped})
+    summary = ", ".join(f"{count} over the {reason} budget" for reason, count in sorted(reasons.items()))
+    print(f"Review budget: skipped {len(self.skipped)} hunks in {files} files ({summary})")
+    metrics.add_section("skipped_hunks", [
+      {"path": s.path, "lines": f"{s.target_start}-{s.target_start + max(s.target_length, 1) - 1}",
+       "score": s.score, "reason": s.reason}
+      for s in sorted(self.skipped, key=lambda s: -s.score)[:MAX_REPORTED_SKIPS]
+    ])
@@ -0,0 +1,87 @@
+import re
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..core.models import DiffFile, DiffHunk
+
+# Hidden marker recording the head commit a review covered
+REVIEW_MARKER = "<!-- llm-code-reviewer:reviewed-sha={sha} -->"
+REVIEW_MARKER_PATTERN = re.compile(r"<!-- llm-code-reviewer:reviewed-sha=([0-9a-f]{7,40}) -->")
+
+
+def format_review_marker(sha: str) -> str:
+  """Builds the hidden marker recording that `sha` has been reviewed."""
+  return REVIEW_MARKER.format(sha=sha)
+
+
+def parse_review_marker(body: Optional[str]) -> Optional[str]:
+  """Extracts the reviewed commit SHA from a review body, if it has a marker."""
+  match = REVIEW_MARKER_PATTERN.search(body or "")
+  return match.group(1) if match else None
+
+
+class ChangedLines:
+  """
+  Lines of the PR head touched since a previously reviewed commit.
+
+  Built from the compare diff between the reviewed commit and the new
+  head: its target line numbers are head line numbers, so they can be
+  matched directly against the target ranges of the full PR diff.
+  """
+
+  def __init__(self) -> None:
+    self._ranges: Dict[str, List[Tuple[int, int]]] = {}
+
+  @classmethod
+  def from_diff(cls, files: Iterable[DiffFile]) -> 'ChangedLines':
+    """Collects the changed head lines of every file in a compare diff."""
+    changed = cls()
+    for file_data in files:
+      ranges = []
+      for hunk in file_data.hunks:
+        ranges.extend(cls._hunk_changes(hunk))
+      changed._ranges[file_data.path] = cls._merge(ranges)
+    return changed
+
+  def filter(self, files: Iterable[DiffFile]) -> Iterator[DiffFile]:
+    """Yields the PR files reduced to hunks that overlap a changed line."""
+    for file_data in files:
+      ranges = self._ranges.get(file_data.path)
+      if not ranges:
+        continue
+      hunks = [hunk for hunk in file_data.hunks if self._overlaps(ranges, hunk)]
+      if hunks:
+        yield DiffFile(file_data.path, hunks)
+
+  @staticmethod
+  def _hunk_changes(hunk: DiffHunk) -> List[Tuple[int, int]]:
+    """Head line ranges [start, end) of added lines, plus the position of each deletion."""
+    ranges = []
+    position = hunk.target_start
+    for source_line, target_line, _ in hunk.iter_numbered():
+      if target_line is not None and source_line is None:
+        ranges.append((target_line, target_line + 1))
+      elif source_line is not None and target_line is None:
+        # A deletion has no head line; mark where it happened
+        ranges.append((position, position + 1))
+      if target_line is not None:
+        position = target_line + 1
+    return ranges
+
+  @staticmethod
+  def _merge(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = []
+    for start, end in sorted(ranges):
+      if merged and start <= merged[-1][1]:
+        merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+      else:
+        merged.append((start, end))
+    return merged
+
+  @staticmethod
+  def _overlaps(ranges: List[Tuple[int, int]], hunk: DiffHunk) -> bool:
+    start = hunk.target_start
+    end = hunk.target_start + max(hunk.target_length, 1)
+    index = bisect_right(ranges, (start, float("inf"))) - 1
+    if index >= 0 and ranges[index][1] > start:
+      return True
+    return index + 1 < len(ranges) and ranges[index + 1][0] < end
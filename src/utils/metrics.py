@@ -0,0 +1,220 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+  """Nearest-rank percentile of `samples`, 0.0 when empty."""
+  if not samples:
+    return 0.0
+  ordered = sorted(samples)
+  return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+class RunMetrics:
+  """
+  Collects timings and token usage of one review run.
+
+  Stage times are exclusive: when a timed stage drives another one (parsing
+  pulls lines from the download, planning pulls files from the parser), the
+  inner stage's time is not counted again in the outer one. Stages running
+  on several threads add up, so they may exceed the wall time.
+  """
+
+  def __init__(self) -> None:
+    self.started = time.perf_counter()
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self._stages: Dict[str, Dict[str, float]] = {}
+    self._llm: Dict[str, Dict[str, Any]] = {}
+    self._counters: Dict[str, int] = {}
+    self._sections: Dict[str, Any] = {}
+
+  @contextmanager
+  def stage(self, name: str) -> Iterator[None]:
+    """Times the enclosed block as stage `name`."""
+    frame = self._enter()
+    try:
+      yield
+    finally:
+      self._exit(name, frame)
+
+  def timed_iter(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+    """Passes items through, timing the work spent producing them as stage `name`."""
+    iterator = iter(iterable)
+    while True:
+      frame = self._enter()
+      try:
+        item = next(iterator)
+      except StopIteration:
+        return
+      finally:
+        self._exit(name, frame)
+      yield item
+
+  def increment(self, name: str, amount: int = 1) -> None:
+    """Adds `amount` to the counter `name`."""
+    with self._lock:
+      self._counters[name] = self._counters.get(name, 0) + amount
+
+  def record_request(self, provider: str, model: str, seconds: float, ok: bool = True) -> None:
+    """Records the latency of one LLM request, retries included."""
+    with self._lock:
+      usage = self._usage(provider, model)
+      usage["latencies"].append(seconds)
+      if not ok:
+        usage["failures"] += 1
+
+  def record_tokens(
+    self, provider: str, model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0
+  ) -> None:
+    """Records the token usage reported by a provider response."""
+    with self._lock:
+      usage = self._usage(provider, model)
+      usage["input_tokens"] += input_tokens or 0
+      usage["output_tokens"] += output_tokens or 0
+      usage["cached_tokens"] += cached_tokens or 0
+
+  def record_parse(self, provider: str, model: str, repaired: bool = False, failed: bool = False) -> None:
+    """
+    Records how a response was parsed: directly, repaired by the tolerant
+    parser, or with content lost (malformed or truncated review objects).
+    """
+    with self._lock:
+      usage = self._usage(provider, model)
+      usage["responses"] += 1
+      usage["parse_repaired"] += int(repaired)
+      usage["parse_failures"] += int(failed)
+
+  def add_section(self, name: str, data: Any) -> None:
+    """Attaches statistics gathered elsewhere (cache, rate limiter, API client) to the report."""
+    with self._lock:
+      self._sections[name] = data
+
+  def report(self) -> Dict[str, Any]:
+    """
+    Builds the machine-readable run report.
+
+    Returns:
+      Dict[str, Any]: Wall time, per-stage times, per-model LLM latency and
+        token usage, counters and attached sections
+    """
+    with self._lock:
+      llm = {}
+      for key, usage in self._llm.items():
+        latencies = usage["latencies"]
+        llm[key] = {
+          "requests": len(latencies),
+          "failures": usage["failures"],
+          "total_seconds": round(sum(latencies), 3),
+          "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+          "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+          "max_ms": round(max(latencies, default=0.0) * 1000, 1),
+          "input_tokens": usage["input_tokens"],
+          "output_tokens": usage["output_tokens"],
+          "cached_tokens": usage["cached_tokens"],
+          "responses": usage["responses"],
+          "parse_repaired": usage["parse_repaired"],
+          "parse_failures": usage["parse_failures"],
+          "parse_failure_rate": round(usage["parse_failures"] / usage["responses"], 4) if usage["responses"] else 0.0,
+        }
+      return {
+        "wall_seconds": round(time.perf_counter() - self.started, 3),
+        "stages": {
+          name: {"seconds": round(stage["seconds"], 3), "calls": int(stage["calls"])}
+          for name, stage in self._stages.items()
+        },
+        "llm": llm,
+        "counters": dict(self._counters),
+        **self._sections,
+      }
+
+  def write_json(self, path: str) -> None:
+    """Writes the run report as JSON."""
+    with open(path, "w") as f:
+      json.dump(self.report(), f, indent=2, default=str)
+
+  def write_step_summary(self, path: str) -> None:
+    """Appends the run report as Markdown tables to a GitHub Actions job summary."""
+    report = self.report()
+    lines = [
+      "## LLM Code Review",
+      "",
+      f"Finished in {report['wall_seconds']:.1f}s.",
+      "",
+      "| Stage | Time (s) | Calls |",
+      "|-------|---------:|------:|",
+    ]
+    for name, stage in sorted(report["stages"].items(), key=lambda item: -item[1]["seconds"]):
+      lines.append(f"| {name} | {stage['seconds']:.2f} | {stage['calls']} |")
+
+    if report["llm"]:
+      lines += [
+        "",
+        "| Model | Requests | Failures | p50 (ms) | p95 (ms) | Input tokens | Output tokens | Cached tokens "
+        "| Parse failures |",
+        "|-------|---------:|---------:|---------:|---------:|-------------:|--------------:|--------------:"
+        "|---------------:|",
+      ]
+      for key, usage in report["llm"].items():
+        lines.append(
+          f"| {key} | {usage['requests']} | {usage['failures']} | {usage['p50_ms']:.0f} | {usage['p95_ms']:.0f} "
+          f"| {usage['input_tokens']} | {usage['output_tokens']} | {usage['cached_tokens']} "
+          f"| {usage['parse_failures']} ({usage['parse_failure_rate']:.1%}) |"
+        )
+
+    counters = dict(report["counters"])
+    for provider, stats in report.get("rate_limits", {}).items():
+      counters[f"{provider} retries"] = stats.get("retries", 0)
+    for name, value in report.get("review_cache", {}).items():
+      counters[f"review cache {name}"] = value
+    if counters:
+      lines += ["", "| Counter | Value |", "|---------|------:|"]
+      lines += [f"| {name} | {value} |" for name, value in sorted(counters.items())]
+
+    skipped = report.get("skipped_hunks")
+    if skipped:
+      lines += [
+        "", f"Skipped over the review budget (top {len(skipped)} by score):", "",
+        "| File | Lines | Score | Budget |", "|------|-------|------:|--------|",
+      ]
+      lines += [f"| {s['path']} | {s['lines']} | {s['score']} | {s['reason']} |" for s in skipped]
+
+    with open(path, "a") as f:
+      f.write("\n".join(lines) + "\n")
+
+  def _usage(self, provider: str, model: str) -> Dict[str, Any]:
+    key = f"{provider}/{model}"
+    if key not in self._llm:
+      self._llm[key] = {
+        "latencies": [], "failures": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0,
+        "responses": 0, "parse_repaired": 0, "parse_failures": 0,
+      }
+    return self._llm[key]
+
+  def _enter(self) -> List[float]:
+    stack = getattr(self._local, "stack", None)
+    if stack is None:
+      stack = self._local.stack = []
+    frame = [time.perf_counter(), 0.0]
+    stack.append(frame)
+    return frame
+
+  def _exit(self, name: str, frame: List[float]) -> None:
+    elapsed = time.perf_counter() - frame[0]
+    stack = self._local.stack
+    stack.pop()
+    if stack:
+      stack[-1][1] += elapsed
+    with self._lock:
+      stage = self._stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+      stage["seconds"] += elapsed - frame[1]
+      stage["calls"] += 1
+
+
+# Metrics of the current run, shared by every service
+metrics = RunMetrics()
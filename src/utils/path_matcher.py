@@ -0,0 +1,165 @@
+import os
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+
+class PathMatcher:
+  """
+  Matches repository paths against gitignore-style patterns.
+
+  Supported syntax:
+    - `*`, `?` and `[...]` match within one path segment, `**` across segments
+    - a pattern without a slash matches at any depth (`*.md`, `build`)
+    - a pattern containing a slash is anchored to the repository root
+    - a trailing slash only matches directories (`docs/`)
+    - matching a directory also matches everything below it
+    - `!pattern` re-includes paths matched by an earlier pattern
+    - blank lines and `#` comments are ignored
+
+  As in gitignore, the last matching pattern decides. Consecutive patterns
+  of the same polarity are compiled into a single regular expression, so a
+  path is usually checked with one `re.match` regardless of how many
+  patterns there are.
+  """
+
+  def __init__(self, patterns: Iterable[str]):
+    self._groups: List[Tuple[bool, Pattern[str]]] = []
+    negated_run: Optional[bool] = None
+    sources: List[str] = []
+    for raw in patterns:
+      parsed = self._parse(raw)
+      if parsed is None:
+        continue
+      negated, source = parsed
+      if negated != negated_run and sources:
+        self._groups.append((negated_run, re.compile("|".join(sources))))
+        sources = []
+      negated_run = negated
+      sources.append(source)
+    if sources:
+      self._groups.append((negated_run, re.compile("|".join(sources))))
+    # The last matching pattern decides, so check groups from the end
+    self._groups.reverse()
+
+  def __bool__(self) -> bool:
+    return bool(self._groups)
+
+  def matches(self, path: str) -> bool:
+    """Returns True if `path` (relative to the repository root) is matched."""
+    path = path.lstrip("/")
+    for negated, regex in self._groups:
+      if regex.match(path):
+        return not negated
+    return False
+
+  @classmethod
+  def from_comma_separated(cls, value: Optional[str]) -> 'PathMatcher':
+    """Builds a matcher from a comma-separated input such as INPUT_EXCLUDE."""
+    return cls(part.strip() for part in (value or "").split(","))
+
+  @classmethod
+  def from_gitattributes(cls, path: str, attribute: str = "linguist-generated") -> 'PathMatcher':
+    """
+    Builds a matcher of the paths that have `attribute` set in a .gitattributes file.
+
+    `attribute`, `attribute=true` and `attribute=1` set it; `-attribute`,
+    `!attribute` and `attribute=false` unset it for paths matched earlier.
+    A missing file yields an empty matcher.
+    """
+    if not os.path.isfile(path):
+      return cls([])
+
+    patterns = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+      for line in f:
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+          continue
+        state = cls._attribute_state(fields[1:], attribute)
+        if state is not None:
+          # Negation is not valid in .gitattributes, so "!" can mean "unset" here
+          patterns.append(fields[0] if state else f"!{fields[0]}")
+    return cls(patterns)
+
+  @staticmethod
+  def _attribute_state(attributes: List[str], attribute: str) -> Optional[bool]:
+    state = None
+    for item in attributes:
+      if item == attribute:
+        state = True
+      elif item in (f"-{attribute}", f"!{attribute}"):
+        state = False
+      elif item.startswith(f"{attribute}="):
+        state = item.split("=", 1)[1].lower() not in ("false", "0")
+    return state
+
+  @classmethod
+  def _parse(cls, raw: str) -> Optional[Tuple[bool, str]]:
+    """Translates one pattern into (negated, regex source), or None to skip it."""
+    pattern = raw.strip()
+    if not pattern or pattern.startswith("#"):
+      return None
+
+    negated = pattern.startswith("!")
+    if negated:
+      pattern = pattern[1:]
+    elif pattern.startswith("\\"):
+      pattern = pattern[1:]
+
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+      return None
+
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    if pattern.startswith("**/"):
+      anchored = False
+      pattern = pattern[3:]
+
+    prefix = "" if anchored else "(?:.*/)?"
+    # Whatever the pattern matched may be a directory holding the path
+    suffix = "/.*" if directory_only else "(?:/.*)?"
+    return negated, f"(?:{prefix}{cls._translate(pattern)}{suffix})$"
+
+  @staticmethod
+  def _translate(pattern: str) -> str:
+    """Translates glob syntax to a regex fragment where `*` does not cross `/`."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+      char = pattern[i]
+      if char == "*":
+        if pattern.startswith("**", i):
+          at_segment_start = i == 0 or pattern[i - 1] == "/"
+          if at_segment_start and pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+          if at_segment_start and i + 2 == n:
+            out.append(".*")
+            i += 2
+            continue
+        out.append("[^/]*")
+        while i < n and pattern[i] == "*":
+          i += 1
+        continue
+      if char == "?":
+        out.append("[^/]")
+      elif char == "[":
+        end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "^") else i + 1)
+        if end == -1:
+          out.append(re.escape(char))
+        else:
+          body = pattern[i + 1:end]
+          if body[:1] in ("!", "^"):
+            body = "^" + body[1:]
+          out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+          i = end
+      elif char == "\\" and i + 1 < n:
+        i += 1
+        out.append(re.escape(pattern[i]))
+      else:
+        out.append(re.escape(char))
+      i += 1
+    return "".join(out)
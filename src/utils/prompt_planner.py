@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+from ..core.config import Config
+from ..core.models import PRDetails, FileInfo, DiffHunk, ReviewPrompt
+from ..services.ai_service import AIService
+from .context_store import PRContextStore
+
+# Approximate prompt tokens spent on the per-hunk header of a batched request
+HUNK_HEADER_TOKENS = 60
+
+
+@dataclass
+class PromptRequest:
+  entries: List[Tuple[FileInfo, DiffHunk]]
+  prompt: ReviewPrompt
+  estimated_tokens: int
+  # The job hunk each entry comes from: the entry itself, or the hunk it is a piece of
+  origins: List[DiffHunk] = field(default_factory=list)
+
+
+class PromptPlanner:
+  """
+  Turns review jobs into sized LLM requests.
+
+  Hunks whose prompt would exceed `max_prompt_tokens` are split at line
+  boundaries, undersized neighbours in the same file are merged into one
+  request and, when a batch budget is set, consecutive hunks from any file
+  are packed together. With a context store, each hunk's prompt section also
+  shows its enclosing function or class. Every request carries the
+  provider's token estimate for its rendered prompt.
+  """
+
+  def __init__(
+    self,
+    ai_service: AIService,
+    max_prompt_tokens: int = None,
+    min_hunk_tokens: int = None,
+    batch_token_budget: int = None,
+  ):
+    self.ai_service = ai_service
+    self.max_prompt_tokens = max_prompt_tokens or Config.MAX_PROMPT_TOKENS
+    self.min_hunk_tokens = Config.MIN_HUNK_TOKENS if min_hunk_tokens is None else min_hunk_tokens
+    self.batch_token_budget = Config.BATCH_TOKEN_BUDGET if batch_token_budget is None else batch_token_budget
+    # Every prompt of a PR shares its prefix, so it is measured once
+    self._prefix_tokens: Tuple[str, int] = ("", 0)
+
+  def plan(
+    self,
+    jobs: Iterable[Tuple[FileInfo, DiffHunk]],
+    pr_details: PRDetails,
+    context: Optional[PRContextStore] = None,
+  ) -> Iterator[PromptRequest]:
+    """Yields requests covering every job, in job order."""
+    group, scopes, origins, group_tokens = [], [], [], 0
+
+    for file_info, hunk in jobs:
+      scope = context.enclosing_scope(file_info.path, hunk) if context is not None else None
+      scope_tokens = self.ai_service.count_tokens(scope) if scope else 0
+      for piece in self._split_oversized(file_info, hunk, pr_details, scope):
+        tokens = self._count_hunk_tokens(piece) + scope_tokens
+        if group and not self._can_merge(group, group_tokens, file_info, tokens):
+          yield self._build_request(group, scopes, origins, pr_details)
+          group, scopes, origins, group_tokens = [], [], [], 0
+        group.append((file_info, piece))
+        scopes.append(scope)
+        origins.append(hunk)
+        group_tokens += tokens
+
+    if group:
+      yield self._build_request(group, scopes, origins, pr_details)
+
+  def _can_merge(
+    self, group: List[Tuple[FileInfo, DiffHunk]], group_tokens: int, file_info: FileInfo, tokens: int
+  ) -> bool:
+    """Decides whether a hunk joins the pending group or starts a new request."""
+    merged_tokens = group_tokens + tokens + HUNK_HEADER_TOKENS * (len(group) + 1)
+    if merged_tokens > self.max_prompt_tokens:
+      return False
+    if self.batch_token_budget > 0:
+      return merged_tokens <= self.batch_token_budget
+
+    # Without batching, only merge small hunks of the same file until the group is large enough
+    return (
+      group[-1][0].path == file_info.path
+      and tokens < self.min_hunk_tokens
+      and group_tokens < self.min_hunk_tokens
+    )
+
+  def _build_request(
+    self,
+    group: List[Tuple[FileInfo, DiffHunk]],
+    scopes: List[Optional[str]],
+    origins: List[DiffHunk],
+    pr_details: PRDetails,
+  ) -> PromptRequest:
+    """Renders the prompt for a group of hunks and estimates its size."""
+    if len(group) == 1:
+      prompt = self.ai_service.create_prompt(group[0][0], group[0][1], pr_details, scopes[0])
+    else:
+      prompt = self.ai_service.create_batch_prompt(group, pr_details, scopes)
+    return PromptRequest(group, prompt, self._count_prompt_tokens(prompt), origins)
+
+  def _count_prompt_tokens(self, prompt: ReviewPrompt) -> int:
+    prefix, prefix_tokens = self._prefix_tokens
+    if prefix != prompt.prefix:
+      prefix, prefix_tokens = prompt.prefix, self.ai_service.count_tokens(prompt.prefix)
+      self._prefix_tokens = (prefix, prefix_tokens)
+    return prefix_tokens + self.ai_service.count_tokens(prompt.suffix)
+
+  def _count_hunk_tokens(self, hunk: DiffHunk) -> int:
+    return self.ai_service.count_tokens(str(hunk))
+
+  def _split_oversized(
+    self, file_info: FileInfo, hunk: DiffHunk, pr_details: PRDetails, scope: Optional[str] = None
+  ) -> List[DiffHunk]:
+    """Splits a hunk at line boundaries so that each piece fits the prompt budget."""
+    hunk_tokens = self._count_hunk_tokens(hunk)
+    scope_tokens = self.ai_service.count_tokens(scope) if scope else 0
+    if hunk_tokens + scope_tokens + HUNK_HEADER_TOKENS <= self.max_prompt_tokens // 2:
+      return [hunk]
+
+    prompt_tokens = self._count_prompt_tokens(self.ai_service.create_prompt(file_info, hunk, pr_details, scope))
+    if prompt_tokens <= self.max_prompt_tokens:
+      return [hunk]
+
+    overhead = prompt_tokens - hunk_tokens
+    piece_budget = max(self.max_prompt_tokens - overhead, HUNK_HEADER_TOKENS)
+    return self._split_hunk(hunk, piece_budget)
+
+  def _split_hunk(self, hunk: DiffHunk, piece_budget: int) -> List[DiffHunk]:
+    """Cuts a hunk into consecutive pieces of at most `piece_budget` tokens."""
+    pieces = []
+    piece_start, piece_tokens = 0, 0
+
+    for index, (source_line, target_line, raw) in enumerate(hunk.iter_numbered()):
+      # Measure the line as NumberedHunk renders it, line numbers included
+      tokens = self.ai_service.count_tokens(f"{source_line or 0:4d} {target_line or 0:4d} {raw}")
+      if index > piece_start and piece_tokens + tokens > piece_budget:
+        pieces.append(hunk.slice(piece_start, index))
+        piece_start, piece_tokens = index, 0
+      piece_tokens += tokens
+
+    if piece_start < len(hunk):
+      pieces.append(hunk.slice(piece_start, len(hunk)))
+    return pieces
@@ -0,0 +1,211 @@
+import queue
+import threading
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional
+from ..core.config import Config
+from ..core.models import PRDetails, DiffFile
+from ..services.diff_source import DiffSource, GitHubDiffSource
+from ..services.github_service import GitHubService
+from .code_analyzer import CodeAnalyzer
+from .context_store import PRContextStore
+from .diff_parser import DiffParser
+from .metrics import metrics
+
+# Marks the end of a stage's output on its queue
+_END = object()
+
+# Seconds a blocked producer waits before re-checking whether the run was aborted
+_PUT_TIMEOUT = 0.5
+
+
+class ReviewPipeline:
+  """
+  Runs a PR review as overlapping stages connected by bounded queues:
+
+  1. fetch (from the diff source) + parse + filter (background thread) -> files queue
+  2. plan + LLM review (CodeAnalyzer worker pool) -> comments queue
+  3. post comments in batches (background thread)
+
+  Each stage starts on the first item of the previous one, so wall-clock
+  time approaches that of the slowest stage. Comments are posted as soon
+  as a batch is ready, and a failure in a later stage only loses the work
+  that had not been posted yet.
+
+  With a context store, the fetch stage starts loading each file's head
+  content as soon as the diff names it, ahead of prompt rendering.
+
+  When a `reviewed_sha` is given, the last review posted records it with a
+  hidden marker, but only if every stage completed, every batch was posted
+  and the review budget skipped nothing: the next incremental run must not
+  skip hunks whose comments never reached the PR.
+  """
+
+  def __init__(
+    self,
+    github_service: GitHubService,
+    diff_parser: DiffParser,
+    code_analyzer: CodeAnalyzer,
+    file_filter: Callable[[Iterable[DiffFile]], Iterable[DiffFile]],
+    queue_size: int = None,
+    post_batch_size: int = None,
+    diff_source: Optional[DiffSource] = None,
+  ):
+    self.github_service = github_service
+    self.diff_source = diff_source or GitHubDiffSource(github_service)
+    self.diff_parser = diff_parser
+    self.code_analyzer = code_analyzer
+    self.file_filter = file_filter
+    self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+    self.post_batch_size = Config.REVIEW_POST_BATCH_SIZE if post_batch_size is None else post_batch_size
+
+  def run(
+    self,
+    pr_details: PRDetails,
+    file_filter: Optional[Callable[[Iterable[DiffFile]], Iterable[DiffFile]]] = None,
+    reviewed_sha: Optional[str] = None,
+    context_store: Optional[PRContextStore] = None,
+  ) -> int:
+    """
+    Reviews the pull request and posts the resulting comments.
+
+    Args:
+      pr_details: Pull request to review
+      file_filter: Overrides the filter applied to the parsed diff for this run
+      reviewed_sha: Commit to record as reviewed once the whole run succeeded
+      context_store: Source of the enclosing scope shown around each hunk
+
+    Returns:
+      int: Number of comments successfully posted
+    """
+    aborted = threading.Event()
+    failed = threading.Event()
+    files = queue.Queue(maxsize=self.queue_size)
+    comments = queue.Queue(maxsize=self.queue_size)
+    posted = []
+    failed_before = self.code_analyzer.failed_requests
+    skipped_before = self.code_analyzer.skipped_hunks
+
+    fetcher = threading.Thread(
+      target=self._fetch_stage, args=(pr_details, file_filter or self.file_filter, files, aborted, failed, context_store),
+      name="review-fetch", daemon=True
+    )
+    poster = threading.Thread(
+      target=self._post_stage, args=(pr_details, comments, posted, failed, reviewed_sha),
+      name="review-post", daemon=True
+    )
+    fetcher.start()
+    poster.start()
+
+    try:
+      for request_comments in self.code_analyzer.iter_comments(self._drain(files), pr_details, context_store):
+        if request_comments:
+          comments.put(request_comments)
+    except Exception as e:
+      failed.set()
+      print(f"Review stage failed, posting comments reviewed so far: {e}")
+    finally:
+      # Hunks without an answer or left out by the budget must be reviewed by a later run
+      if self.code_analyzer.failed_requests != failed_before or self.code_analyzer.skipped_hunks != skipped_before:
+        failed.set()
+      aborted.set()
+      comments.put(_END)
+      poster.join()
+
+    return sum(posted)
+
+  def _fetch_stage(
+    self,
+    pr_details: PRDetails,
+    file_filter: Callable[[Iterable[DiffFile]], Iterable[DiffFile]],
+    files: queue.Queue,
+    aborted: threading.Event,
+    failed: threading.Event,
+    context_store: Optional[PRContextStore] = None,
+  ) -> None:
+    """Streams, parses and filters the diff, feeding files to the review stage."""
+    try:
+      diff_lines = self.diff_source.iter_pr_lines(pr_details)
+      for file_data in file_filter(self.diff_parser.iter_files(diff_lines)):
+        if context_store is not None and file_data.path and file_data.path != "/dev/null":
+          context_store.prefetch(file_data.path)
+        if not self._put(files, file_data, aborted):
+          failed.set()
+          return
+    except Exception as e:
+      failed.set()
+      print(f"Fetching the diff failed, reviewing the files received so far: {e}")
+    finally:
+      self._put(files, _END, aborted)
+
+  def _post_stage(
+    self,
+    pr_details: PRDetails,
+    comments: queue.Queue,
+    posted: List[int],
+    failed: threading.Event,
+    reviewed_sha: Optional[str],
+  ) -> None:
+    """Collects comments and posts them as a review every `post_batch_size` comments."""
+    batch = []
+    while True:
+      item = comments.get()
+      if item is _END:
+        break
+      batch.extend(item)
+      if self.post_batch_size and len(batch) >= self.post_batch_size:
+        posted.append(self._post(pr_details, batch, failed))
+        batch = []
+
+    # The final review carries the reviewed marker; without comments, the previous marker is moved
+    reviewed_sha = reviewed_sha if not failed.is_set() else None
+    if batch:
+      posted.append(self._post(pr_details, batch, failed, reviewed_sha))
+    elif reviewed_sha:
+      self._record_reviewed(pr_details, reviewed_sha)
+
+  def _post(
+    self,
+    pr_details: PRDetails,
+    batch: List[Dict[str, Any]],
+    failed: threading.Event,
+    reviewed_sha: Optional[str] = None,
+  ) -> int:
+    """
+    Posts one batch of comments; a failed batch does not stop the others,
+    but sets `failed` so that the run is not recorded as reviewed.
+    """
+    try:
+      self.github_service.create_review_comment(pr_details, batch, reviewed_sha)
+      print(f"Posted {len(batch)} review comments")
+      metrics.increment("comments_posted", len(batch))
+      return len(batch)
+    except Exception as e:
+      failed.set()
+      print(f"Failed to post {len(batch)} review comments: {e}")
+      metrics.increment("comments_failed", len(batch))
+      return 0
+
+  def _record_reviewed(self, pr_details: PRDetails, reviewed_sha: str) -> None:
+    try:
+      self.github_service.record_reviewed_sha(pr_details, reviewed_sha)
+    except Exception as e:
+      print(f"Failed to record the reviewed commit: {e}")
+
+  @staticmethod
+  def _drain(files: queue.Queue) -> Iterator[DiffFile]:
+    """Iterates over the files queue until the fetch stage signals the end."""
+    while True:
+      item = files.get()
+      if item is _END:
+        return
+      yield item
+
+  @staticmethod
+  def _put(target: queue.Queue, item: Any, aborted: threading.Event) -> bool:
+    """Puts an item on a bounded queue, giving up if the run was aborted."""
+    while not aborted.is_set():
+      try:
+        target.put(item, timeout=_PUT_TIMEOUT)
+        return True
+      except queue.Full:
+        continue
+    return False
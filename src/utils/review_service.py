@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import hmac
+import json
+import queue
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+from ..core.config import Config
+from .code_analyzer import CodeAnalyzer
+from .fair_scheduler import FairScheduler
+
+if TYPE_CHECKING:
+  from ..main import PRReviewApplication
+
+# A review job: owner, repository and pull request number
+Job = Tuple[str, str, int]
+
+JOB_PATTERN = re.compile(r"^([\w.-]+)/([\w.-]+)#(\d+)$")
+
+# Webhook events that start a review, with the actions that do
+REVIEW_EVENTS = {
+  "pull_request": {"opened", "reopened", "synchronize", "ready_for_review"},
+  "issue_comment": {"created"},
+}
+
+
+class ReviewService:
+  """
+  Reviews many pull requests in one long-running process.
+
+  Every job shares the application's provider clients, rate limiters,
+  review cache and GitHub client. `max_jobs` pull requests are reviewed at
+  once, and their LLM requests draw from a single FairScheduler of
+  `max_concurrency` slots, granted to the jobs in turn: a huge PR gets one
+  request in per turn like every other PR and cannot starve small ones.
+
+  A job queued again before it started is dropped. One queued while it
+  runs only marks it for a rerun: a pull request is never reviewed by two
+  workers at once, and is reviewed again once the running review is done,
+  incrementally when enabled.
+  """
+
+  def __init__(self, app: 'PRReviewApplication', max_jobs: int = None, max_concurrency: int = None):
+    self.app = app
+    self.max_jobs = max_jobs or Config.SERVICE_MAX_JOBS
+    self.scheduler = FairScheduler(max_concurrency or Config.MAX_CONCURRENCY)
+    self.completed = 0
+    self.failed = 0
+    self._jobs: queue.Queue = queue.Queue()
+    self._queued: Set[Job] = set()
+    self._running: Set[Job] = set()
+    self._rerun: Set[Job] = set()
+    self._lock = threading.Lock()
+    self._workers: List[threading.Thread] = []
+
+  def start(self) -> None:
+    """Starts the job workers."""
+    for index in range(self.max_jobs):
+      worker = threading.Thread(target=self._work, name=f"review-job-{index}", daemon=True)
+      worker.start()
+      self._workers.append(worker)
+
+  def submit(self, job: Job) -> bool:
+    """Queues a review; False if the same pull request is already waiting."""
+    with self._lock:
+      if job in self._queued or job in self._rerun:
+        return False
+      if job in self._running:
+        # Requeued by its worker once the running review is done
+        self._rerun.add(job)
+        return True
+      self._queued.add(job)
+    self._jobs.put(job)
+    return True
+
+  def join(self) -> None:
+    """Blocks until every queued job has been reviewed."""
+    self._jobs.join()
+
+  def stop(self) -> None:
+    """Lets the workers finish the queued jobs, then stops them."""
+    for _ in self._workers:
+      self._jobs.put(None)
+    for worker in self._workers:
+      worker.join()
+    self._workers = []
+
+  def _work(self) -> None:
+    while True:
+      job = self._jobs.get()
+      try:
+        if job is None:
+          return
+        with self._lock:
+          self._queued.discard(job)
+          self._running.add(job)
+        try:
+          self._review(job)
+        finally:
+          with self._lock:
+            self._running.discard(job)
+            rerun = job in self._rerun
+            if rerun:
+              self._rerun.discard(job)
+              self._queued.add(job)
+          if rerun:
+            # Before task_done, so join() keeps waiting for the rerun
+            self._jobs.put(job)
+      finally:
+        self._jobs.task_done()
+
+  def _review(self, job: Job) -> None:
+    """Reviews one pull request on its own pipeline and scheduler lane."""
+    owner, repo, pull_number = job
+    name = f"{owner}/{repo}#{pull_number}"
+    try:
+      pr_details = self.app.github_service.get_pull_request(owner, repo, pull_number)
+      code_analyzer = CodeAnalyzer(self.app.ai_service, self.scheduler.slots, self.scheduler.lane(name))
+      self.app.review_pull_request(pr_details, self.app.create_pipeline(code_analyzer))
+    except Exception as e:
+      print(f"Review of {name} failed: {e}")
+      with self._lock:
+        self.failed += 1
+      return
+    with self._lock:
+      self.completed += 1
+
+
+def parse_job(text: str) -> Optional[Job]:
+  """
+  Parses a job given as `owner/repo#number` or as a JSON event payload.
+
+  Returns:
+    The job, or None if the text names no pull request
+  """
+  text = text.strip()
+  match = JOB_PATTERN.match(text)
+  if match:
+    return match.group(1), match.group(2), int(match.group(3))
+  if text.startswith("{"):
+    try:
+      return job_from_event(json.loads(text))
+    except ValueError:
+      return None
+  return None
+
+
+def job_from_event(event_data: Dict[str, Any]) -> Optional[Job]:
+  """The pull request a `pull_request` or `issue_comment` payload refers to, if any."""
+  try:
+    owner, repo = event_data["repository"]["full_name"].split("/")
+    if "issue" in event_data:
+      if "pull_request" not in event_data["issue"]:
+        return None
+      return owner, repo, int(event_data["issue"]["number"])
+    return owner, repo, int(event_data["number"])
+  except (KeyError, TypeError, ValueError):
+    return None
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+  """
+  Queues a review for every pull request event delivered by a GitHub webhook.
+
+  Every delivery must be signed with `secret`: each review spends LLM
+  tokens and posts with the GitHub token, so unsigned requests are refused.
+  """
+
+  service: ReviewService
+  secret: str = ""
+
+  def log_message(self, format: str, *args: Any) -> None:
+    pass
+
+  def do_POST(self) -> None:
+    body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+    if not self.secret or not self._valid_signature(body):
+      self._respond(401, "invalid signature")
+      return
+
+    event = self.headers.get("X-GitHub-Event") or ""
+    try:
+      payload = json.loads(body or b"null")
+    except ValueError:
+      self._respond(400, "invalid JSON")
+      return
+    if event not in REVIEW_EVENTS or not isinstance(payload, dict) or payload.get("action") not in REVIEW_EVENTS[event]:
+      self._respond(200, "ignored")
+      return
+
+    job = job_from_event(payload)
+    if job is None:
+      self._respond(200, "ignored")
+      return
+    queued = self.service.submit(job)
+    self._respond(202, "queued" if queued else "already queued")
+
+  def _valid_signature(self, body: bytes) -> bool:
+    expected = "sha256=" + hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, self.headers.get("X-Hub-Signature-256") or "")
+
+  def _respond(self, status: int, message: str) -> None:
+    payload = message.encode()
+    self.send_response(status)
+    self.send_header("Content-Type", "text/plain")
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+
+def serve(app: 'PRReviewApplication', argv: Optional[List[str]] = None) -> None:
+  """
+  Runs the service mode of `python -m src.main serve`.
+
+  Jobs given on the command line are reviewed and the service exits. Without
+  any, jobs are read from stdin, one per line, until it closes. With
+  `--port`, GitHub webhook deliveries signed with WEBHOOK_SECRET are
+  accepted until interrupted; the listener does not start without it.
+  """
+  parser = argparse.ArgumentParser(prog="python -m src.main serve", description="Review many pull requests")
+  parser.add_argument("jobs", nargs="*", metavar="OWNER/REPO#NUMBER", help="Pull requests to review")
+  parser.add_argument("--port", type=int, help="Accept GitHub webhook deliveries on this port")
+  parser.add_argument("--host", default="127.0.0.1",
+                      help="Address the webhook receiver binds to, e.g. 0.0.0.0 in a container")
+  args = parser.parse_args(argv)
+  if args.port is not None and not Config.WEBHOOK_SECRET:
+    parser.error("--port requires WEBHOOK_SECRET: unsigned deliveries would trigger reviews")
+
+  service = ReviewService(app)
+  service.start()
+  server = None
+  try:
+    for text in args.jobs:
+      job = parse_job(text)
+      if job is None:
+        print(f"Ignoring job {text!r}: expected OWNER/REPO#NUMBER")
+      else:
+        service.submit(job)
+
+    if args.port is not None:
+      handler = type("ServiceWebhookHandler", (WebhookHandler,), {
+        "service": service, "secret": Config.WEBHOOK_SECRET,
+      })
+      server = ThreadingHTTPServer((args.host, args.port), handler)
+      print(f"Accepting webhooks on {args.host}:{server.server_address[1]}")
+      server.serve_forever()
+    elif not args.jobs:
+      for line in sys.stdin:
+        if not line.strip():
+          continue
+        job = parse_job(line)
+        if job is None:
+          print(f"Ignoring job {line.strip()!r}: expected OWNER/REPO#NUMBER or an event payload")
+        else:
+          service.submit(job)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    if server is not None:
+      server.server_close()
+    service.join()
+    service.stop()
+    print(f"Service finished: {service.completed} reviews completed, {service.failed} failed")
+    app.close()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Config reads the environment at import time and requires a GitHub token
+os.environ.setdefault("GITHUB_TOKEN", "test-token")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,130 @@
+import re
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from src.core.config import Config
+from src.core.models import FileInfo, PRDetails
+from src.services.llms.prompts import build_prefix, build_review_prompt
+from src.utils.code_analyzer import CodeAnalyzer
+from src.utils.diff_parser import DiffParser
+
+HUNK_SECTION = re.compile(r'^### Hunk (\d+)\nFile: (.*)\n.*\n- For "right" side: (\d+)', re.MULTILINE)
+PR_DETAILS = PRDetails("owner", "repo", 1, "Title", "Description")
+
+
+class StubAIService:
+  """Answers every hunk of a prompt with one comment on its first new line."""
+
+  def __init__(self):
+    self.prompts = []
+
+  def count_tokens(self, text):
+    return len(text) // 4
+
+  def create_prompt(self, file, hunk, pr_details, scope=None):
+    return build_review_prompt([(file, hunk)], pr_details, [scope])
+
+  def create_batch_prompt(self, entries, pr_details, scopes=None):
+    return build_review_prompt(entries, pr_details, scopes)
+
+  def get_ai_response(self, prompt):
+    self.prompts.append(prompt)
+    return [
+      {"hunkId": int(hunk_id), "filepath": path, "lineNumber": int(line), "side": "right", "reviewComment": "Check this"}
+      for hunk_id, path, line in HUNK_SECTION.findall(prompt.suffix)
+    ]
+
+
+def file_diff(path: str, hunks: str) -> str:
+  return f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n{hunks}"
+
+
+def entries_of(diff: str):
+  return [(FileInfo(file_data.path), hunk) for file_data in DiffParser.parse_diff(diff) for hunk in file_data.hunks]
+
+
+@pytest.fixture
+def analyzer():
+  # The routing helpers only need the instance, not an AI service
+  return CodeAnalyzer.__new__(CodeAnalyzer)
+
+
+@pytest.fixture
+def entries():
+  return entries_of(
+    file_diff("a.py", "@@ -1,2 +1,2 @@\n-x = 1\n+x = 2\n y\n@@ -20,2 +20,2 @@\n-z = 1\n+z = 2\n w\n")
+    + file_diff("b.py", "@@ -40,2 +40,2 @@\n-u = 1\n+u = 2\n v\n")
+  )
+
+
+def review(**fields):
+  return {"lineNumber": 1, "side": "right", "reviewComment": "Check this", **fields}
+
+
+def test_route_by_hunk_id(analyzer, entries):
+  assert analyzer._route_response(entries, review(hunkId=3, filepath="b.py", lineNumber=40)) == 2
+  assert analyzer._route_response(entries, review(hunkId="2", lineNumber=20)) == 1
+
+
+def test_route_falls_back_to_path_and_line(analyzer, entries):
+  # A hunk id pointing at another file is ignored in favour of the path
+  assert analyzer._route_response(entries, review(hunkId=3, filepath="a.py", lineNumber=21)) == 1
+  assert analyzer._route_response(entries, review(hunkId=9, filepath="b.py", lineNumber=41)) == 2
+  assert analyzer._route_response(entries, review(filepath="b.py", lineNumber=1)) is None
+
+
+def test_route_by_line_alone_when_it_fits_one_hunk(analyzer, entries):
+  assert analyzer._route_response(entries, review(lineNumber=41)) == 2
+  assert analyzer._route_response(entries, review(lineNumber=99)) is None
+
+
+def test_route_by_line_alone_is_ambiguous_across_hunks(analyzer):
+  entries = entries_of(
+    file_diff("a.py", "@@ -1,2 +1,2 @@\n-x = 1\n+x = 2\n y\n")
+    + file_diff("b.py", "@@ -1,2 +1,2 @@\n-u = 1\n+u = 2\n v\n")
+  )
+  assert analyzer._route_response(entries, review(lineNumber=1)) is None
+  assert analyzer._route_response(entries, review(filepath="b.py", lineNumber=1)) == 1
+
+
+def test_submit_in_order_yields_results_in_request_order(analyzer):
+  futures = {name: Future() for name in ("first", "second")}
+  results = analyzer._submit_in_order(["first", "second"], futures.__getitem__, threading.BoundedSemaphore(2))
+  futures["second"].set_result(["second comment"])
+  futures["first"].set_result(["first comment"])
+  assert list(results) == [["first comment"], ["second comment"]]
+
+
+def test_submit_in_order_releases_the_slot_when_submit_fails(analyzer):
+  slots = threading.BoundedSemaphore(1)
+
+  def submit(request):
+    raise RuntimeError("event loop closed")
+
+  with pytest.raises(RuntimeError):
+    list(analyzer._submit_in_order(["request"], submit, slots))
+  assert slots.acquire(blocking=False)
+
+
+def test_dedup_applies_every_piece_of_a_split_representative(monkeypatch):
+  ai_service = StubAIService()
+  prefix_tokens = ai_service.count_tokens(build_prefix(PR_DETAILS))
+  monkeypatch.setattr(Config, "DEDUP_MODE", "fanout")
+  monkeypatch.setattr(Config, "MAX_PROMPT_TOKENS", prefix_tokens + 400)
+  monkeypatch.setattr(Config, "MIN_HUNK_TOKENS", 0)
+  monkeypatch.setattr(Config, "BATCH_TOKEN_BUDGET", 0)
+
+  body = "".join(f"-    value_{line} = compute(item_{line})\n" for line in range(30))
+  body += "".join(f"+    value_{line} = compute(item_{line}, cache=True)\n" for line in range(30))
+  diff = file_diff("f0.py", f"@@ -10,30 +10,30 @@\n{body}") + file_diff("f1.py", f"@@ -100,30 +100,30 @@\n{body}")
+
+  comments = CodeAnalyzer(ai_service, max_workers=1).analyze_code(DiffParser.parse_diff(diff), PR_DETAILS)
+
+  assert len(ai_service.prompts) > 1
+  assert all("f1.py" not in prompt.suffix for prompt in ai_service.prompts)
+  representative = [comment["line"] for comment in comments if comment["path"] == "f0.py"]
+  follower = [comment["line"] for comment in comments if comment["path"] == "f1.py"]
+  assert len(representative) == len(ai_service.prompts)
+  assert follower == [line + 90 for line in representative]
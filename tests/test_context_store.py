@@ -0,0 +1,150 @@
+import subprocess
+
+import pytest
+
+from src.core.models import DiffHunk, PRDetails
+from src.utils.context_store import PRContextStore
+
+SOURCE = """import os
+
+
+class Greeter:
+  def greet(self, name):
+    if name:
+      message = "hi " + name
+      return message
+    return None
+
+  def other(self):
+    pass
+"""
+GREET_SCOPE = (
+  "   5 |   def greet(self, name):\n"
+  "   6 |     if name:\n"
+  "     | ... lines 7-7 are shown in the diff ...\n"
+  "   8 |       return message\n"
+  "   9 |     return None"
+)
+
+
+def hunk(start, length=1):
+  return DiffHunk(start, length, start, length)
+
+
+class StubGitHubService:
+  def __init__(self, files):
+    self.files = files
+    self.downloads = []
+
+  def download_file(self, owner, repo, path, ref, out, max_bytes):
+    self.downloads.append((path, ref))
+    content = self.files.get(path)
+    if content is None or len(content) > max_bytes:
+      return False
+    out.write(content)
+    return True
+
+
+def git(repo, *args):
+  return subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+  """A checkout whose working tree is one commit ahead of the PR head."""
+  git(tmp_path, "init", "-q")
+  git(tmp_path, "config", "user.email", "dev@example.com")
+  git(tmp_path, "config", "user.name", "Dev")
+  (tmp_path / "pkg").mkdir()
+  (tmp_path / "pkg" / "greeter.py").write_text(SOURCE)
+  (tmp_path / "big.txt").write_text("x\n" * 100)
+  git(tmp_path, "add", ".")
+  git(tmp_path, "commit", "-q", "-m", "head")
+  head_sha = git(tmp_path, "rev-parse", "HEAD")
+  (tmp_path / "pkg" / "greeter.py").write_text("# rewritten after the PR head\n")
+  git(tmp_path, "commit", "-q", "-am", "later")
+  return tmp_path, head_sha
+
+
+def open_store(github_service, head_sha="head", workspace=None, **options):
+  pr_details = PRDetails("owner", "repo", 1, "Title", "Description", head_sha=head_sha)
+  return PRContextStore(github_service, pr_details, workspace=workspace, **options)
+
+
+def test_finds_the_enclosing_definition_and_elides_the_hunk():
+  store = open_store(StubGitHubService({"pkg/greeter.py": SOURCE.encode()}))
+  try:
+    assert store.enclosing_scope("pkg/greeter.py", hunk(7)) == GREET_SCOPE
+    assert store.enclosing_scope("pkg/greeter.py", hunk(1)) is None
+    assert store.enclosing_scope("pkg/greeter.py", hunk(100)) is None
+  finally:
+    store.close()
+
+
+def test_long_scopes_keep_their_first_line_and_a_window():
+  body = "".join(f"  x{n} = {n}\n" for n in range(2, 101))
+  store = open_store(StubGitHubService({"long.py": ("def long():\n" + body).encode()}), max_lines=5)
+  try:
+    assert store.enclosing_scope("long.py", hunk(50)) == (
+      "   1 | def long():\n"
+      "     | ...\n"
+      "  48 |   x48 = 48\n"
+      "  49 |   x49 = 49\n"
+      "     | ... lines 50-50 are shown in the diff ...\n"
+      "  51 |   x51 = 51\n"
+      "  52 |   x52 = 52"
+    )
+  finally:
+    store.close()
+
+
+def test_each_file_is_downloaded_once():
+  github_service = StubGitHubService({"pkg/greeter.py": SOURCE.encode(), "blob.bin": b"\0\1\2"})
+  store = open_store(github_service)
+  try:
+    store.prefetch("pkg/greeter.py")
+    assert store.enclosing_scope("pkg/greeter.py", hunk(7)) == GREET_SCOPE
+    assert store.enclosing_scope("pkg/greeter.py", hunk(8)) is not None
+    assert store.enclosing_scope("missing.py", hunk(1)) is None
+    assert store.enclosing_scope("blob.bin", hunk(1)) is None
+  finally:
+    store.close()
+  assert github_service.downloads == [("pkg/greeter.py", "head"), ("missing.py", "head"), ("blob.bin", "head")]
+
+
+def test_reads_the_working_tree_when_it_is_at_the_head(repo):
+  workspace, _ = repo
+  github_service = StubGitHubService({})
+  store = open_store(github_service, git(workspace, "rev-parse", "HEAD"), str(workspace))
+  try:
+    assert store._workspace == (str(workspace), False)
+    assert store.enclosing_scope("pkg/greeter.py", hunk(1)) is None
+    assert store._files["pkg/greeter.py"].result().line(1) == "# rewritten after the PR head"
+  finally:
+    store.close()
+  assert github_service.downloads == []
+
+
+def test_reads_the_head_from_the_object_store(repo):
+  workspace, head_sha = repo
+  github_service = StubGitHubService({})
+  store = open_store(github_service, head_sha, str(workspace), max_file_bytes=180)
+  try:
+    assert store._workspace == (str(workspace), True)
+    # Trees, missing paths and oversized blobs are skipped without losing track of the batch output
+    assert store.enclosing_scope("pkg", hunk(1)) is None
+    assert store.enclosing_scope("missing.py", hunk(1)) is None
+    assert store.enclosing_scope("big.txt", hunk(1)) is None
+    assert store.enclosing_scope("pkg/greeter.py", hunk(7)) == GREET_SCOPE
+  finally:
+    store.close()
+  assert github_service.downloads == []
+
+
+def test_unknown_head_commits_are_downloaded(repo):
+  workspace, _ = repo
+  store = open_store(StubGitHubService({}), "0" * 40, str(workspace))
+  try:
+    assert store._workspace is None
+  finally:
+    store.close()
@@ -0,0 +1,42 @@
+import pytest
+
+from src.utils.diff_parser import DiffParser
+
+DIFF = (
+  "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n"
+  "@@ -1,2 +1,3 @@\n x = 1\n-y = 2\n+y = 3\n+z = 4\n"
+  "@@ -10 +11 @@\n-old\n+new\n\\ No newline at end of file\n"
+  "diff --git a/b.py b/b.py\n--- a/b.py\n+++ b/b.py\n"
+  "@@ -5,1 +5,1 @@\n-diff --git a/fake b/fake\n+@@ -1 +1 @@\n"
+)
+
+
+def summary(files):
+  return [
+    (file_data.path, [(hunk.source_start, hunk.source_length, hunk.target_start, hunk.target_length, len(hunk)) for hunk in file_data.hunks])
+    for file_data in files
+  ]
+
+
+def test_parses_files_and_hunks():
+  assert summary(DiffParser.parse_diff(DIFF)) == [
+    ("a.py", [(1, 2, 1, 3, 4), (10, 1, 11, 1, 3)]),
+    ("b.py", [(5, 1, 5, 1, 2)]),
+  ]
+
+
+def test_streamed_lines_parse_like_the_whole_diff():
+  assert summary(DiffParser.iter_files(iter(DiffParser.split_lines(DIFF)))) == summary(DiffParser.parse_diff(DIFF))
+
+
+@pytest.mark.parametrize("separator", ["\r", "\x0c", "\x1c", "\x85", "\u2028"])
+def test_only_newlines_end_a_line(separator):
+  diff = DIFF.replace("+y = 3\n", f"+y = 3{separator}# same line\n")
+  assert summary(DiffParser.parse_diff(diff)) == summary(DiffParser.parse_diff(DIFF))
+  hunk = DiffParser.parse_diff(diff)[0].hunks[0]
+  assert f"y = 3{separator}# same line" in str(hunk)
+
+
+def test_split_lines_keeps_endings():
+  assert list(DiffParser.split_lines("a\r\nb c\nd")) == ["a\r\n", "b c\n", "d"]
+  assert list(DiffParser.split_lines("")) == []
@@ -0,0 +1,119 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from src.core.models import PRDetails
+from src.services import diff_source
+from src.services.diff_source import DiffSourceError, LocalGitDiffSource, PatchFileDiffSource
+from src.utils.diff_parser import DiffParser
+
+
+def git(repo, *args):
+  return subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+  """A clone holding a base commit and a head commit that edits, adds and renames files."""
+  git(tmp_path, "init", "-q")
+  git(tmp_path, "config", "user.email", "dev@example.com")
+  git(tmp_path, "config", "user.name", "Dev")
+  (tmp_path / "app.py").write_text("a = 1\nb = 2\n")
+  (tmp_path / "old_name.py").write_text("".join(f"line {n}\n" for n in range(20)))
+  git(tmp_path, "add", ".")
+  git(tmp_path, "commit", "-q", "-m", "base")
+  base_sha = git(tmp_path, "rev-parse", "HEAD")
+  (tmp_path / "app.py").write_bytes(b"a = 1\nb = '\r'\n")
+  (tmp_path / "new.py").write_text("print('hi')\n")
+  git(tmp_path, "mv", "old_name.py", "new_name.py")
+  with open(tmp_path / "new_name.py", "a") as f:
+    f.write("line 20\n")
+  git(tmp_path, "add", ".")
+  git(tmp_path, "commit", "-q", "-m", "head")
+  pr_details = PRDetails("owner", "repo", 1, "Title", "Description", head_sha=git(tmp_path, "rev-parse", "HEAD"),
+                         base_sha=base_sha)
+  return tmp_path, pr_details
+
+
+class StubDiffSource:
+  def __init__(self):
+    self.calls = []
+
+  def iter_pr_lines(self, pr_details):
+    self.calls.append("pr")
+    return iter(["fallback\n"])
+
+  def iter_compare_lines(self, pr_details, base_sha, head_sha):
+    self.calls.append(("compare", base_sha, head_sha))
+    return iter(["fallback\n"])
+
+
+def test_streams_the_pull_request_diff(repo):
+  workspace, pr_details = repo
+  lines = list(LocalGitDiffSource(str(workspace)).iter_pr_lines(pr_details))
+  assert all(line.endswith("\n") for line in lines)
+  # The lone "\r" stays inside its line
+  assert "+b = '\r'\n" in lines
+  files = {file.path: file for file in DiffParser.iter_files(lines)}
+  assert set(files) == {"app.py", "new.py", "new_name.py"}
+
+
+def test_diff_filter_and_context_are_passed_to_git(repo):
+  workspace, pr_details = repo
+  source = LocalGitDiffSource(str(workspace), context_lines=0, diff_filter="A")
+  lines = list(source.iter_pr_lines(pr_details))
+  assert "+++ b/new.py\n" in lines
+  assert not any(line.startswith("+++ b/app.py") for line in lines)
+
+
+def test_unknown_commits_fall_back_or_fail(repo):
+  workspace, pr_details = repo
+  fallback = StubDiffSource()
+  source = LocalGitDiffSource(str(workspace), fallback=fallback)
+  assert list(source.iter_compare_lines(pr_details, "0" * 40, pr_details.head_sha)) == ["fallback\n"]
+  assert fallback.calls == [("compare", "0" * 40, pr_details.head_sha)]
+
+  with pytest.raises(DiffSourceError, match="cannot be compared"):
+    LocalGitDiffSource(str(workspace)).iter_compare_lines(pr_details, "0" * 40, pr_details.head_sha)
+
+
+def test_git_errors_carry_its_message(repo):
+  workspace, pr_details = repo
+  with pytest.raises(DiffSourceError, match="diff-filter"):
+    list(LocalGitDiffSource(str(workspace), diff_filter="Z").iter_pr_lines(pr_details))
+
+
+def test_a_chatty_stderr_does_not_stall_the_diff(repo, monkeypatch):
+  workspace, pr_details = repo
+  popen = subprocess.Popen
+  # Far more warnings than a pipe buffers, written before any diff output
+  script = "import sys; sys.stderr.write('warning\\n' * 100000); sys.stderr.flush(); print('diff --git a/x b/x')"
+  monkeypatch.setattr(
+    diff_source.subprocess, "Popen", lambda command, **kwargs: popen([sys.executable, "-c", script], **kwargs)
+  )
+  lines = []
+  reader = threading.Thread(
+    target=lambda: lines.extend(LocalGitDiffSource(str(workspace)).iter_pr_lines(pr_details)), daemon=True
+  )
+  reader.start()
+  reader.join(10)
+  assert not reader.is_alive()
+  assert lines == ["diff --git a/x b/x\n"]
+
+
+def test_stopping_early_ends_git(repo):
+  workspace, pr_details = repo
+  lines = LocalGitDiffSource(str(workspace)).iter_pr_lines(pr_details)
+  assert next(lines).startswith("diff --git")
+  lines.close()
+
+
+def test_patch_files_are_read_line_by_line(tmp_path):
+  patch = tmp_path / "pr.diff"
+  patch.write_bytes(b"diff --git a/a.py b/a.py\n+x = '\r'\n+\xff\n")
+  source = PatchFileDiffSource(str(patch))
+  assert list(source.iter_pr_lines(None)) == ["diff --git a/a.py b/a.py\n", "+x = '\r'\n", "+�\n"]
+  with pytest.raises(DiffSourceError):
+    source.iter_compare_lines(None, "base", "head")
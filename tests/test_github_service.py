@@ -0,0 +1,99 @@
+import requests
+
+from src.core.models import PRDetails
+from src.services.github_service import GitHubService
+from src.utils.incremental import format_review_marker, parse_review_marker
+
+PR_DETAILS = PRDetails("owner", "repo", 7, "Title", "Description", head_sha="head", base_sha="base")
+
+
+class StubGitHubClient:
+  """Serves canned JSON and records every write."""
+
+  def __init__(self, reviews=(), login="review-bot"):
+    self.reviews = list(reviews)
+    # None answers /user like an installation token does
+    self.login = login
+    self.user_requests = 0
+    self.posted = []
+    self.put = []
+
+  def get_json(self, path, params=None):
+    assert path == "/user"
+    self.user_requests += 1
+    if self.login is None:
+      response = requests.Response()
+      response.status_code = 403
+      raise requests.HTTPError("Resource not accessible by integration", response=response)
+    return {"login": self.login}
+
+  def get_paginated(self, path, per_page=100):
+    assert path == "/repos/owner/repo/pulls/7/reviews"
+    return iter(self.reviews)
+
+  def post_json(self, path, payload):
+    self.posted.append((path, payload))
+    return {}
+
+  def put_json(self, path, payload):
+    self.put.append((path, payload))
+    return {}
+
+
+def test_reviews_are_pinned_to_the_reviewed_head_commit():
+  client = StubGitHubClient()
+  comment = {"body": "Check this", "path": "a.py", "line": 3, "side": "RIGHT"}
+  GitHubService(client).create_review_comment(PR_DETAILS, [comment])
+  [(path, review)] = client.posted
+  assert path == "/repos/owner/repo/pulls/7/reviews"
+  assert review == {"body": "AI generated review comments", "comments": [comment], "event": "COMMENT", "commit_id": "head"}
+
+
+def marked_review(login, sha, review_id):
+  return {"id": review_id, "user": {"login": login}, "body": f"Review\n\n{format_review_marker(sha)}"}
+
+
+def test_only_markers_of_the_reviewer_account_are_trusted():
+  client = StubGitHubClient([
+    marked_review("review-bot", "aaaaaaa", 1),
+    marked_review("pr-author", "bbbbbbb", 2),
+    {"id": 3, "user": {"login": "review-bot"}, "body": "No marker"},
+  ])
+  assert GitHubService(client).get_last_reviewed_sha(PR_DETAILS) == "aaaaaaa"
+  assert client.user_requests == 1
+
+
+def test_forged_markers_alone_mean_no_previous_review():
+  client = StubGitHubClient([marked_review("pr-author", "bbbbbbb", 2)])
+  assert GitHubService(client).get_last_reviewed_sha(PR_DETAILS) is None
+
+
+def test_installation_tokens_post_as_the_actions_bot():
+  client = StubGitHubClient([marked_review("github-actions[bot]", "ccccccc", 4)], login=None)
+  service = GitHubService(client)
+  assert service.get_reviewer_login() == "github-actions[bot]"
+  assert service.get_last_reviewed_sha(PR_DETAILS) == "ccccccc"
+
+
+def test_a_configured_login_skips_the_lookup():
+  client = StubGitHubClient([marked_review("my-app[bot]", "ddddddd", 5)])
+  assert GitHubService(client, reviewer_login="my-app[bot]").get_last_reviewed_sha(PR_DETAILS) == "ddddddd"
+  assert client.user_requests == 0
+
+
+def test_recording_moves_the_marker_of_the_own_review():
+  client = StubGitHubClient([marked_review("review-bot", "aaaaaaa", 1), marked_review("pr-author", "bbbbbbb", 2)])
+  GitHubService(client).record_reviewed_sha(PR_DETAILS, "eeeeeee")
+  assert client.posted == []
+  [(path, payload)] = client.put
+  assert path == "/repos/owner/repo/pulls/7/reviews/1"
+  assert payload == {"body": f"Review\n\n{format_review_marker('eeeeeee')}"}
+
+
+def test_recording_posts_a_marker_review_when_there_is_none_of_its_own():
+  client = StubGitHubClient([marked_review("pr-author", "bbbbbbb", 2)])
+  GitHubService(client).record_reviewed_sha(PR_DETAILS, "eeeeeee")
+  assert client.put == []
+  [(_, review)] = client.posted
+  assert review["comments"] == []
+  assert parse_review_marker(review["body"]) == "eeeeeee"
@@ -0,0 +1,131 @@
+import os
+import random
+import subprocess
+import sys
+
+from src.core.models import FileInfo
+from src.utils.diff_parser import DiffParser
+from src.utils.hunk_dedup import MERSENNE_PRIME, HunkDeduplicator
+
+# Tokens kept by normalization, so generated lines differ in their shingles
+STRUCTURE = ["if", "for", "while", "return", "not", "and", "or", "None", "(", ")", "[", "]", "+", "-", "*", "=", ":"]
+
+
+def rename_diff(index: int, target_start: int) -> str:
+  """A hunk renaming a call, with identifiers that differ per file."""
+  return (
+    f"diff --git a/f{index}.py b/f{index}.py\n--- a/f{index}.py\n+++ b/f{index}.py\n"
+    f"@@ -{target_start},4 +{target_start},4 @@ def handler():\n"
+    f" context_{index}\n"
+    f"-    old_name_{index}(a, b)\n"
+    f"-    y = old_call(c{index})\n"
+    f"+    new_name_{index}(a, b, timeout=3)\n"
+    f"+    y = new_call(c{index})\n"
+    f" context\n"
+  )
+
+
+def jobs_of(diff: str):
+  return [(FileInfo(file_data.path), hunk) for file_data in DiffParser.parse_diff(diff) for hunk in file_data.hunks]
+
+
+def comment(line: int, side: str = "RIGHT"):
+  return {"body": "Check this", "path": "f0.py", "line": line, "side": side}
+
+
+def test_cluster_groups_renamed_copies_of_a_change():
+  jobs = jobs_of("".join(rename_diff(index, 10 + 10 * index) for index in range(4)))
+  dedup = HunkDeduplicator("fanout")
+  representatives = list(dedup.cluster(jobs))
+  assert representatives == jobs[:1]
+  assert dedup.followers[id(jobs[0][1])] == jobs[1:]
+
+
+def test_cluster_keeps_hunks_of_another_shape():
+  other = (
+    "diff --git a/g.py b/g.py\n--- a/g.py\n+++ b/g.py\n@@ -1,2 +1,3 @@\n"
+    "-    old_name(a, b)\n+    new_name(a, b, timeout=3)\n+    y = new_call(c)\n x\n"
+  )
+  jobs = jobs_of(rename_diff(0, 10) + other)
+  assert list(HunkDeduplicator("fanout").cluster(jobs)) == jobs
+
+
+def test_small_hunks_are_only_grouped_when_identical():
+  diff = "".join(
+    f"diff --git a/s{index}.py b/s{index}.py\n--- a/s{index}.py\n+++ b/s{index}.py\n"
+    f"@@ -1,1 +1,1 @@\n-x = {value}\n+x = {value} + 1\n"
+    for index, value in enumerate(["a", "a", "b"])
+  )
+  jobs = jobs_of(diff)
+  dedup = HunkDeduplicator("fanout", min_changed_lines=4)
+  assert list(dedup.cluster(jobs)) == [jobs[0], jobs[2]]
+
+
+def test_fanout_remaps_comment_lines_to_followers():
+  jobs = jobs_of(rename_diff(0, 10) + rename_diff(1, 50))
+  dedup = HunkDeduplicator("fanout")
+  list(dedup.cluster(jobs))
+  expanded = dedup.expand(jobs[0][1], [comment(12), comment(11, "LEFT")])
+  assert [(c["path"], c["line"], c["side"]) for c in expanded] == [
+    ("f0.py", 12, "RIGHT"), ("f0.py", 11, "LEFT"), ("f1.py", 52, "RIGHT"), ("f1.py", 51, "LEFT"),
+  ]
+
+
+def test_collapse_lists_the_other_locations():
+  jobs = jobs_of(rename_diff(0, 10) + rename_diff(1, 50) + rename_diff(2, 90))
+  dedup = HunkDeduplicator("collapse")
+  list(dedup.cluster(jobs))
+  [collapsed] = dedup.expand(jobs[0][1], [comment(12)])
+  assert collapsed["line"] == 12
+  assert collapsed["body"].startswith("Check this")
+  assert "Also applies to 2 similar changes: `f1.py` line 52, `f2.py` line 92." in collapsed["body"]
+
+
+def test_expand_without_followers_returns_comments_unchanged():
+  jobs = jobs_of(rename_diff(0, 10))
+  dedup = HunkDeduplicator("fanout")
+  list(dedup.cluster(jobs))
+  comments = [comment(12)]
+  assert dedup.expand(jobs[0][1], comments) is comments
+
+
+def test_remap_uses_the_side_of_the_comment():
+  representative = jobs_of(rename_diff(0, 10))[0][1]
+  representative.source_start = 5
+  follower = jobs_of(rename_diff(1, 40))[0][1]
+  follower.source_start = 100
+  assert HunkDeduplicator._remap(comment(12), representative, follower) == 42
+  assert HunkDeduplicator._remap(comment(7, "LEFT"), representative, follower) == 102
+
+
+def random_changes(rng, count):
+  return ["+" + " ".join(rng.choice(STRUCTURE) for _ in range(8)) for _ in range(count)]
+
+
+def test_signatures_estimate_the_jaccard_similarity():
+  rng = random.Random(7)
+  errors = []
+  for kept in range(0, 41, 4):
+    first = random_changes(rng, 40)
+    second = first[:kept] + random_changes(rng, 40 - kept)
+    shingles_a, shingles_b = HunkDeduplicator._shingles(first), HunkDeduplicator._shingles(second)
+    exact = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+    signature_a, signature_b = HunkDeduplicator._signature(first), HunkDeduplicator._signature(second)
+    estimate = sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+    errors.append(estimate - exact)
+  # One estimate over 64 values has a standard error of at most 1/16
+  assert max(abs(error) for error in errors) < 0.2
+  # Unbiased: the errors cancel out rather than lean one way
+  assert abs(sum(errors) / len(errors)) < 0.05
+
+
+def test_signatures_are_stable_across_processes():
+  changes = ["+    new_name(a, b, timeout=3)", "+    y = new_call(c)", "-    y = old_call(c)", "-    old_name(a, b)"]
+  signature = HunkDeduplicator._signature(changes)
+  assert all(0 <= value < MERSENNE_PRIME for value in signature)
+  script = f"from src.utils.hunk_dedup import HunkDeduplicator; print(HunkDeduplicator._signature({changes!r}))"
+  output = subprocess.run(
+    [sys.executable, "-c", script], capture_output=True, text=True, check=True,
+    env={"PYTHONHASHSEED": "1234"}, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  ).stdout
+  assert output.strip() == str(signature)
@@ -0,0 +1,80 @@
+import pytest
+
+from src.core.models import DiffHunk, FileInfo, ReviewPrompt
+from src.utils import hunk_scheduler
+from src.utils.hunk_scheduler import HunkScheduler, HunkScorer, ReviewBudget
+from src.utils.path_matcher import PathMatcher
+from src.utils.prompt_planner import PromptRequest
+
+
+def added(lines, start=1):
+  return DiffHunk.from_lines(f"@@ -{start},0 +{start},{lines} @@\n", ["+x\n"] * lines)
+
+
+def request(path, hunk, tokens):
+  return PromptRequest([(FileInfo(path), hunk)], ReviewPrompt("prefix", "suffix"), tokens)
+
+
+def scheduler(**limits):
+  return HunkScheduler(ReviewBudget(**limits), HunkScorer())
+
+
+def test_scores_weigh_size_file_type_and_risk():
+  scorer = HunkScorer(PathMatcher(["billing/**"]))
+  hunk = added(10)
+  code = scorer.score(FileInfo("app/models.py"), hunk)
+  assert scorer.score(FileInfo("app/models.py"), added(20)) > code
+  assert scorer.score(FileInfo("docs/guide.md"), hunk) == pytest.approx(code * 0.3 / 1.5)
+  assert scorer.score(FileInfo("app/auth.py"), hunk) == pytest.approx(code * 2)
+  assert scorer.score(FileInfo("billing/models.py"), hunk) == pytest.approx(code * 2)
+  assert scorer.score(FileInfo("tests/test_models.py"), hunk) == pytest.approx(code * 0.5)
+  assert scorer.score(FileInfo("poetry.lock"), hunk) == pytest.approx(code * 0.1 / 1.5)
+
+
+def test_prioritize_orders_by_score_and_keeps_ties_in_diff_order():
+  readme, small, large, twin = FileInfo("README.md"), FileInfo("a.py"), FileInfo("b.py"), FileInfo("c.py")
+  jobs = [(readme, added(50)), (small, added(2)), (large, added(30)), (twin, added(2))]
+  ordered = [file_info.path for file_info, _ in scheduler().prioritize(jobs)]
+  assert ordered == ["b.py", "a.py", "c.py", "README.md"]
+
+
+def test_unlimited_budgets_pass_everything():
+  budget_scheduler = scheduler()
+  requests = [request("a.py", added(5), 10 ** 6) for _ in range(3)]
+  assert not budget_scheduler.budget.limited
+  assert list(budget_scheduler.within_budget(requests)) == requests
+  assert budget_scheduler.skipped == []
+
+
+def test_token_budget_skips_what_does_not_fit_and_tries_cheaper_requests():
+  budget_scheduler = scheduler(max_tokens=100)
+  big, too_big, small = request("a.py", added(6), 60), request("b.py", added(5, 10), 50), request("c.py", added(3), 30)
+  assert list(budget_scheduler.within_budget([big, too_big, small])) == [big, small]
+  assert budget_scheduler.budget.tokens == 90
+  [skipped] = budget_scheduler.skipped
+  assert (skipped.path, skipped.target_start, skipped.target_length, skipped.reason) == ("b.py", 10, 5, "tokens")
+  assert skipped.score == round(HunkScorer().score(FileInfo("b.py"), added(5)), 2)
+
+
+def test_cost_budget_counts_input_and_expected_output():
+  # $1 per million tokens either way: 800 + 200 tokens per request cost $0.001
+  budget_scheduler = scheduler(max_cost=0.0025, input_price=1.0, output_price=1.0)
+  requests = [request("a.py", added(1, start), 800) for start in (1, 10, 20)]
+  assert list(budget_scheduler.within_budget(requests)) == requests[:2]
+  assert budget_scheduler.budget.cost == pytest.approx(0.002)
+  assert [skipped.reason for skipped in budget_scheduler.skipped] == ["cost"]
+
+
+def test_time_budget_stops_dispatching(monkeypatch):
+  now = [0.0]
+  monkeypatch.setattr(hunk_scheduler.time, "perf_counter", lambda: now[0])
+  budget_scheduler = scheduler(max_seconds=10)
+  requests = [request("a.py", added(1, start), 10) for start in (1, 10, 20)]
+
+  def dispatched():
+    for dispatched_request in budget_scheduler.within_budget(requests):
+      yield dispatched_request
+      now[0] += 10
+
+  assert list(dispatched()) == requests[:1]
+  assert [skipped.reason for skipped in budget_scheduler.skipped] == ["time", "time"]
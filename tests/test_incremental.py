@@ -0,0 +1,53 @@
+from src.utils.diff_parser import DiffParser
+from src.utils.incremental import ChangedLines, format_review_marker, parse_review_marker
+
+PR_DIFF = (
+  "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n"
+  "@@ -1,2 +1,2 @@\n-x = 1\n+x = 2\n y\n"
+  "@@ -20,2 +20,3 @@\n z\n+w = 1\n v\n"
+  "@@ -40,2 +41,2 @@\n-u = 1\n+u = 2\n t\n"
+  "diff --git a/b.py b/b.py\n--- a/b.py\n+++ b/b.py\n"
+  "@@ -1,1 +1,1 @@\n-b = 1\n+b = 2\n"
+)
+
+
+def changed_since(compare_diff: str) -> ChangedLines:
+  return ChangedLines.from_diff(DiffParser.parse_diff(compare_diff))
+
+
+def kept(changed: ChangedLines):
+  return [
+    (file_data.path, [hunk.target_start for hunk in file_data.hunks])
+    for file_data in changed.filter(DiffParser.parse_diff(PR_DIFF))
+  ]
+
+
+def test_markers_round_trip():
+  body = f"AI generated review comments\n\n{format_review_marker('abc1234def')}"
+  assert parse_review_marker(body) == "abc1234def"
+  assert parse_review_marker("<!-- llm-code-reviewer:reviewed-sha=not-a-sha -->") is None
+  assert parse_review_marker(None) is None
+
+
+def test_only_hunks_overlapping_added_lines_are_kept():
+  changed = changed_since("diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -20,0 +21,1 @@\n+w = 1\n")
+  assert kept(changed) == [("a.py", [20])]
+
+
+def test_deletions_keep_the_hunk_where_they_happened():
+  changed = changed_since("diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -41,2 +41,1 @@\n u = 2\n-gone\n")
+  assert kept(changed) == [("a.py", [41])]
+
+
+def test_files_untouched_since_the_review_are_dropped():
+  changed = changed_since("diff --git a/b.py b/b.py\n--- a/b.py\n+++ b/b.py\n@@ -1,1 +1,1 @@\n-b = 3\n+b = 2\n")
+  assert kept(changed) == [("b.py", [1])]
+  assert kept(changed_since("")) == []
+
+
+def test_adjacent_changes_are_merged():
+  changed = changed_since(
+    "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1,0 +1,2 @@\n+x = 2\n+y\n@@ -5,0 +4,1 @@\n+q\n"
+  )
+  assert changed._ranges["a.py"] == [(1, 3), (4, 5)]
+  assert kept(changed) == [("a.py", [1])]
@@ -0,0 +1,76 @@
+import pytest
+
+from src.utils.path_matcher import PathMatcher
+
+
+@pytest.mark.parametrize("patterns, path, expected", [
+  (["*.md"], "README.md", True),
+  (["*.md"], "docs/guide/intro.md", True),
+  (["*.md"], "docs/guide/intro.mdx", False),
+  (["build"], "build/out.js", True),
+  (["build"], "src/build/out.js", True),
+  (["src/*.py"], "src/main.py", True),
+  (["src/*.py"], "lib/src/main.py", False),
+  (["src/*.py"], "src/utils/main.py", False),
+  (["src/**/*.py"], "src/utils/deep/main.py", True),
+  (["**/fixtures"], "a/b/fixtures/data.json", True),
+  (["docs/"], "docs/index.md", True),
+  (["file?.txt"], "file1.txt", True),
+  (["file?.txt"], "file10.txt", False),
+  (["[ab].js"], "b.js", True),
+  (["[ab].js"], "c.js", False),
+  (["/dist"], "dist/app.js", True),
+])
+def test_matches(patterns, path, expected):
+  assert PathMatcher(patterns).matches(path) is expected
+
+
+def test_last_matching_pattern_wins():
+  matcher = PathMatcher(["*.lock", "!poetry.lock", "sub/poetry.lock"])
+  assert matcher.matches("yarn.lock")
+  assert not matcher.matches("poetry.lock")
+  assert matcher.matches("sub/poetry.lock")
+
+
+def test_blank_lines_and_comments_are_ignored():
+  matcher = PathMatcher(["", "# *.py", "  "])
+  assert not matcher
+  assert not matcher.matches("main.py")
+
+
+def test_from_comma_separated():
+  matcher = PathMatcher.from_comma_separated("*.md, dist/ ,")
+  assert matcher.matches("README.md")
+  assert matcher.matches("dist/app.js")
+  assert not matcher.matches("src/app.js")
+  assert not PathMatcher.from_comma_separated(None)
+
+
+def test_from_gitattributes(tmp_path):
+  attributes = tmp_path / ".gitattributes"
+  attributes.write_text(
+    "# generated code\n"
+    "*.pb.go linguist-generated\n"
+    "gen/** linguist-generated=true\n"
+    "gen/keep.py -linguist-generated\n"
+    "*.txt text\n"
+  )
+  matcher = PathMatcher.from_gitattributes(str(attributes))
+  assert matcher.matches("api/service.pb.go")
+  assert matcher.matches("gen/models.py")
+  assert not matcher.matches("gen/keep.py")
+  assert not matcher.matches("notes.txt")
+  assert not PathMatcher.from_gitattributes(str(tmp_path / "missing"))
+
+
+@pytest.mark.parametrize("patterns, matched, unmatched", [
+  (["src/**/*.py"], ["src/a.py", "src/utils/a.py"], ["lib/a.py"]),
+  (["**/migrations/**"], ["migrations/1.py", "a/b/migrations/1.py"], ["a/migrations.py"]),
+  (["*.py", "!/*.py"], ["a/b.py", "a/b/c.py"], ["a.py"]),
+  (["/test_*"], ["test_a.py"], ["pkg/test_a.py"]),
+  (["/build"], ["build/x.js"], ["src/build/x.js"]),
+])
+def test_documented_migrations(patterns, matched, unmatched):
+  matcher = PathMatcher(patterns)
+  assert all(matcher.matches(path) for path in matched)
+  assert not any(matcher.matches(path) for path in unmatched)
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from src.services.provider_router import ProviderRouter, ProviderSlot
+
+PROMPT = "prompt"
+
+
+class FakeService:
+  """Answers after `delay` seconds, or raises `error`."""
+
+  def __init__(self, name, delay=0.0, error=None):
+    self.name = name
+    self.delay = delay
+    self.error = error
+    self.calls = 0
+    self._lock = threading.Lock()
+
+  def get_ai_response(self, prompt):
+    with self._lock:
+      self.calls += 1
+    time.sleep(self.delay)
+    if self.error:
+      raise self.error
+    return [{"reviewComment": self.name}]
+
+  async def aget_ai_response(self, prompt):
+    with self._lock:
+      self.calls += 1
+    await asyncio.sleep(self.delay)
+    if self.error:
+      raise self.error
+    return [{"reviewComment": self.name}]
+
+
+def router_for(*services, weights=None, **options):
+  weights = weights or [1.0] * len(services)
+  slots = [ProviderSlot(service.name, service, weight) for service, weight in zip(services, weights)]
+  return ProviderRouter(slots, **options)
+
+
+def hedging_router(primary, backup, asynchronous=False):
+  router = router_for(primary, backup, hedge_percentile=50, hedge_min_samples=1, asynchronous=asynchronous)
+  # The primary usually answers in 10ms, so the hedge goes out after that
+  router.slots[0].latencies.extend([0.01] * 5)
+  return router
+
+
+def test_primary_uses_the_first_provider():
+  router = router_for(FakeService("a"), FakeService("b"))
+  assert [router.call(PROMPT)[0].name for _ in range(3)] == ["a", "a", "a"]
+
+
+def test_round_robin_follows_the_weights():
+  router = router_for(FakeService("a"), FakeService("b"), FakeService("c"), weights=[3, 1, 1], strategy="round_robin")
+  picks = [router.call(PROMPT)[0].name for _ in range(10)]
+  assert Counter(picks) == {"a": 6, "b": 2, "c": 2}
+  # Smooth: the heavy provider is interleaved rather than picked in a row
+  assert picks[:5] != ["a", "a", "a", "b", "c"]
+
+
+def test_failovers_keep_the_weights_of_the_calls_served():
+  router = router_for(FakeService("a"), FakeService("b"), FakeService("c"), weights=[3, 1, 1], strategy="round_robin")
+  calls = Counter()
+  for request in range(20):
+    slot = router._select()
+    calls[slot.name] += 1
+    if request % 2 == 0:
+      calls[router._select(exclude=slot).name] += 1
+  assert calls == {"a": 18, "b": 6, "c": 6}
+
+
+def test_least_outstanding_picks_the_idlest_provider_per_weight():
+  router = router_for(FakeService("a"), FakeService("b"), weights=[2, 1], strategy="least_outstanding")
+  router.slots[0].outstanding = 3
+  router.slots[1].outstanding = 1
+  assert router._select().name == "b"
+  router.slots[1].outstanding = 2
+  assert router._select().name == "a"
+
+
+def test_zero_weight_providers_are_never_picked():
+  router = router_for(FakeService("a"), FakeService("b"), weights=[0, 1], strategy="round_robin")
+  assert {router.call(PROMPT)[0].name for _ in range(3)} == {"b"}
+
+
+def test_a_failed_call_fails_over_once():
+  primary, backup = FakeService("a", error=RuntimeError("503")), FakeService("b")
+  router = router_for(primary, backup)
+  slot, reviews = router.call(PROMPT)
+  assert (slot.name, reviews) == ("b", [{"reviewComment": "b"}])
+  assert router.stats()["providers"]["a"]["failures"] == 1
+
+  failing = router_for(primary, FakeService("c", error=RuntimeError("500")))
+  with pytest.raises(RuntimeError, match="500"):
+    failing.call(PROMPT)
+
+
+def test_a_slow_call_is_hedged_and_the_faster_answer_wins():
+  primary, backup = FakeService("a", delay=0.5), FakeService("b")
+  router = hedging_router(primary, backup)
+  slot, _ = router.call(PROMPT)
+  assert slot.name == "b"
+  assert router.stats()["hedged_requests"] == 1
+  assert router.slots[1].hedges_won == 1
+  router.close()
+
+
+def test_a_hedged_request_makes_at_most_two_calls():
+  primary = FakeService("a", delay=0.05, error=RuntimeError("503"))
+  backup = FakeService("b", error=RuntimeError("500"))
+  third = FakeService("c")
+  router = router_for(primary, backup, third, hedge_percentile=50, hedge_min_samples=1)
+  router.slots[0].latencies.extend([0.01] * 5)
+  with pytest.raises(RuntimeError):
+    router.call(PROMPT)
+  assert (primary.calls, backup.calls, third.calls) == (1, 1, 0)
+  router.close()
+
+
+def test_a_call_failing_before_the_hedge_fails_over():
+  primary, backup = FakeService("a", error=RuntimeError("503")), FakeService("b")
+  router = hedging_router(primary, backup)
+  slot, _ = router.call(PROMPT)
+  assert slot.name == "b"
+  assert (primary.calls, backup.calls) == (1, 1)
+  assert router.stats()["hedged_requests"] == 0
+  router.close()
+
+
+def test_async_calls_hedge_and_fail_over_like_sync_ones():
+  primary, backup = FakeService("a", delay=0.5), FakeService("b")
+  slot, _ = asyncio.run(hedging_router(primary, backup, asynchronous=True).acall(PROMPT))
+  assert slot.name == "b"
+
+  primary, backup = FakeService("a", delay=0.05, error=RuntimeError("503")), FakeService("b", error=RuntimeError("500"))
+  third = FakeService("c")
+  router = router_for(primary, backup, third, hedge_percentile=50, hedge_min_samples=1, asynchronous=True)
+  router.slots[0].latencies.extend([0.01] * 5)
+  with pytest.raises(RuntimeError):
+    asyncio.run(router.acall(PROMPT))
+  assert third.calls == 0
+
+  slot, _ = asyncio.run(router_for(FakeService("a", error=RuntimeError("503")), FakeService("b")).acall(PROMPT))
+  assert slot.name == "b"
@@ -0,0 +1,185 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from src.core.config import Config
+from src.core.models import ReviewPrompt
+from src.services.llms import base, rate_limiter
+from src.services.llms.base import BaseLLMService
+from src.services.llms.rate_limiter import RateLimiter, TokenBucket, parse_reset, retry_after
+
+PROMPT = ReviewPrompt("Review this.", "Hunks to Review: ...")
+
+
+class Clock:
+  def __init__(self):
+    self.now = 100.0
+    self.slept = []
+
+  def monotonic(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.slept.append(seconds)
+    self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+  clock = Clock()
+  monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+  monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+  return clock
+
+
+@pytest.mark.parametrize("value, expected", [
+  ("20", 20.0),
+  ("1.5", 1.5),
+  ("-3", 0.0),
+  ("6m0s", 360.0),
+  ("1h2m3s", 3723.0),
+  ("250ms", 0.25),
+  ("soon", None),
+  ("", None),
+  (None, None),
+])
+def test_parse_reset(value, expected):
+  assert parse_reset(value) == expected
+
+
+def test_parse_reset_understands_timestamps():
+  moment = datetime.now(timezone.utc) + timedelta(seconds=30)
+  assert 28 <= parse_reset(moment.isoformat().replace("+00:00", "Z")) <= 30
+  assert 28 <= parse_reset(format_datetime(moment, usegmt=True)) <= 30
+  assert parse_reset("2000-01-01T00:00:00Z") == 0.0
+
+
+def test_retry_after_prefers_explicit_hints():
+  assert retry_after({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+  assert retry_after({"retry-after": "9"}) == 9.0
+  assert retry_after(None) is None
+  assert retry_after({}) is None
+
+
+def test_retry_after_waits_for_exhausted_quotas_only():
+  headers = {
+    "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s",
+    "x-ratelimit-remaining-tokens": "100", "x-ratelimit-reset-tokens": "1m",
+    "anthropic-ratelimit-tokens-remaining": "0", "anthropic-ratelimit-tokens-reset": "5",
+  }
+  assert retry_after(headers) == 5.0
+  assert retry_after({"x-ratelimit-remaining-requests": "3", "x-ratelimit-reset-requests": "2s"}) is None
+
+
+def test_token_bucket_refills_continuously(clock):
+  bucket = TokenBucket(60)
+  assert bucket.reserve(60) == 0.0
+  assert bucket.reserve(1) == pytest.approx(1.0)
+  clock.now += 2
+  assert bucket.reserve(1) == 0.0
+  assert TokenBucket(0).reserve(10 ** 6) == 0.0
+
+
+def test_token_bucket_caps_oversized_requests_at_its_capacity(clock):
+  bucket = TokenBucket(60)
+  assert bucket.reserve(1000) == 0.0
+  assert bucket.reserve(30) == pytest.approx(30.0)
+
+
+def test_limiter_waits_for_the_scarcer_bucket_and_cooldowns(clock):
+  limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+  assert limiter.acquire(600) == 0.0
+  assert limiter.acquire(60) == pytest.approx(6.0)
+  limiter.cool_down(30)
+  assert limiter.acquire(1) == pytest.approx(30.0)
+  assert limiter.stats()["requests"] == 3
+  assert limiter.stats()["throttled_seconds"] == pytest.approx(36.0)
+
+
+def test_limiter_honours_exhausted_quota_headers():
+  # On the real clock, which the event loop's timers run on
+  limiter = RateLimiter()
+  limiter.observe_headers({"anthropic-ratelimit-requests-remaining": "0", "anthropic-ratelimit-requests-reset": "0.05"})
+  assert 0 < asyncio.run(limiter.aacquire(1)) <= 0.05
+  assert limiter.acquire(1) == 0.0
+
+
+def test_limiters_are_shared_per_provider_and_model():
+  limiter = RateLimiter.for_model("SharedService", "model-a", requests_per_minute=10)
+  assert RateLimiter.for_model("SharedService", "model-a") is limiter
+  assert RateLimiter.for_model("SharedService", "model-b") is not limiter
+
+
+class Response:
+  def __init__(self, headers):
+    self.headers = headers
+
+
+class APIError(Exception):
+  def __init__(self, status_code, headers=None):
+    super().__init__(f"HTTP {status_code}")
+    self.status_code = status_code
+    self.response = Response(headers or {})
+
+
+class ScriptedService(BaseLLMService):
+  """Raises the scripted errors in turn, then answers."""
+
+  PROVIDER = "scripted"
+
+  def __init__(self, model_name, *errors):
+    self.model_name = model_name
+    self.errors = list(errors)
+    self.calls = 0
+
+  def _complete(self, prompt):
+    self.calls += 1
+    if self.errors:
+      raise self.errors.pop(0)
+    return '{"reviews": [{"lineNumber": 1, "side": "right", "reviewComment": "ok"}]}'
+
+
+@pytest.fixture
+def retries(monkeypatch, clock):
+  monkeypatch.setattr(Config, "LLM_STREAMING", False)
+  monkeypatch.setattr(Config, "LLM_MAX_RETRIES", 2)
+  monkeypatch.setattr(Config, "LLM_RETRY_BASE_DELAY", 0.5)
+  monkeypatch.setattr(Config, "LLM_RETRY_MAX_DELAY", 60.0)
+  monkeypatch.setattr(base.random, "uniform", lambda low, high: high)
+  return clock
+
+
+def test_rate_limits_cool_down_every_caller_for_the_hinted_time(retries):
+  service = ScriptedService("rate-limited", APIError(429, {"retry-after": "3"}))
+  assert len(service.get_ai_response(PROMPT)) == 1
+  assert service.calls == 2
+  # The hint plus jitter, waited by the next acquire rather than by the retry itself
+  assert [seconds for seconds in retries.slept if seconds] == [pytest.approx(3.5)]
+  assert service.get_rate_limit_stats()["rate_limited"] == 1
+
+
+def test_transient_errors_back_off_exponentially_until_retries_run_out(retries):
+  service = ScriptedService("flaky", APIError(503), APIError(502), APIError(500))
+  with pytest.raises(APIError, match="500"):
+    service.get_ai_response(PROMPT)
+  assert service.calls == 3
+  assert retries.slept == [0.5, 1.0]
+  assert service.get_rate_limit_stats()["failures"] == 1
+
+
+def test_client_errors_are_not_retried(retries):
+  service = ScriptedService("bad-request", APIError(400))
+  with pytest.raises(APIError):
+    service.get_ai_response(PROMPT)
+  assert service.calls == 1
+
+
+def test_dropped_connections_are_retried(retries):
+  class APIConnectionError(Exception):
+    pass
+
+  service = ScriptedService("dropped", APIConnectionError("reset"))
+  assert len(service.get_ai_response(PROMPT)) == 1
+  assert service.calls == 2
@@ -0,0 +1,82 @@
+import pytest
+
+from src.services import review_cache
+from src.services.review_cache import ReviewCache
+
+REVIEWS = [{"lineNumber": 1, "reviewComment": "Check this"}]
+
+
+class Clock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def time(self):
+    return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+  clock = Clock()
+  monkeypatch.setattr(review_cache.time, "time", clock.time)
+  return clock
+
+
+@pytest.fixture
+def open_cache(tmp_path):
+  caches = []
+
+  def open_cache(ttl_seconds=3600, max_entries=100):
+    cache = ReviewCache(str(tmp_path / "cache" / "reviews.db"), ttl_seconds, max_entries)
+    caches.append(cache)
+    return cache
+
+  yield open_cache
+  for cache in caches:
+    cache._conn.close()
+
+
+def test_keys_depend_on_provider_model_and_prompt():
+  key = ReviewCache.make_key("OpenAIService", "gpt-4o", "prompt")
+  assert key == ReviewCache.make_key("OpenAIService", "gpt-4o", "prompt")
+  assert key != ReviewCache.make_key("OpenAIService", "gpt-4o-mini", "prompt")
+  assert key != ReviewCache.make_key("AnthropicService", "gpt-4o", "prompt")
+  assert ReviewCache.make_key("a", "bc", "") != ReviewCache.make_key("ab", "c", "")
+
+
+def test_entries_survive_reopening(open_cache, clock):
+  open_cache().set("key", REVIEWS)
+  cache = open_cache()
+  assert cache.get("key") == REVIEWS
+  assert cache.get("other") is None
+  assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_entries_are_ignored_and_pruned(open_cache, clock):
+  cache = open_cache(ttl_seconds=60)
+  cache.set("key", REVIEWS)
+  clock.now += 60
+  assert cache.get("key") == REVIEWS
+  clock.now += 1
+  assert cache.get("key") is None
+  cache.prune()
+  assert cache._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0] == 0
+
+
+def test_get_first_returns_the_first_live_key(open_cache, clock):
+  cache = open_cache()
+  cache.set("second", REVIEWS)
+  assert cache.get_first(["first", "second"]) == REVIEWS
+  assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_prune_evicts_the_least_recently_used(open_cache, clock):
+  cache = open_cache(max_entries=2)
+  for key in ("a", "b", "c"):
+    clock.now += 1
+    cache.set(key, REVIEWS)
+  clock.now += 1
+  cache.get("a")
+  cache.prune()
+  assert cache.get("a") == REVIEWS
+  assert cache.get("b") is None
+  assert cache.get("c") == REVIEWS
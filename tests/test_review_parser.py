@@ -0,0 +1,89 @@
+from src.services.llms.review_parser import IncrementalReviewParser
+
+REVIEWS = [
+  {"hunkId": 1, "filepath": "a.py", "lineNumber": 3, "side": "right", "reviewComment": "Use `{}` here"},
+  {"hunkId": 2, "filepath": "b.py", "lineNumber": 7, "side": "left", "reviewComment": "Escaped \"quote\" and ]"},
+]
+DOCUMENT = (
+  '{"reviews": [{"hunkId": 1, "filepath": "a.py", "lineNumber": 3, "side": "right", "reviewComment": "Use `{}` here"}, '
+  '{"hunkId": 2, "filepath": "b.py", "lineNumber": 7, "side": "left", "reviewComment": "Escaped \\"quote\\" and ]"}]}'
+)
+
+
+def test_parses_a_complete_document():
+  parser = IncrementalReviewParser.parse(DOCUMENT)
+  assert parser.reviews == REVIEWS
+  assert parser.complete
+  assert parser.malformed == 0
+
+
+def test_chunk_boundaries_do_not_matter():
+  parser = IncrementalReviewParser()
+  found = []
+  for char in DOCUMENT:
+    found.extend(parser.feed(char))
+  assert found == REVIEWS
+  assert parser.complete
+
+
+def test_yields_each_review_as_soon_as_it_closes():
+  parser = IncrementalReviewParser()
+  first_end = DOCUMENT.index("}, ") + 1
+  assert parser.feed(DOCUMENT[:first_end - 1]) == []
+  assert parser.feed(DOCUMENT[first_end - 1:first_end]) == REVIEWS[:1]
+  assert not parser.complete
+
+
+def test_ignores_prose_and_code_fences():
+  parser = IncrementalReviewParser.parse(f"Here is my review:\n```json\n{DOCUMENT}\n```\nThanks!")
+  assert parser.reviews == REVIEWS
+  assert parser.complete
+
+
+def test_accepts_a_bare_array():
+  parser = IncrementalReviewParser.parse('[{"lineNumber": 1, "reviewComment": "x"}]')
+  assert parser.reviews == [{"lineNumber": 1, "reviewComment": "x"}]
+  assert parser.complete
+
+
+def test_truncated_output_keeps_complete_reviews():
+  parser = IncrementalReviewParser.parse(DOCUMENT[:DOCUMENT.index('"left"')])
+  assert parser.reviews == REVIEWS[:1]
+  assert not parser.complete
+
+
+def test_malformed_reviews_are_skipped_and_counted():
+  parser = IncrementalReviewParser.parse('{"reviews": [{"lineNumber": 1, oops}, {"lineNumber": 2, "reviewComment": "y"}]}')
+  assert parser.reviews == [{"lineNumber": 2, "reviewComment": "y"}]
+  assert parser.malformed == 1
+  assert parser.complete
+
+
+def test_text_after_the_document_is_ignored():
+  parser = IncrementalReviewParser.parse('{"reviews": []} and {"lineNumber": 1}')
+  assert parser.reviews == []
+  assert parser.complete
+
+
+def test_only_the_reviews_array_yields_reviews():
+  parser = IncrementalReviewParser.parse(
+    '{"notes": [{"lineNumber": 5, "reviewComment": "example"}], '
+    '"reviews": [{"lineNumber": 1, "reviewComment": "x", "examples": [{"lineNumber": 9}]}], '
+    '"extra": [{"lineNumber": 7}]}'
+  )
+  assert parser.reviews == [{"lineNumber": 1, "reviewComment": "x", "examples": [{"lineNumber": 9}]}]
+  assert parser.complete
+
+
+def test_reviews_arrays_below_the_top_level_are_ignored():
+  parser = IncrementalReviewParser.parse('{"meta": {"reviews": [{"lineNumber": 1}]}, "kind": "reviews", "reviews": []}')
+  assert parser.reviews == []
+  assert parser.complete
+
+
+def test_the_reviews_key_may_be_split_across_chunks():
+  parser = IncrementalReviewParser()
+  found = []
+  for chunk in ('{"rev', 'iews"', ': [{"lineNumber": 1}', ']}'):
+    found.extend(parser.feed(chunk))
+  assert found == [{"lineNumber": 1}]
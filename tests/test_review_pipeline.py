@@ -0,0 +1,88 @@
+from src.core.models import PRDetails
+from src.utils.diff_parser import DiffParser
+from src.utils.review_pipeline import ReviewPipeline
+
+PR_DETAILS = PRDetails("owner", "repo", 1, "Title", "Description", head_sha="head")
+
+
+class StubGitHubService:
+  def __init__(self, failing_batches=()):
+    self.failing_batches = set(failing_batches)
+    self.reviews = []
+    self.recorded = []
+
+  def create_review_comment(self, pr_details, comments, reviewed_sha=None):
+    index = len(self.reviews)
+    self.reviews.append((list(comments), reviewed_sha))
+    if index in self.failing_batches:
+      raise RuntimeError("502 Bad Gateway")
+
+  def record_reviewed_sha(self, pr_details, reviewed_sha):
+    self.recorded.append(reviewed_sha)
+
+
+class StubDiffSource:
+  def iter_pr_lines(self, pr_details):
+    return iter(())
+
+
+class StubAnalyzer:
+  """Yields the given comments per request, ignoring the diff."""
+
+  def __init__(self, requests, failed_requests=0):
+    self.requests = requests
+    self.failed_requests = 0
+    self.skipped_hunks = 0
+    self._failures = failed_requests
+
+  def iter_comments(self, parsed_diff, pr_details, context=None):
+    list(parsed_diff)
+    self.failed_requests += self._failures
+    yield from self.requests
+
+
+def comment(line):
+  return {"body": "Check this", "path": "a.py", "line": line, "side": "RIGHT"}
+
+
+def run(github_service, analyzer, post_batch_size=2):
+  pipeline = ReviewPipeline(
+    github_service, DiffParser(), analyzer, lambda files: files,
+    post_batch_size=post_batch_size, diff_source=StubDiffSource()
+  )
+  return pipeline.run(PR_DETAILS, reviewed_sha="head")
+
+
+def test_the_last_batch_records_the_reviewed_commit():
+  github_service = StubGitHubService()
+  posted = run(github_service, StubAnalyzer([[comment(1), comment(2)], [comment(3)]]))
+  assert posted == 3
+  assert [reviewed_sha for _, reviewed_sha in github_service.reviews] == [None, "head"]
+
+
+def test_a_run_without_comments_moves_the_marker():
+  github_service = StubGitHubService()
+  assert run(github_service, StubAnalyzer([])) == 0
+  assert github_service.reviews == []
+  assert github_service.recorded == ["head"]
+
+
+def test_a_failed_batch_keeps_the_run_unreviewed():
+  github_service = StubGitHubService(failing_batches=[0])
+  posted = run(github_service, StubAnalyzer([[comment(1), comment(2)], [comment(3)]]))
+  assert posted == 1
+  assert [reviewed_sha for _, reviewed_sha in github_service.reviews] == [None, None]
+  assert github_service.recorded == []
+
+
+def test_a_failed_batch_keeps_a_run_without_final_comments_unreviewed():
+  github_service = StubGitHubService(failing_batches=[0])
+  assert run(github_service, StubAnalyzer([[comment(1), comment(2)]])) == 0
+  assert github_service.recorded == []
+
+
+def test_failed_requests_keep_the_run_unreviewed():
+  github_service = StubGitHubService()
+  run(github_service, StubAnalyzer([[comment(1)]], failed_requests=1))
+  assert github_service.reviews == [([comment(1)], None)]
+  assert github_service.recorded == []
@@ -0,0 +1,145 @@
+import hashlib
+import hmac
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from src.core.models import PRDetails
+from src.utils.review_service import ReviewService, WebhookHandler, parse_job
+
+SECRET = "webhook-secret"
+
+
+def event(action="synchronize", number=7):
+  return json.dumps({"action": action, "number": number, "repository": {"full_name": "octo/api"}}).encode()
+
+
+def sign(body, secret=SECRET):
+  return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class StubGitHubService:
+  def get_pull_request(self, owner, repo, pull_number):
+    return PRDetails(owner, repo, pull_number, "Title", "Description")
+
+
+class StubApp:
+  """Holds the first review until `release` is set and tracks overlapping reviews."""
+
+  def __init__(self):
+    self.github_service = StubGitHubService()
+    self.ai_service = None
+    self.started = threading.Event()
+    self.release = threading.Event()
+    self.reviews = 0
+    self.active = 0
+    self.max_active = 0
+    self._lock = threading.Lock()
+
+  def create_pipeline(self, code_analyzer):
+    return code_analyzer
+
+  def review_pull_request(self, pr_details, pipeline):
+    with self._lock:
+      self.reviews += 1
+      self.active += 1
+      self.max_active = max(self.max_active, self.active)
+      first = self.reviews == 1
+    self.started.set()
+    if first:
+      self.release.wait(5)
+    with self._lock:
+      self.active -= 1
+
+
+class StubService:
+  def __init__(self):
+    self.jobs = []
+
+  def submit(self, job):
+    self.jobs.append(job)
+    return True
+
+
+@pytest.fixture
+def webhook():
+  servers = []
+
+  def webhook(service):
+    handler = type("Handler", (WebhookHandler,), {"service": service, "secret": SECRET})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    servers.append(server)
+
+    def post(body, signature=None, event_name="pull_request"):
+      headers = {"X-GitHub-Event": event_name}
+      if signature is not None:
+        headers["X-Hub-Signature-256"] = signature
+      request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/", body, headers)
+      try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+          return response.status, response.read().decode()
+      except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+    return post
+
+  yield webhook
+  for server in servers:
+    server.shutdown()
+    server.server_close()
+
+
+def test_deliveries_need_a_valid_signature(webhook):
+  service = StubService()
+  post = webhook(service)
+  body = event()
+  assert post(body)[0] == 401
+  assert post(body, sign(body, "other-secret"))[0] == 401
+  assert post(body, sign(event(number=8)))[0] == 401
+  assert service.jobs == []
+  assert post(body, sign(body)) == (202, "queued")
+  assert service.jobs == [("octo", "api", 7)]
+
+
+def test_other_events_and_actions_are_ignored(webhook):
+  service = StubService()
+  post = webhook(service)
+  closed = event(action="closed")
+  assert post(closed, sign(closed)) == (200, "ignored")
+  body = event()
+  assert post(body, sign(body), event_name="push") == (200, "ignored")
+  assert post(b"{", sign(b"{"))[0] == 400
+  assert service.jobs == []
+
+
+def test_a_pull_request_is_never_reviewed_twice_at_once(webhook):
+  app = StubApp()
+  service = ReviewService(app, max_jobs=2, max_concurrency=2)
+  service.start()
+  post = webhook(service)
+  body = event()
+  try:
+    assert post(body, sign(body)) == (202, "queued")
+    assert app.started.wait(5)
+    # Marks a rerun of the running review; further deliveries add nothing
+    assert post(body, sign(body)) == (202, "queued")
+    assert post(body, sign(body)) == (202, "already queued")
+  finally:
+    app.release.set()
+    service.join()
+    service.stop()
+  assert app.reviews == 2
+  assert app.max_active == 1
+  assert (service.completed, service.failed) == (2, 0)
+
+
+def test_parse_job():
+  assert parse_job("octo/api#12") == ("octo", "api", 12)
+  assert parse_job(event().decode()) == ("octo", "api", 7)
+  assert parse_job("octo/api") is None
+  assert parse_job("{not json") is None
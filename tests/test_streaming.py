@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from src.core.config import Config
+from src.core.models import FileInfo, PRDetails, ReviewPrompt
+from src.services.ai_service import AIService
+from src.services.llms.base import BaseLLMService, ReviewList
+from src.services.llms.prompts import build_review_prompt
+from src.services.review_cache import ReviewCache
+from src.utils.diff_parser import DiffParser
+
+PROMPT = ReviewPrompt("Review this.", "Hunks to Review: ...")
+FIRST = '{"reviews": [{"hunkId": 1, "filepath": "a.py", "lineNumber": 1, "side": "right", "reviewComment": "One"}'
+SECOND = ', {"hunkId": 1, "filepath": "a.py", "lineNumber": 2, "side": "right", "reviewComment": "Two"}'
+DOCUMENT = FIRST + SECOND + "]}"
+
+
+class DroppedConnection(Exception):
+  """Named like the SDKs' connection errors, so it is retried."""
+
+
+class FakeService(BaseLLMService):
+  PROVIDER = "fake"
+
+  def __init__(self, *attempts):
+    # Each attempt is a list of text chunks; an exception in it is raised mid-stream
+    self.attempts = list(attempts)
+    self.model_name = "fake-model"
+    self.calls = 0
+
+  def _complete(self, prompt):
+    raise AssertionError("streaming must not fall back to _complete")
+
+  def _stream(self, prompt):
+    self.calls += 1
+    for chunk in self.attempts.pop(0):
+      if isinstance(chunk, Exception):
+        raise chunk
+      yield chunk
+
+  async def _astream(self, prompt):
+    for chunk in self._stream(prompt):
+      yield chunk
+
+
+@pytest.fixture(autouse=True)
+def streaming(monkeypatch):
+  monkeypatch.setattr(Config, "LLM_STREAMING", True)
+  monkeypatch.setattr(Config, "LLM_MAX_RETRIES", 2)
+  monkeypatch.setattr(Config, "LLM_RETRY_BASE_DELAY", 0.0)
+
+
+def line_numbers(reviews):
+  return [review["lineNumber"] for review in reviews]
+
+
+def test_reviews_are_yielded_before_the_stream_ends():
+  service = FakeService([FIRST, AssertionError("not consumed yet")])
+  reviews = service.iter_ai_response(PROMPT)
+  assert next(reviews)["reviewComment"] == "One"
+
+
+def test_complete_stream():
+  reviews = FakeService([FIRST, SECOND, "]}"]).get_ai_response(PROMPT)
+  assert line_numbers(reviews) == [1, 2]
+  assert reviews.complete
+
+
+def test_failure_after_a_review_keeps_it_and_marks_the_response_incomplete():
+  service = FakeService([FIRST, SECOND, DroppedConnection("reset")], [DOCUMENT])
+  reviews = service.get_ai_response(PROMPT)
+  assert line_numbers(reviews) == [1, 2]
+  assert not reviews.complete
+  assert service.calls == 1
+
+
+def test_truncated_stream_is_incomplete():
+  reviews = FakeService([FIRST, SECOND]).get_ai_response(PROMPT)
+  assert line_numbers(reviews) == [1, 2]
+  assert not reviews.complete
+
+
+def test_failure_before_the_first_review_is_retried():
+  service = FakeService(['{"reviews": [{"hunkId"', DroppedConnection("reset")], [DOCUMENT])
+  reviews = service.get_ai_response(PROMPT)
+  assert line_numbers(reviews) == [1, 2]
+  assert reviews.complete
+  assert service.calls == 2
+
+
+def test_failure_before_the_first_review_is_raised_when_not_retryable():
+  service = FakeService([ValueError("bad request")])
+  with pytest.raises(ValueError):
+    service.get_ai_response(PROMPT)
+
+
+def test_async_stream_handles_failures_like_the_sync_one():
+  service = FakeService([FIRST, DroppedConnection("reset")], [DroppedConnection("reset")], [DOCUMENT])
+  partial = asyncio.run(service.aget_ai_response(PROMPT))
+  assert line_numbers(partial) == [1]
+  assert not partial.complete
+
+  retried = asyncio.run(service.aget_ai_response(PROMPT))
+  assert line_numbers(retried) == [1, 2]
+  assert retried.complete
+
+
+def test_incomplete_responses_are_not_cached(tmp_path):
+  ai_service = AIService.__new__(AIService)
+  ai_service.cache = ReviewCache(str(tmp_path / "cache.db"), ttl_seconds=3600, max_entries=100)
+  service = FakeService()
+  key = ai_service._cache_key(service, PROMPT)
+
+  ai_service._set_cached(service, PROMPT, ReviewList([{"lineNumber": 1}], complete=False))
+  assert ai_service.cache.get(key) is None
+
+  ai_service._set_cached(service, PROMPT, ReviewList([{"lineNumber": 1}]))
+  assert ai_service.cache.get(key) == [{"lineNumber": 1}]
+  ai_service.cache.close()
+
+
+@pytest.fixture
+def mock_llm():
+  mock_servers = pytest.importorskip("benchmarks.mock_servers")
+  handler = type("Handler", (mock_servers.MockLLMHandler,), {"stats": mock_servers._Stats(), "comment_rate": 1.0})
+  server = mock_servers.start_server(handler)
+  yield f"http://127.0.0.1:{server.server_address[1]}"
+  server.shutdown()
+  server.server_close()
+
+
+def review_prompt():
+  diff = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -10,2 +10,2 @@\n-x = 1\n+x = 2\n y\n"
+  entries = [(FileInfo(file_data.path), hunk) for file_data in DiffParser.parse_diff(diff) for hunk in file_data.hunks]
+  return build_review_prompt(entries, PRDetails("owner", "repo", 1, "Title", "Description"))
+
+
+@pytest.mark.parametrize("provider", ["openai", "anthropic"])
+def test_provider_streams_with_sync_and_async_clients(provider, mock_llm, monkeypatch):
+  pytest.importorskip(provider)
+  from src.services.ai_service import load_provider
+
+  if provider == "openai":
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{mock_llm}/v1")
+  else:
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", mock_llm)
+  monkeypatch.setattr(Config, f"{provider.upper()}_API_KEY", "test-key")
+  service = load_provider(provider)()
+  prompt = review_prompt()
+
+  for reviews in (service.get_ai_response(prompt), asyncio.run(service.aget_ai_response(prompt))):
+    assert [(review["filepath"], review["lineNumber"]) for review in reviews] == [("a.py", 10)]
+    assert reviews.complete